@@ -17,13 +17,104 @@ from module import DiscordScraper
 
 """
 os._exit: Used to exit the script.
+os.path:  Used to combine and split file paths.
 """
-from os import _exit as exit
+from os import _exit as exit, path
 
 """
-module.DiscordScraper.loads: Used to access the json.loads function documented in the DiscordScraper class file.
+module.DiscordScraper.loads:       Used to access the json.loads function documented in the DiscordScraper class file.
+module.DiscordScraper.warn:        Used to throw a warning message without halting the script.
+module.DiscordScraper.error:       Used to throw an error message and halt the script.
+module.DiscordScraper.ConfigError: Used to detect a missing or invalid configuration file.
 """
-from module.DiscordScraper import loads
+from module.DiscordScraper import loads, warn, error, ConfigError
+
+"""
+signal.SIGINT: Used to detect CTRL+C (Command+C) inputs during runtime.
+signal.signal: Used to tie in the SIGINT with the shutdown handler so the work in flight can finish.
+"""
+from signal import SIGINT, signal
+
+"""
+module.RetryEngine.RetryError: Used to detect requests that failed for good (they've already been written to the dead letter file).
+"""
+from module.RetryEngine import RetryError
+
+"""
+module.TokenPool.ChannelQueue: Used to hand the windows of days out to the authorization tokens.
+"""
+from module.TokenPool import ChannelQueue
+
+"""
+argparse.ArgumentParser: Used to read the command-line arguments.
+"""
+from argparse import ArgumentParser
+
+"""
+module.WorkQueue.WorkQueue: Used to share the work between many nodes through a single queue file.
+"""
+from module.WorkQueue import WorkQueue
+
+"""
+socket.gethostname: Used to give each worker a name that is unique across the nodes.
+"""
+from socket import gethostname
+
+"""
+os.getpid: Used to give each worker a name that is unique across the processes on a node.
+"""
+from os import getpid
+
+"""
+sys.stdout: Used to flush what we've printed before exiting, os._exit skips the flush so piped output would be lost.
+"""
+from sys import stdout
+
+"""
+threading.Thread: Used to scrape with every authorization token at the same time, and to send heartbeats for the work units.
+threading.Event:  Used to stop the heartbeat thread and to find out when a lease was lost.
+"""
+from threading import Thread, Event
+
+"""
+time.time: Used to work out when the backfill budget runs out, and to time the requests of a dry run.
+"""
+from time import time
+
+"""
+module.PackStore.migrate: Used to move the small files that were downloaded before packing was turned on into packs.
+module.PackStore.extract: Used to write the files in the packs back out as files of their own.
+"""
+from module.PackStore import migrate, extract
+
+"""
+module.CacheArchive.compact: Used to merge the day caches into month packs.
+"""
+from module.CacheArchive import compact
+
+"""
+module.Tracer.Tracer:  Used to write the timings of every request to a trace file.
+module.Tracer.analyze: Used to summarize the timings in a trace file by endpoint.
+module.Tracer.toHAR:   Used to convert a trace file into a HAR file.
+"""
+from module.Tracer import Tracer, analyze, toHAR
+
+"""
+module.Planner.ChannelPlan: Used to build up the estimate of what scraping a channel will take.
+module.Planner.PAGESIZE:    Used to find the windows that are busy enough to be worth splitting.
+module.Planner.formatBytes: Used to print the estimated download size.
+"""
+from module.Planner import ChannelPlan, PAGESIZE, formatBytes
+
+"""
+The number of files in each channel's sample to ask the size of with a HEAD request, the attachments already tell us their size so this is only for embeds.
+"""
+PLANHEADS = 10
+
+"""
+The number of days in a row that can fail before we give up on a channel, this keeps a long outage from racing through years of empty days.
+"""
+MAXFAILEDDAYS = 5
 
 def getLastMessageGuild(scraper, guild, channel):
     """
@@ -41,7 +132,7 @@ def getLastMessageGuild(scraper, guild, channel):
 
     try:
         # Execute the network query to retrieve the JSON data.
-        response = DiscordScraper.requestData(lastmessage, scraper.headers)
+        response = DiscordScraper.requestData(lastmessage, scraper.headers, scraper.retry)
 
         # If we returned nothing then return nothing.
         if response is None:
@@ -53,107 +144,332 @@ def getLastMessageGuild(scraper, guild, channel):
         # Retrieve the snowflake of the post and convert it into a timestamp.
         timestamp = DiscordScraper.snowflakeToTimestamp(int(data[0]['id']))
 
-        # Return the datetime object from the given timestamp above.
-        return datetime.fromtimestamp(timestamp)
+        # Return the datetime object (in UTC, like the day windows) from the given timestamp above.
+        return datetime.utcfromtimestamp(timestamp)
 
     except Exception as ex:
         print(ex)
 
-def startDM(scraper, alias, channel, day=None):
+def getLastMessageDM(scraper, alias, channel):
     """
-    The initialization function for the scraper script to grab direct message contents.
+    Use the official Discord API to retrieve the last publicly viewable message in a direct message.
     :param scraper: The DiscordScraper class reference that we will be using.
     :param alias: The named alias for the direct message.
-    :param channel: The ID for the direct message we're wanting to scrape from.
-    :param day: The datetime object for the day that we're wanting to scrape.
+    :param channel: The ID for the direct message that we're wanting to scrape from.
     """
 
-    # TODO: I still need to get around to implementing DM scraping, hopefully I can figure out a method of getting the true DM url from a user ID/Snowflake value to make things easier to configure.
-    pass
+    # Direct messages live under the @me pseudo-guild, so we can reuse the guild function with that as the referer guild.
+    return getLastMessageGuild(scraper, '@me', channel)
 
-def startGuild(scraper, guild, channel, day=None):
+def searchPages(scraper, search, context=None):
     """
-    The initialization function for the scraper script.
+    Grab every page of results for a search query, yielding each page as soon as it has been parsed so only one page is held in memory.
     :param scraper: The DiscordScraper class reference that we will be using.
-    :param guild: The ID for the guild that we're wanting to scrape from.
+    :param search: The search URL without an offset query, the offsets for the later pages are appended here.
+    :param context: A dictionary describing what is being searched for, this is written alongside the dead letter of any page that fails for good.
+    """
+
+    # Grab the API response for the search query URL (a RetryError here means there's nothing at all to go on for this search).
+    response = DiscordScraper.requestData(search, scraper.headers, scraper.retry, dict(context or {}, offset=0))
+
+    # Read the response data.
+    data = loads(response.read().decode('utf-8'))
+
+    # Get the number of posts.
+    posts = data['total_results']
+
+    # Hand the first page over before requesting the next one.
+    yield data
+
+    # Create a variable to store the number of pages that failed for good.
+    failed = 0
+
+    # Determine if we have multiple offsets.
+    if (posts > 25):
+        pages = int(posts / 25) + 1
+
+        for page in range(2, pages + 1):
+
+            try:
+
+                # Grab the API response for the search query URL at the current offset.
+                response = DiscordScraper.requestData('{0}&offset={1}'.format(search, 25 * (page - 1)), scraper.headers, scraper.retry, dict(context or {}, offset=25 * (page - 1)))
+
+            except RetryError:
+
+                # Carry on with the other pages, the failed one is in the dead letter file.
+                failed += 1
+                continue
+
+            # Read the response data.
+            data = loads(response.read().decode('utf-8'))
+
+            # Hand the page over before requesting the next one.
+            yield data
+
+    # Let the caller know that the results are incomplete.
+    if failed > 0:
+        raise RetryError('{0} of {1} search pages failed for good.'.format(failed, int(posts / 25) + 1))
+
+def searchHit(messages):
+    """
+    Return the message in a message group that matched the search, the rest of the group (if any) is surrounding context.
+    :param messages: The message group from a search page.
+    """
+
+    # Grab the search hit, falling back to the first message if none of them are marked.
+    return ([message for message in messages if message.get('hit')] or messages)[0]
+
+def unseen(scraper, found, id):
+    """
+    Return true if a message is new to the scraper and to the day being scraped, keeping its ID with the rest of the day's.
+    The day's IDs only go into the scraper's SeenFilter once the day is finished, so a day that fails part of the way through doesn't drop its messages as duplicates when it's scraped again.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param found: The set of message IDs that the day has found so far.
+    :param id: The message ID.
+    """
+
+    # Message IDs are snowflakes, so compare them as integers.
+    id = int(id)
+
+    # Skip the message if the day or an earlier one already found it.
+    if id in found or id in scraper.seen:
+        return False
+
+    # Keep the ID with the rest of the day's.
+    found.add(id)
+    return True
+
+def scrapeDay(scraper, channel, day, context=None):
+    """
+    Scrape a single day of messages from a channel, this is shared between guild channels and direct messages.
+    :param scraper: The DiscordScraper class reference that we will be using (the names, folders, and referer should already be set).
     :param channel: The ID for the channel that we're wanting to scrape from.
+    :param day: The datetime object for the day that we're wanting to scrape.
+    :param context: A dictionary describing what is being scraped, this is written alongside the dead letters.
     """
 
     # Get the snowflakes for the current day.
     snowflakes = DiscordScraper.getDayBounds(day.day, day.month, day.year)
 
-    # Generate a valid URL to the undocumented API function for the search feature.
-    search = 'https://discord.com/api/{0}/channels/{1}/messages/search?min_id={2}&max_id={3}&{4}'.format(scraper.apiversion, channel, snowflakes[0], snowflakes[1], scraper.query)
+    # Open the cache file for the day (this is empty if the day is already cached or caching is turned off).
+    cache = scraper.openJSONCache(day.year, day.month, day.day)
 
-    # Update the HTTP request headers to set the referer to the current guild channel URL.
-    scraper.headers.update({'Referer': 'https://discord.com/channels/{0}/{1}'.format(guild, channel)})
+    # Create a list to store the messages that were found, this is what the day is compared with when we're detecting changes.
+    hits = []
+
+    # Create a set to store the IDs of the messages that were found.
+    found = set()
 
     try:
-        # Generate the guild name.
-        if scraper.guildname == None:
-            scraper.grabGuildName(guild)
+        # Search the day once per query.
+        for query in scraper.queries:
 
-        # Generate the channel name.
-        if scraper.channelname == None:
-            scraper.grabChannelName(channel)
+            # Generate a valid URL to the undocumented API function for the search feature.
+            search = 'https://discord.com/api/{0}/channels/{1}/messages/search?min_id={2}&max_id={3}&{4}'.format(scraper.apiversion, channel, snowflakes[0], snowflakes[1], query)
 
-        # Generate the scrape folders. TODO: Re-enable this before pushing to the public.
-        scraper.createFolders()
+            # Iterate through the search pages as they come in.
+            for data in searchPages(scraper, search, context):
 
-        # Grab the API response for the search query URL.
-        response = DiscordScraper.requestData(search, scraper.headers)
+                # Drop the message groups that we've already seen (the queries for the day can return the same message).
+                messages = [group for group in data['messages'] if unseen(scraper, found, searchHit(group)['id'])]
 
-        # If we returned nothing then continue on to the previous day.
-        if response is None:
+                # Cache the messages on this page (empty pages never create a cache file).
+                if cache is not None:
+                    cache.write(messages)
 
-            # Set the day to yesterday.
-            day += timedelta(days=-1)
+                # Keep the messages if we're detecting changes.
+                if scraper.detectChanges:
+                    hits.extend(searchHit(group) for group in messages)
+
+                # Check the mimetypes of the embedded and attached files, using the same response shape as the search.
+                scraper.checkMimetypes({'total_results': len(messages), 'messages': messages})
 
-            # Recursively call this function with the new day.
-            startGuild(scraper, guild, channel, day)
-        
-        # Read the response data.
-        data = loads(response.read().decode('iso-8859-1'))
-        
-        # Get the number of posts.
-        posts = data['total_results']
-        
-        # Determine if we have multiple offsets.
-        if (posts > 25):
-            pages = int(posts / 25) + 1
-            
-            for page in range(2, pages + 1):
-                # Generate a valid URL to the undocumented API function for the search feature.
-                search = 'https://discord.com/api/{0}/channels/{1}/messages/search?min_id={2}&max_id={3}&{4}&offset={5}'.format(scraper.apiversion, channel, snowflakes[0], snowflakes[1], scraper.query, 25 * (page - 1))
-
-                # Update the HTTP request headers to set the referer to the current guild channel URL.
-                scraper.headers.update({'Referer': 'https://discord.com/channels/{0}/{1}'.format(guild, channel)})
-
-                try:
-
-                    # Grab the API response for the search query URL.
-                    response = DiscordScraper.requestData(search, scraper.headers)
-                    
-                    # Read the response data.
-                    data2 = loads(response.read().decode('iso-8859-1'))
-                    
-                    # Append the messages from data2 into data.
-                    for message in data2['messages']:
-                        data['messages'].append(message)
-                        
-                except:
-                    pass
-            
-
-        # Cache the JSON data if there's anything to cache (don't fill the cache directory with useless API response junk).
-        if posts > 0:
-            scraper.downloadJSON(data, day.year, day.month, day.day)
-
-        # Check the mimetypes of the embedded and attached files.
-        scraper.checkMimetypes(data)
-        
     except:
-        pass
+        # Throw away the unfinished cache file so the day gets scraped again on the next run.
+        if cache is not None:
+            cache.abort()
+
+        raise
+
+    finally:
+        # Download the files that were queued up from every page of the day.
+        scraper.flushDownloads()
+
+    # Move the finished cache file into place.
+    if cache is not None:
+        cache.close()
+
+    # Remember the messages now that the day is finished.
+    for id in found:
+        scraper.seen.add(id)
+
+    # Log the messages that were posted, edited, or deleted since the last time the day was scraped.
+    scraper.recordChanges(day.year, day.month, day.day, hits)
+
+def scrapeGuildDay(scraper, guild, channelnames, day):
+    """
+    Scrape a single day of messages from many channels at once with the guild search, then fan the results out per channel.
+    :param scraper: The DiscordScraper class reference that we will be using (the guild name and referer should already be set).
+    :param guild: The ID for the guild that we're wanting to scrape from.
+    :param channelnames: A dictionary of channel IDs to their folder names for the channels we're wanting to scrape.
+    :param day: The datetime object for the day that we're wanting to scrape.
+    """
+
+    # Get the snowflakes for the current day.
+    snowflakes = DiscordScraper.getDayBounds(day.day, day.month, day.year)
+
+    # Filter the guild search down to the channels that we're wanting to scrape.
+    channelfilter = '&'.join(['channel_id={0}'.format(channel) for channel in channelnames])
+
+    # Create a dictionary to store the cache file for each channel that has results for this day.
+    caches = {}
+
+    # Create a dictionary to store the messages that were found in each channel, this is what the day is compared with when we're detecting changes.
+    hits = dict((channel, []) for channel in channelnames)
+
+    # Create a set to store the IDs of the messages that were found.
+    found = set()
+
+    # Search the day once per query, stringing the search pages of every query together.
+    def pages():
+        for query in scraper.queries:
+
+            # Generate a valid URL to the undocumented API function for the guild-wide search feature.
+            search = 'https://discord.com/api/{0}/guilds/{1}/messages/search?{2}&min_id={3}&max_id={4}&{5}'.format(scraper.apiversion, guild, channelfilter, snowflakes[0], snowflakes[1], query)
+
+            for data in searchPages(scraper, search, {'guild': guild, 'channels': list(channelnames), 'day': day.strftime('%Y-%m-%d')}):
+                yield data
+
+    try:
+        # Iterate through the search pages as they come in.
+        for data in pages():
+
+            # Create a dictionary to sort the message groups on this page by the channel they were posted in.
+            perchannel = {}
+
+            # Iterate through the message groups one-by-one.
+            for messages in data['messages']:
+
+                # The search hit is the message that matched, the rest of the group (if any) is surrounding context.
+                hit = searchHit(messages)
+
+                # Skip the message groups that we've already seen (the queries for the day can return the same message).
+                if not unseen(scraper, found, hit['id']):
+                    continue
+
+                # Append the message group to the channel that the hit was posted in.
+                perchannel.setdefault(hit['channel_id'], []).append(messages)
+
+            # Iterate through the channels that had results on this page.
+            for channel, messages in perchannel.items():
+
+                # Skip any channel that we didn't ask for.
+                if channel not in channelnames:
+                    continue
+
+                # Point the scraper at the folders for this channel.
+                scraper.channelname = channelnames[channel]
+                scraper.createFolders()
+
+                # Open the cache file for this channel the first time it shows up.
+                if channel not in caches:
+                    caches[channel] = scraper.openJSONCache(day.year, day.month, day.day)
+
+                # Cache the messages for this channel.
+                if caches[channel] is not None:
+                    caches[channel].write(messages)
+
+                # Keep the messages if we're detecting changes.
+                if scraper.detectChanges:
+                    hits[channel].extend(searchHit(group) for group in messages)
+
+                # Check the mimetypes of the embedded and attached files, using the same response shape as the per-channel search.
+                scraper.checkMimetypes({'total_results': len(messages), 'messages': messages})
+
+    except:
+        # Throw away the unfinished cache files so the day gets scraped again on the next run.
+        for cache in caches.values():
+            if cache is not None:
+                cache.abort()
+
+        raise
+
+    finally:
+        # Download the files that were queued up from every page of the day.
+        scraper.flushDownloads()
+
+    # Move the finished cache files into place.
+    for cache in caches.values():
+        if cache is not None:
+            cache.close()
+
+    # Remember the messages now that the day is finished.
+    for id in found:
+        scraper.seen.add(id)
+
+    # Log the messages that were posted, edited, or deleted since the last time the day was scraped, a channel with nothing left counts too.
+    if scraper.detectChanges:
+        for channel, messages in hits.items():
+            scraper.channelname = channelnames[channel]
+            scraper.recordChanges(day.year, day.month, day.day, messages)
+
+def startDM(scraper, alias, channel, day=None):
+    """
+    The initialization function for the scraper script to grab direct message contents.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param alias: The named alias for the direct message.
+    :param channel: The ID for the direct message we're wanting to scrape from.
+    :param day: The datetime object for the day that we're wanting to scrape.
+    """
+
+    # Update the HTTP request headers to set the referer to the current direct message URL.
+    scraper.headers.update({'Referer': 'https://discord.com/channels/@me/{0}'.format(channel)})
+
+    # Use the alias as the folder name in place of the guild name.
+    if scraper.guildname == None:
+        scraper.grabGuildName(alias, True)
+
+    # Use the channel ID as the folder name in place of the channel name.
+    if scraper.channelname == None:
+        scraper.grabChannelName(channel, True)
+
+    # Generate the scrape folders.
+    scraper.createFolders()
+
+    # Run the same day scraper that the guild channels use.
+    scrapeDay(scraper, channel, day, {'guild': alias, 'channel': channel, 'dm': True, 'day': day.strftime('%Y-%m-%d')})
+
+    # Set the day to yesterday.
+    day += timedelta(days=-1)
+
+    # Return the new day
+    return day
+
+def startGuild(scraper, guild, channel, day=None):
+    """
+    The initialization function for the scraper script.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param guild: The ID for the guild that we're wanting to scrape from.
+    :param channel: The ID for the channel that we're wanting to scrape from.
+    """
+
+    # Update the HTTP request headers to set the referer to the current guild channel URL.
+    scraper.headers.update({'Referer': 'https://discord.com/channels/{0}/{1}'.format(guild, channel)})
+
+    # Generate the guild name.
+    if scraper.guildname == None:
+        scraper.grabGuildName(guild)
+
+    # Generate the channel name.
+    if scraper.channelname == None:
+        scraper.grabChannelName(channel)
+
+    # Generate the scrape folders.
+    scraper.createFolders()
+
+    # Scrape the messages for the current day.
+    scrapeDay(scraper, channel, day, {'guild': guild, 'channel': channel, 'dm': False, 'day': day.strftime('%Y-%m-%d')})
 
     # Set the day to yesterday.
     day += timedelta(days=-1)
@@ -161,53 +477,817 @@ def startGuild(scraper, guild, channel, day=None):
     # Return the new day
     return day
         
-def start(scraper, guild, channel, day=None):
+def startGuildWide(scraper, guild, channels, day=None, until=None):
     """
-    The initialization function for the scraper script.
+    The initialization function for scraping a guild with the guild-wide search instead of one search per channel.
     :param scraper: The DiscordScraper class reference that we will be using.
     :param guild: The ID for the guild that we're wanting to scrape from.
+    :param channels: The IDs for the channels that we're wanting to scrape from.
+    :param day: The datetime object for the most recent day that we're wanting to scrape.
+    :param until: The datetime object for the oldest day that we're wanting to scrape, defaults to the oldest day that Discord has.
+    """
+
+    # Update the HTTP request headers to set the referer to the current guild URL.
+    scraper.headers.update({'Referer': 'https://discord.com/channels/{0}'.format(guild)})
+
+    # Generate the guild name.
+    scraper.grabGuildName(guild)
+
+    # Create a dictionary to store the folder names for each channel.
+    channelnames = {}
+
+    # Generate the channel names up front since every day can contain messages from any of them.
+    for channel in channels:
+        scraper.grabChannelName(channel)
+        channelnames[channel] = scraper.channelname
+
+    # Determine if the day is empty, default to the current day (in UTC) if so.
+    if day is None:
+        day = datetime.utcnow()
+
+    # Create a variable to store the number of days in a row that have failed.
+    failures = 0
+
+    # Determine if the until argument is not set.
+    if until is None:
+
+        # The smallest snowflake that Discord recognizes is from January 1, 2015.
+        until = datetime(2015, 1, 1)
+
+    # Walk backwards through the days until we hit the oldest one.
+    while day >= until and day > datetime(2015, 1, 1):
+
+        # Stop before the next day if we've been asked to, the next run carries on from the most recent day again.
+        if scraper.shutdown.requested():
+            break
+
+        try:
+            # Scrape every channel for the current day with a single search.
+            scrapeGuildDay(scraper, guild, channelnames, day)
+
+            # Reset the failure count.
+            failures = 0
+
+        except Exception as ex:
+
+            # Warn about the failed day and count it.
+            failures += 1
+            failedDay(scraper, ex, {'guild': guild, 'channels': list(channelnames), 'day': day.strftime('%Y-%m-%d')})
+
+        # Give up on the guild if too many days in a row have failed, the dead letter lets a later run pick up where we left off.
+        if failures >= MAXFAILEDDAYS:
+            warn('Giving up on guild {0} after {1} failed days in a row.'.format(guild, failures))
+            scraper.retry.deadLetter(None, 'giveup', 'Too many failed days in a row.', {'guild': guild, 'channels': list(channelnames), 'from': (day + timedelta(days=-1)).strftime('%Y-%m-%d')})
+            break
+
+        # Set the day to yesterday.
+        day += timedelta(days=-1)
+
+def start(scraper, guild, channel, day=None, dm=None, until=None, keepgoing=None, onday=None):
+    """
+    The initialization function for the scraper script.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param guild: The ID for the guild that we're wanting to scrape from (or the alias when scraping a direct message).
     :param channel: The ID for the channel that we're wanting to scrape from.
+    :param day: The datetime object for the most recent day that we're wanting to scrape.
+    :param dm: A true or false (boolean) value that determines if we're scraping a direct message.
+    :param until: The datetime object for the oldest day that we're wanting to scrape, defaults to the oldest day that Discord has.
+    :param keepgoing: A function that is called before every day, the scraper stops early once it returns false.
+    :param onday: A function that is called with each day once it has been scraped (or written to the dead letter file).
+    :return: True if every day down to the oldest one was scraped, False if the scraper stopped early.
     """
     
-    # Determine if we've already initialized the DiscordScraper class, if so then clean it out and re-initialize a new one.
+    # If the dm is empty, then set it to false.
+    if dm is None:
+        dm = False
+
+    # Determine if we've already initialized the DiscordScraper class, if so then clear out the names from the previous channel (the name cache keeps them around).
     if scraper is not None:
-        del scraper
+        scraper.guildname = None
+        scraper.channelname = None
+        scraper.location = None
+
+    # Otherwise initialize a new one.
+    else:
         scraper = DiscordScraper()
 
-    # Determine if the day is empty, default to the current day if so.
+    # Determine if the day is empty, default to the current day (in UTC) if so.
     if day is None:
-        day = datetime.today()
+        day = datetime.utcnow()
 
-    # Determine if the year is no less than 2015 since any time before this point will be guaranteed invalid.
+    # Determine if the year is no less than 2015 since any time before this point will be guaranteed invalid, there's nothing to scrape if it is.
     if day.year <= 2014:
-        exit(0)
+        return True
+
+    # Direct messages and guild channels only differ in how they're named and referred to, the day scraper is shared.
+    startChannel = startDM if dm else startGuild
+
+    # Determine if the until argument is not set.
+    if until is None:
+
+        # The smallest snowflake that Discord recognizes is from January 1, 2015.
+        until = datetime(2015, 1, 1)
         
-    # The smallest snowflake that Discord recognizes is from January 1, 2015.
-    while day > datetime(2015, 1, 1):
-        day = startGuild(scraper, guild, channel, day)
+    # Create a variable to store the number of days in a row that have failed.
+    failures = 0
+
+    # Walk backwards through the days until we hit the oldest one.
+    while day >= until and day > datetime(2015, 1, 1):
+
+        # Stop early if we've been told to (or asked to stop with CTRL+C).
+        if scraper.shutdown.requested() or (keepgoing is not None and not keepgoing()):
+            return False
+
+        try:
+            # Scrape the current day.
+            startChannel(scraper, guild, channel, day)
+
+            # Reset the failure count.
+            failures = 0
+
+            # Let the caller know that the day is done.
+            if onday is not None:
+                onday(day)
+
+            # Move on to the previous day.
+            day += timedelta(days=-1)
+            continue
+
+        except Exception as ex:
+
+            # Warn about the failed day and count it.
+            failures += 1
+            failedDay(scraper, ex, {'guild': guild, 'channel': channel, 'dm': dm, 'day': day.strftime('%Y-%m-%d')})
+
+        # Give up on the channel if too many days in a row have failed, the dead letter lets a later run pick up where we left off.
+        if failures >= MAXFAILEDDAYS:
+            warn('Giving up on channel {0} after {1} failed days in a row.'.format(channel, failures))
+            scraper.retry.deadLetter(None, 'giveup', 'Too many failed days in a row.', {'guild': guild, 'channel': channel, 'dm': dm, 'from': (day + timedelta(days=-1)).strftime('%Y-%m-%d')})
+            return False
+
+        # The failed day is in the dead letter file, so it counts as done.
+        if onday is not None:
+            onday(day)
+
+        # Set the day to yesterday.
+        day += timedelta(days=-1)
+
+    # Every day was scraped (or written to the dead letter file).
+    return True
+
+def startWorker(scraper, queuefile, worker, lease=None):
+    """
+    Pull work units from a shared queue file and scrape them until there's nothing left, many nodes can run this against the same file.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param queuefile: The full file path to the SQLite queue file.
+    :param worker: A name for this worker that is unique across the nodes.
+    :param lease: The number of seconds a lease lasts without a heartbeat, defaults to 300.
+    """
+
+    # Determine if the lease argument is not set.
+    if lease is None:
+
+        # Set it to the default value of five minutes.
+        lease = 300
+
+    # Open the queue file.
+    queue = WorkQueue(queuefile)
+
+    # Keep claiming units until there's nothing left (or we've been asked to stop).
+    while not scraper.shutdown.requested():
+        unit = queue.claim(worker, lease)
+
+        if unit is None:
+            break
+
+        # Create an event that tells the heartbeat thread to stop, and one that tells us the lease was lost.
+        finished = Event()
+        lost = Event()
+
+        def heartbeat(id):
+
+            # Use a separate connection to the queue file since SQLite connections can't be shared between threads.
+            beats = WorkQueue(queuefile)
+
+            # Extend the lease a few times per lease period until the unit is done.
+            while not finished.wait(lease / 3.0):
+                if not beats.heartbeat(id, worker, lease):
+                    lost.set()
+                    break
+
+            beats.close()
+
+        # Start sending heartbeats for the unit.
+        beater = Thread(target=heartbeat, args=(unit['id'],))
+        beater.daemon = True
+        beater.start()
+
+        try:
+            # Don't start from a day after the most recent post in the channel.
+            lastdate = getLastMessageDM(scraper, unit['guild'], unit['channel']) if unit['dm'] else getLastMessageGuild(scraper, unit['guild'], unit['channel'])
+            newest = min(unit['newest'], lastdate) if lastdate is not None else unit['newest']
+
+            # Scrape the window, stopping early if another worker has taken the unit over.
+            finishedAll = start(scraper, unit['guild'], unit['channel'], newest, unit['dm'], unit['oldest'], lambda: not lost.is_set())
+
+        except Exception as ex:
+            warn('Work unit {0} failed: {1}'.format(unit['id'], ex))
+            finishedAll = False
+
+        # Stop sending heartbeats.
+        finished.set()
+        beater.join()
+
+        # Report back to the queue.
+        if lost.is_set():
+            warn('Lost the lease on work unit {0}, another worker has taken it over.'.format(unit['id']))
+        elif scraper.shutdown.requested() and not finishedAll:
+            queue.release(unit['id'], worker)
+        elif finishedAll:
+            queue.complete(unit['id'], worker)
+        else:
+            queue.fail(unit['id'], worker)
+
+    # Close the queue file.
+    queue.close()
+
+def startWorkers(scraper, targets, deadline=None):
+    """
+    Scrape every channel in order of priority: each channel is brought up to date first, then the older history is backfilled a slice at a time in turn.
+    The work is spread over every authorization token in the pool, each token scrapes one window at a time on its own thread.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param targets: A list of (guild, channel, dm) tuples for everything we want to scrape.
+    :param deadline: The time (in seconds since the epoch) after which no more backfill is started, defaults to running until everything is scraped.
+    """
+
+    # Grab the scheduler that decides which window of days each channel gets next.
+    scheduler = scraper.scheduler
+
+    # Every channel starts with a catch-up item, the window is worked out once we know when the most recent post was.
+    queue = ChannelQueue(scraper.tokens, [(guild, channel, dm, None) for guild, channel, dm in targets])
+
+    def backfilling():
+
+        # Keep backfilling until we run out of time.
+        return deadline is None or time() < deadline
+
+    def work(token):
+
+        # Create a copy of the scraper that uses this token.
+        worker = scraper.clone(token) if len(scraper.tokens) > 1 else scraper
+
+        # Keep taking windows until there's nothing left that this token can see (or we've been asked to stop).
+        while not scraper.shutdown.requested():
+            item = queue.take(token)
+
+            if item is None:
+                return None
+
+            # Hand the window back if we were asked to stop while waiting for it.
+            if scraper.shutdown.requested():
+                queue.done(item)
+                return None
+
+            guild, channel, dm, window = item
+
+            try:
+                # Bring the channel up to date.
+                if window is None:
+
+                    # Retrieve the datetime object for the most recent post in the channel (this also tells us whether the token can see the channel).
+                    lastdate = getLastMessageDM(worker, guild, channel) if dm else getLastMessageGuild(worker, guild, channel)
+
+                    # Put the channel back for the other tokens if this one can't see it.
+                    if not scraper.tokens.hasAccess(token, channel):
+                        queue.done(item, True)
+                        continue
+
+                    # Work out the days between the most recent post and the newest day that we already have.
+                    window = scheduler.catchUp(channel, lastdate) if lastdate is not None else None
+
+                    # Scrape the window, it only counts once every day in it is done since the range can't have any gaps.
+                    if window is not None and start(worker, guild, channel, window[0], dm, window[1]):
+                        scheduler.caughtUp(channel, window)
+
+                # Otherwise scrape the next slice of older history, recording each day as we go so stopping part way through isn't wasted.
+                else:
+                    start(worker, guild, channel, window[0], dm, window[1], backfilling, lambda day: scheduler.backfilled(channel, day))
+
+            except Exception as ex:
+                warn('Failed to scrape channel {0}: {1}'.format(channel, ex))
+
+            # Queue up the next slice of older history behind every other channel, so the channels take turns.
+            following = scheduler.nextBackfill(channel)
+
+            if following is not None and backfilling() and not scraper.shutdown.requested():
+                queue.put((guild, channel, dm, following))
+
+            queue.done(item)
+
+    # Scrape on this thread if there's only one token.
+    if len(scraper.tokens) == 1:
+        work(scraper.tokens.tokens[0])
+
+    # Otherwise start one thread per token.
+    else:
+        threads = [Thread(target=work, args=(token,)) for token in scraper.tokens.tokens]
+
+        for thread in threads:
+            thread.start()
+
+        # Wait for every thread to run out of work.
+        for thread in threads:
+            thread.join()
+
+    # Warn about the channels that none of the tokens could see.
+    for item in queue.dropped:
+        warn('None of the authorization tokens can see channel {0}, skipping it!'.format(item[1]))
+
+def follow(scraper, targets, since=None):
+    """
+    Poll every channel for new messages until the script is stopped, the new messages go through the same cache and download paths as a full scrape.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param targets: A list of (guild, channel, dm) tuples for everything we want to follow.
+    :param since: The time (in seconds since the epoch) to start from for channels that haven't been followed before, defaults to now.
+    """
+
+    # Grab the follower that decides which channel to poll next.
+    follower = scraper.getFollower()
+
+    # Create a dictionary to look up the guild of each channel.
+    channels = {}
+
+    # Start following every channel.
+    for guild, channel, dm in targets:
+        channels[str(channel)] = (guild, dm)
+        follower.add(channel, DiscordScraper.timestampToSnowflake(since if since is not None else time()))
+
+    # Keep polling until every channel has been dropped (or we've been asked to stop).
+    while len(follower.schedule) > 0:
+
+        # Wait for the next channel to be due, waking up straight away if we're asked to stop.
+        wait, channel = follower.next()
+
+        if scraper.shutdown.wait(wait):
+            break
+
+        guild, dm = channels[channel]
+
+        # Update the HTTP request headers to set the referer to the current channel URL.
+        scraper.headers.update({'Referer': 'https://discord.com/channels/{0}/{1}'.format('@me' if dm else guild, channel)})
+
+        # Point the scraper at the folders for this channel (the names come from the name cache).
+        scraper.guildname = scraper.channelname = None
+        scraper.grabGuildName(guild, dm)
+        scraper.grabChannelName(channel, dm)
+        scraper.createFolders()
+
+        # Generate a valid URL to the documented API function for retrieving the channel messages that came after the last one we saw.
+        messages = 'https://discord.com/api/{0}/channels/{1}/messages?after={2}&limit=100'.format(scraper.apiversion, channel, follower.after[channel])
+
+        try:
+            # Grab the new messages.
+            response = DiscordScraper.requestData(messages, scraper.headers, scraper.retry)
+
+            # Read the response data and sort the messages from oldest to newest.
+            batch = sorted(loads(response.read().decode('utf-8')), key=lambda message: int(message['id']))
+
+        except Exception as ex:
+
+            # Stop following a channel that the token can't see anymore.
+            if not scraper.tokens.hasAccess(scraper.headers['Authorization'], channel):
+                warn('Unable to see channel {0} anymore, no longer following it!'.format(channel))
+                continue
+
+            # Otherwise try again later.
+            warn('Failed to poll channel {0}: {1}'.format(channel, ex))
+            follower.polled(channel)
+            continue
+
+        # Back off if there's nothing new.
+        if len(batch) == 0:
+            follower.polled(channel)
+            continue
+
+        # Wrap each message up as a message group so it has the same shape as the search results.
+        groups = [[message] for message in batch]
+
+        # Create a dictionary to sort the message groups by the day they were posted.
+        days = {}
+
+        for group in groups:
+            day = datetime.utcfromtimestamp(DiscordScraper.snowflakeToTimestamp(int(group[0]['id'])))
+            days.setdefault((day.year, day.month, day.day), []).append(group)
+
+        # Append the messages to the follow file of each day.
+        for (year, month, day), daygroups in days.items():
+            scraper.appendJSONCache(year, month, day, daygroups)
+
+        # Check the mimetypes of the attached and embedded files.
+        scraper.checkMimetypes({'total_results': len(groups), 'messages': groups})
+        scraper.flushDownloads()
+
+        # Poll again sooner, straight away if the page was full.
+        follower.polled(channel, batch[-1]['id'], len(batch) == 100)
+
+def planWindow(scraper, estimate, channel, start, end, window):
+    """
+    Search a window of days with every query to count the messages without scraping them, splitting the window in half while it's busy and longer than the coarse window size.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param estimate: The ChannelPlan to add the window to.
+    :param channel: The ID for the channel that we're wanting to plan.
+    :param start: The datetime object (in UTC) for the start of the window.
+    :param end: The datetime object (in UTC) for the end of the window, this day isn't part of it.
+    :param window: The number of days in a window that is searched as a whole even when it's busy.
+    """
+
+    # Get the number of days and the snowflakes for the window.
+    days = (end - start).days
+    snowflakes = DiscordScraper.getWindowBounds(start, end)
+
+    # Create some lists to store the number of results and the first page of each query.
+    totals = []
+    pages = []
+
+    # Search the window once per query.
+    for query in scraper.queries:
+
+        # Generate a valid URL to the undocumented API function for the search feature.
+        search = 'https://discord.com/api/{0}/channels/{1}/messages/search?min_id={2}&max_id={3}&{4}'.format(scraper.apiversion, channel, snowflakes[0], snowflakes[1], query)
+
+        # Grab the first page, timing how long the request takes under the current rate limits.
+        started = time()
+        response = DiscordScraper.requestData(search, scraper.headers, scraper.retry)
+        estimate.timings.append(time() - started)
+
+        # Read the response data.
+        data = loads(response.read().decode('utf-8'))
+        totals.append(data['total_results'])
+        pages.append(data)
+
+    # Split a busy window in half so the results aren't assumed to be spread over too many days.
+    if days > window and any(total > PAGESIZE for total in totals):
+        middle = start + timedelta(days=days // 2)
+        planWindow(scraper, estimate, channel, start, middle, window)
+        planWindow(scraper, estimate, channel, middle, end, window)
+        return None
+
+    # Add the window to the estimate.
+    estimate.addWindow(days, totals)
+
+    # Add the messages on the first pages (and the files we'd download from them) to the sample.
+    for data in pages:
+        groups = [group for group in data['messages'] if searchHit(group)['id'] not in estimate.sampled]
+        estimate.addSample([searchHit(group)['id'] for group in groups], scraper.selectFiles({'total_results': len(groups), 'messages': groups}))
+
+def plan(scraper, targets, window=None):
+    """
+    Estimate the number of requests, messages, files, bytes, and the time that scraping every channel takes, without scraping or downloading anything.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param targets: A list of (guild, channel, dm) tuples for everything we want to plan.
+    :param window: The number of days in a window that is searched as a whole even when it's busy, defaults to 30.
+    """
+
+    # Determine if the window argument is not set.
+    if window is None:
+
+        # Set it to the default value of 30.
+        window = 30
+
+    # Grab the download settings that the durations depend on.
+    settings = (scraper.buffersize, scraper.asyncDownloads, scraper.options['downloadRate'])
+
+    # Create a list to store the estimate for each channel.
+    estimates = []
+
+    # Iterate through the channels one-by-one.
+    for guild, channel, dm in targets:
+
+        # Stop planning if we've been asked to stop.
+        if scraper.shutdown.requested():
+            break
+
+        # Find the most recent message in the channel, there's nothing to plan if there isn't one.
+        lastdate = getLastMessageDM(scraper, guild, channel) if dm else getLastMessageGuild(scraper, guild, channel)
+
+        if lastdate is None:
+            warn('Unable to find the most recent message in channel {0}, skipping it!'.format(channel))
+            continue
+
+        # Name the estimate after the guild and the channel.
+        estimate = ChannelPlan('{0}/{1}'.format(guild if dm else scraper.names.get(guild) or guild, scraper.names.get(channel) or channel))
+
+        try:
+            # Search everything from the oldest day that Discord has up to the end of the most recent day.
+            planWindow(scraper, estimate, channel, datetime(2015, 1, 1), datetime(lastdate.year, lastdate.month, lastdate.day) + timedelta(days=1), window)
+
+        except Exception as ex:
+            warn('Unable to plan channel {0}: {1}'.format(channel, ex))
+            continue
+
+        # Ask for the size of some of the files that didn't come with one.
+        for index, url in estimate.unknown[:PLANHEADS]:
+            started = time()
+            estimate.setSize(index, DiscordScraper.requestSize(url, scraper.headers))
+            estimate.timings.append(time() - started)
+
+        # Print the estimate for the channel.
+        print(estimate.describe(*settings))
+        estimates.append(estimate)
+
+    # Add up the estimates, the channels are spread over the authorization tokens so they're scraped that many at a time.
+    requests = sum(estimate.requests for estimate in estimates)
+    messages = sum(estimate.messages for estimate in estimates)
+    files = sum(estimate.estimate()[0] for estimate in estimates)
+    size = sum(estimate.estimate()[1] for estimate in estimates)
+    seconds = sum(estimate.duration(*settings) for estimate in estimates) / max(1, len(scraper.tokens))
+
+    # Print the totals.
+    print('Total: {0} search requests, {1} messages, {2} files ({3}), about {4} with {5} token(s)'.format(requests, messages, files, formatBytes(size), timedelta(seconds=int(seconds)), len(scraper.tokens)))
+
+def recheck(scraper, targets, days):
+    """
+    Scrape the most recent days of every channel again, logging the messages that were posted, edited, or deleted since the days were last scraped.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param targets: A list of (guild, channel, dm) tuples for everything we want to check.
+    :param days: The number of days to check, counting back from today (in UTC).
+    """
+
+    # Compare every day with the last scrape of it, which needs every message to be searched for.
+    scraper.detectChanges = True
+    scraper.planSearch()
+
+    # Work out the window of days to check.
+    newest = datetime.utcnow()
+    newest = datetime(newest.year, newest.month, newest.day)
+    oldest = newest - timedelta(days=max(1, days) - 1)
+
+    # Check each channel in turn.
+    for guild, channel, dm in targets:
+
+        # Stop if we've been asked to.
+        if scraper.shutdown.requested():
+            break
+
+        start(scraper, guild, channel, newest, dm, oldest)
+
+    # Let the user know what changed, the details are in the change log of each channel.
+    print('Found {0} new, {1} edited, and {2} deleted messages.'.format(*scraper.changes))
+
+def failedDay(scraper, ex, context):
+    """
+    Warn about a day that couldn't be scraped and make sure that it's in the dead letter file.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    :param ex: The exception that stopped the day from being scraped.
+    :param context: A dictionary describing the day that failed.
+    """
+
+    # Warn about the failed day.
+    warn('Failed to scrape {0}: {1}'.format(context['day'], ex))
+
+    # Failed requests are already in the dead letter file, anything else (e.g. a malformed response) still needs to be written there.
+    if not isinstance(ex, RetryError):
+        scraper.retry.deadLetter(None, 'error', ex, context)
+
+def refetch(scraper):
+    """
+    Retry everything in the dead letter file: failed days are scraped again, failed files are downloaded again.
+    :param scraper: The DiscordScraper class reference that we will be using.
+    """
+
+    # Create a set to store the days that we've already scraped again, many failed pages can belong to the same day.
+    done = set()
+
+    # Iterate through the dead letters (anything that fails again is written back to the file).
+    for letter in scraper.retry.takeDeadLetters():
+
+        # Put the dead letters that we haven't got to back into the file if we've been asked to stop.
+        if scraper.shutdown.requested():
+            scraper.retry.deadLetter(letter['url'], letter['kind'], letter['reason'], letter['context'])
+            continue
+
+        # Grab the description of the failed request.
+        context = letter['context']
+
+        # Grab the channels that the dead letter belongs to.
+        channels = context.get('channels', [context.get('channel')])
+
+        # Create a key that describes the work so duplicates are only done once.
+        key = (context.get('guild'), tuple(channels), context.get('day'), context.get('from'), context.get('filename'))
+
+        # Skip the dead letter if we've already taken care of it.
+        if key in done:
+            continue
+
+        done.add(key)
+
+        try:
+            # Download the failed file again.
+            if 'filename' in context:
+                scraper.startDownloading(letter['url'], path.split(context['filename'])[0])
+                scraper.flushDownloads()
+
+            # Scrape the failed day again.
+            elif 'day' in context:
+                day = datetime.strptime(context['day'], '%Y-%m-%d')
+                scraper.guildname = scraper.channelname = None
+
+                if 'channels' in context:
+                    startGuildWide(scraper, context['guild'], channels, day, day)
+                elif context.get('dm'):
+                    startDM(scraper, context['guild'], context['channel'], day)
+                else:
+                    startGuild(scraper, context['guild'], context['channel'], day)
+
+            # Carry on with a channel that we gave up on.
+            elif 'from' in context:
+                day = datetime.strptime(context['from'], '%Y-%m-%d')
+
+                if 'channels' in context:
+                    startGuildWide(scraper, context['guild'], channels, day)
+                else:
+                    start(scraper, context['guild'], context['channel'], day, context.get('dm'))
+
+            # Keep the dead letters that we don't know how to replay instead of dropping them.
+            else:
+                warn('Don\'t know how to refetch {0}, keeping it in the dead letter file.'.format(letter['url'] or context))
+                scraper.retry.deadLetter(letter['url'], letter['kind'], letter['reason'], context)
+
+        except Exception as ex:
+
+            # Make sure that a day which failed again ends up back in the dead letter file.
+            if 'day' in context:
+                failedDay(scraper, ex, context)
+            else:
+                warn('Failed to refetch {0}: {1}'.format(letter['url'] or context, ex))
 
 if __name__ == '__main__':
     """
     This is the entrypoint for our script since __name__ is going to be set to __main__ by default.
     """
 
-    # Create a variable that references the Discord Scraper class.
-    discordscraper = DiscordScraper()
+    # Create the command-line argument parser.
+    parser = ArgumentParser(description='Scrape messages and files from Discord guild channels and direct messages.')
+    parser.add_argument('--refetch', action='store_true', help='retry the pages, days, and files in the dead letter file instead of scraping everything')
+    parser.add_argument('--coordinator', metavar='QUEUEFILE', help='split the configured channels into work units in a shared queue file and exit')
+    parser.add_argument('--worker', metavar='QUEUEFILE', help='scrape work units from a shared queue file until there are none left')
+    parser.add_argument('--window', type=int, default=30, help='the number of days in each work unit, or in each search window of a --plan (default: 30)')
+    parser.add_argument('--lease', type=int, default=300, help='the number of seconds a work unit lease lasts without a heartbeat (default: 300)')
+    parser.add_argument('--name', default='{0}-{1}'.format(gethostname(), getpid()), help='the name of this worker, unique across the nodes (default: host-pid)')
+    parser.add_argument('--follow', action='store_true', help='bring every channel up to date, then keep polling them for new messages until stopped')
+    parser.add_argument('--budget', type=float, help='the number of minutes to spend on backfilling older history once every channel is up to date (default: no limit)')
+    parser.add_argument('--pack', metavar='FOLDER', help='move the small files in every channel folder under FOLDER into packs (using packThreshold and packSize) and exit')
+    parser.add_argument('--unpack', metavar='FOLDER', help='write the files in every pack under FOLDER back out as files of their own and exit')
+    parser.add_argument('--compact', metavar='FOLDER', help='merge the day caches in every channel folder under FOLDER into a compressed pack for each month and exit')
+    parser.add_argument('--recheck', type=int, metavar='DAYS', help='scrape the last DAYS days of every channel again and log the messages that were posted, edited, or deleted since they were last scraped to changes.jsonl')
+    parser.add_argument('--plan', action='store_true', help='estimate the requests, messages, downloads, and time each channel takes (searching --window days at a time) without scraping anything')
+    parser.add_argument('--trace', metavar='TRACEFILE', help='append the timings, status, and size of every request to TRACEFILE (one line of JSON each, tokens redacted)')
+    parser.add_argument('--analyze', metavar='TRACEFILE', help='print the 50th, 90th, and 99th percentile of each phase of the requests in TRACEFILE by endpoint and exit')
+    parser.add_argument('--har', metavar='TRACEFILE', help='convert TRACEFILE into TRACEFILE.har for a HAR viewer and exit')
+    arguments = parser.parse_args()
+
+    # Summarize a trace file if we were asked to, this doesn't need the config.
+    if arguments.analyze is not None:
+        print('\n'.join(analyze(arguments.analyze)))
+        stdout.flush()
+        exit(0)
+
+    # Convert a trace file into a HAR file if we were asked to.
+    if arguments.har is not None:
+        print('Wrote {0} requests to {1}.har.'.format(toHAR(arguments.har, '{0}.har'.format(arguments.har)), arguments.har))
+        stdout.flush()
+        exit(0)
+
+    try:
+        # Create a variable that references the Discord Scraper class.
+        discordscraper = DiscordScraper()
+
+    except ConfigError as ex:
+        error(ex)
+
+    # Trace every request if we were asked to.
+    if arguments.trace is not None:
+        discordscraper.retry.tracer = Tracer(arguments.trace)
+
+    # Tie SIGINT to the shutdown handler: the first CTRL+C lets the work in flight finish, the second one stops straight away.
+    signal(SIGINT, discordscraper.shutdown.handle)
+
+    # Move the small files that are already on the disk into packs if we were asked to.
+    if arguments.pack is not None:
+        print('Moved {0} files into packs.'.format(migrate(arguments.pack, discordscraper.options['packThreshold'], discordscraper.options['packSize'])))
+        stdout.flush()
+        exit(0)
+
+    # Write the files in the packs back out if we were asked to.
+    if arguments.unpack is not None:
+        print('Extracted {0} files from packs.'.format(extract(arguments.unpack)))
+        stdout.flush()
+        exit(0)
+
+    # Merge the day caches into month packs if we were asked to.
+    if arguments.compact is not None:
+        print('Compacted {0} day caches into month packs, dropping {1} duplicate messages.'.format(*compact(arguments.compact, discordscraper.storage.mirror)))
+        discordscraper.close()
+        stdout.flush()
+        exit(0)
+
+    # Only go through the dead letter file if we were asked to.
+    if arguments.refetch:
+        refetch(discordscraper)
+        discordscraper.close()
+        exit(0)
+
+    # Create a list of everything that we want to scrape so guild channels and direct messages go through the same loop.
+    targets = []
+
+    # Create a list to store the guilds that are searched as a whole, they're scraped once the scheduler has brought every other channel up to date.
+    guilds = []
+
+    # Only search whole guilds at a time on a plain run, the other modes work through their channels like any other.
+    guildwide = discordscraper.guildWideSearch and not arguments.plan and arguments.recheck is None and arguments.coordinator is None and arguments.worker is None and not arguments.follow
 
     # Iterate through the guilds to scrape.
     for guild, channels in discordscraper.guilds.items():
 
+        # Stop starting new guilds if we've been asked to stop.
+        if discordscraper.shutdown.requested():
+            break
+
+        # Grab all of the channel names for the guild in one request unless every one of them is already cached.
+        if any(discordscraper.names.get(channel) is None for channel in channels):
+            discordscraper.prefetchChannelNames(guild)
+
+        # Scrape the whole guild with one search per day later on if we've configured the script to do so.
+        if guildwide:
+            guilds.append((guild, channels))
+            continue
+
         # Iterate through the channels to scrape in the guild.
         for channel in channels:
+            targets.append((guild, channel, False))
 
-            # Retrieve the datetime object for the most recent post in the channel.
-            lastdate = getLastMessageGuild(discordscraper, guild, channel)
-
-            # Start the scraper for the current channel.
-            start(discordscraper, guild, channel, lastdate)
-    
     # Iterate through the direct messages to scrape.
     for alias, channel in discordscraper.directs.items():
+        targets.append((alias, channel, True))
+
+    # Estimate what scraping everything takes instead of scraping it.
+    if arguments.plan:
+        plan(discordscraper, targets, arguments.window)
+        stdout.flush()
+        exit(0)
+
+    # Look for the messages that changed in the most recent days instead of scraping everything.
+    if arguments.recheck is not None:
+        recheck(discordscraper, targets, arguments.recheck)
+        discordscraper.close()
+        stdout.flush()
+        exit(0)
+
+    # Split the channels into work units for the workers to pick up.
+    if arguments.coordinator is not None:
+        queue = WorkQueue(arguments.coordinator)
+        queue.plan(targets, window=arguments.window)
+        print(queue.summary())
+        stdout.flush()
+        exit(0)
+
+    # Scrape the work units from the shared queue file.
+    if arguments.worker is not None:
+        startWorker(discordscraper, arguments.worker, arguments.name, arguments.lease)
+        discordscraper.close()
+        exit(0)
+
+    # Follow the channels once they're up to date, skipping the backfill.
+    if arguments.follow:
+        since = time()
+        startWorkers(discordscraper, targets, since)
+        follow(discordscraper, targets, since)
+        discordscraper.close()
+        exit(0)
+
+    # Bring every channel up to date, then backfill their older history until we're done or out of time.
+    startWorkers(discordscraper, targets, time() + arguments.budget * 60 if arguments.budget is not None else None)
+
+    # Scrape the guilds that are searched as a whole one after another, a full scrape of one of them would hold every other channel back if it went first.
+    for guild, channels in guilds:
+
+        # Stop starting new guilds if we've been asked to stop.
+        if discordscraper.shutdown.requested():
+            break
+
+        # Start from the most recent post in any of the channels.
+        lastdates = [getLastMessageGuild(discordscraper, guild, channel) for channel in channels]
+        lastdates = [lastdate for lastdate in lastdates if lastdate is not None]
+
+        # Start the guild-wide scraper for the current guild.
+        startGuildWide(discordscraper, guild, channels, max(lastdates) if len(lastdates) > 0 else None)
+
+    # Stop the downloader and wait for the storage backend to store the last of the downloads.
+    discordscraper.close()
+
+    # Let the user know where the concurrency limits ended up, a limit well under its largest value means Discord was pushing back.
+    print(discordscraper.limits.summary())
 
-        # Start the scraper for the current direct message.
-        startDM(discordscraper, alias, channel)
+    # Let the user know that there's more to do if we were asked to stop.
+    if discordscraper.shutdown.requested():
+        warn('Stopped early, run the script again to carry on (and with --refetch to download the files that were skipped).')
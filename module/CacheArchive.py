@@ -0,0 +1,458 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+bisect.bisect_left: Used to look a message ID up in the sorted index.
+"""
+from bisect import bisect_left
+
+"""
+datetime.datetime:  Used to work out which day a message was posted on.
+datetime.timedelta: Used to step to the days either side of it.
+"""
+from datetime import datetime, timedelta
+
+"""
+json.dumps: Used to convert a message group or the index into a serialized string.
+json.loads: Used to convert a serialized message group or index back into a dictionary object.
+json.load:  Used to read a day's cache file.
+"""
+from json import dumps, loads, load
+
+"""
+os.listdir: Used to find the cache files in a channel folder.
+os.remove:  Used to throw away the day caches once they're in a pack.
+os.rename:  Used to move a finished pack into place.
+os.walk:    Used to find the channel folders to compact.
+os.path:    Used to combine and split file paths.
+"""
+from os import listdir, remove, rename, walk, path
+
+"""
+re.compile: Used to read the year, month, and day from the cache file names.
+"""
+from re import compile as Regex
+
+"""
+struct.pack:   Used to write where the index starts at the end of a pack.
+struct.unpack: Used to read where the index starts from the end of a pack.
+"""
+from struct import pack, unpack
+
+"""
+threading.Lock: Used to keep the packs that have been read consistent between threads.
+"""
+from threading import Lock
+
+"""
+zlib.compress:   Used to compress the blocks of message groups and the index.
+zlib.decompress: Used to decompress them again.
+"""
+from zlib import compress, decompress
+
+"""
+The names of the day caches (2021_2_10.cache.json) and the month packs (2021_2.cache.pack).
+"""
+DAYFILE = Regex(r'^(\d+)_(\d+)_(\d+)\.cache\.json$')
+PACKFILE = Regex(r'^(\d+)_(\d+)\.cache\.pack$')
+
+"""
+The largest number of message groups in a compressed block, reading one message out of a pack only decompresses its block.
+"""
+BLOCKSIZE = 256
+
+def searchHit(group):
+    """
+    Return the message that a message group was found for.
+    :param group: The message group from a search page or a cache file.
+    """
+
+    # Grab the search hit, falling back to the first message if none of them are marked.
+    return ([message for message in group if message.get('hit')] or group)[0]
+
+def hitId(group):
+    """
+    Return the ID of the message that a message group was found for, this is what the groups are sorted and deduplicated by.
+    :param group: The message group from a search page or a cache file.
+    """
+
+    return int(searchHit(group)['id'])
+
+def dayName(year, month, day):
+    """
+    Return the key that a day is stored under, it matches the name of its cache file.
+    :param year: The year of the day.
+    :param month: The month of the day.
+    :param day: The day of the month.
+    """
+
+    return '{0}_{1}_{2}'.format(year, month, day)
+
+class MonthPack(object):
+    """
+    A month of day caches compressed into a single file, read through its index so a day or a message can be served without decompressing the rest.
+    The pack is the compressed blocks of message groups (JSON lines, sorted by message ID within each day) one after the other, then the compressed index, then 8 bytes holding where the index starts.
+    The index lists the blocks of each day and every message ID in sorted order with the block that it's in.
+    """
+
+    def __init__(self, filename):
+        """
+        The class constructor, this reads the index straight away.
+        :param filename: The full file path to the pack.
+        """
+
+        # Create a class variable to store the pack file name.
+        self.filename = filename
+
+        with open(filename, 'rb') as packstream:
+
+            # Read where the index starts from the end of the pack.
+            packstream.seek(-8, 2)
+            start = unpack('>Q', packstream.read(8))[0]
+
+            # Read the index.
+            packstream.seek(start)
+            index = loads(decompress(packstream.read()[:-8]).decode('utf-8'))
+
+        # Create some class variables to store the index.
+        self.days = index['days']       # The blocks of each day, by day name.
+        self.blocks = index['blocks']   # The offset, compressed size, and number of groups of each block.
+        self.ids = index['ids']         # Every message ID in the pack, in sorted order.
+        self.where = index['where']     # The block that each message ID is in.
+
+    def __contains__(self, id):
+        """
+        Return whether or not a message is in the pack.
+        :param id: The message ID.
+        """
+
+        position = bisect_left(self.ids, int(id))
+        return position < len(self.ids) and self.ids[position] == int(id)
+
+    def __len__(self):
+        """
+        Return the number of message groups in the pack.
+        """
+
+        return len(self.ids)
+
+    def block(self, number):
+        """
+        Return the message groups in a block.
+        :param number: The number of the block.
+        """
+
+        # Grab where the block is.
+        offset, size, count = self.blocks[number]
+
+        # Read and decompress it.
+        with open(self.filename, 'rb') as packstream:
+            packstream.seek(offset)
+            data = decompress(packstream.read(size)).decode('utf-8')
+
+        # Return each line as a message group.
+        return [loads(line) for line in data.splitlines()]
+
+    def day(self, name):
+        """
+        Return the message groups of a day, or None if the day isn't in the pack.
+        :param name: The day name, see dayName.
+        """
+
+        # Return nothing if the day isn't in the pack.
+        if name not in self.days:
+            return None
+
+        # Read each block of the day.
+        return [group for number in self.days[name] for group in self.block(number)]
+
+    def find(self, id):
+        """
+        Return the message group that was found for a message, or None if it isn't in the pack.
+        :param id: The message ID.
+        """
+
+        # Return nothing if the message isn't in the pack.
+        if id not in self:
+            return None
+
+        # Read the block that it's in and pick the group out of it.
+        for group in self.block(self.where[bisect_left(self.ids, int(id))]):
+            if hitId(group) == int(id):
+                return group
+
+    @staticmethod
+    def write(filename, days):
+        """
+        Write a pack, it's written next to where it goes and moved into place once it's complete.
+        :param filename: The full file path to the pack.
+        :param days: A dictionary of day names to their message groups, sorted by message ID.
+        """
+
+        # Create some variables to store the index.
+        index = {'days': {}, 'blocks': [], 'ids': [], 'where': []}
+        entries = []
+
+        # Write each day as blocks of message groups.
+        with open('{0}.tmp'.format(filename), 'wb') as packstream:
+
+            # Write the days in order, so that reading a whole pack reads them oldest first.
+            for name in sorted(days, key=lambda name: [int(part) for part in name.split('_')]):
+                index['days'][name] = []
+
+                for start in range(0, len(days[name]), BLOCKSIZE):
+                    groups = days[name][start:start + BLOCKSIZE]
+                    data = compress(''.join('{0}\n'.format(dumps(group)) for group in groups).encode('utf-8'), 9)
+
+                    # Add the block to the index.
+                    index['days'][name].append(len(index['blocks']))
+                    entries.extend((hitId(group), len(index['blocks'])) for group in groups)
+                    index['blocks'].append([packstream.tell(), len(data), len(groups)])
+                    packstream.write(data)
+
+            # Sort the message IDs for the index.
+            entries.sort()
+            index['ids'] = [id for id, number in entries]
+            index['where'] = [number for id, number in entries]
+
+            # Write the index and where it starts.
+            start = packstream.tell()
+            packstream.write(compress(dumps(index).encode('utf-8'), 9))
+            packstream.write(pack('>Q', start))
+
+        # Move the finished pack into place.
+        rename('{0}.tmp'.format(filename), filename)
+
+class CacheReader(object):
+    """
+    Read the cached messages of a channel, whether they're still in day caches or already compacted into month packs.
+    """
+
+    # The packs that have been read, by file name, along with the modification time they were read at (a pack that changed is read again).
+    packs = {}
+    lock = Lock()
+
+    def __init__(self, folder):
+        """
+        The class constructor.
+        :param folder: The channel's cache folder, e.g. cached/guild/channel.
+        """
+
+        # Create a class variable to store the folder.
+        self.folder = folder
+
+    def pack(self, year, month):
+        """
+        Return the pack of a month, or None if the month hasn't been compacted.
+        :param year: The year of the month.
+        :param month: The month.
+        """
+
+        # Generate the file name of the pack.
+        filename = path.join(self.folder, '{0}_{1}.cache.pack'.format(year, month))
+
+        # Return nothing if there's no pack.
+        if not path.isfile(filename):
+            return None
+
+        with CacheReader.lock:
+
+            # Read the pack's index if we haven't already, or if it has changed since.
+            modified = path.getmtime(filename)
+
+            if filename not in CacheReader.packs or CacheReader.packs[filename][0] != modified:
+                CacheReader.packs[filename] = (modified, MonthPack(filename))
+
+            return CacheReader.packs[filename][1]
+
+    def hasDay(self, year, month, day):
+        """
+        Return whether or not a day has been cached, in a day cache or in a pack.
+        :param year: The year of the day.
+        :param month: The month of the day.
+        :param day: The day of the month.
+        """
+
+        # Check for the day cache first since that doesn't have to read anything.
+        if path.isfile(path.join(self.folder, '{0}.cache.json'.format(dayName(year, month, day)))):
+            return True
+
+        # Otherwise check the month's pack.
+        monthpack = self.pack(year, month)
+        return monthpack is not None and dayName(year, month, day) in monthpack.days
+
+    def days(self):
+        """
+        Return every cached day, oldest first, as (year, month, day) tuples.
+        """
+
+        # Skip this function if there's nothing cached.
+        if not path.isdir(self.folder):
+            return []
+
+        # Create a set to store the days.
+        days = set()
+
+        # Add the days of the day caches and the packs.
+        for name in listdir(self.folder):
+            match = DAYFILE.match(name)
+
+            if match is not None:
+                days.add(tuple(int(part) for part in match.groups()))
+
+            match = PACKFILE.match(name)
+
+            if match is not None:
+                days.update(tuple(int(part) for part in day.split('_')) for day in self.pack(*match.groups()).days)
+
+        # Return the days in order.
+        return sorted(days)
+
+    def day(self, year, month, day):
+        """
+        Return the message groups of a cached day, or None if the day hasn't been cached.
+        :param year: The year of the day.
+        :param month: The month of the day.
+        :param day: The day of the month.
+        """
+
+        # Serve the day from the month's pack if it's in there.
+        monthpack = self.pack(year, month)
+        groups = monthpack.day(dayName(year, month, day)) if monthpack is not None else None
+
+        if groups is not None:
+            return groups
+
+        # Otherwise serve it from its day cache.
+        filename = path.join(self.folder, '{0}.cache.json'.format(dayName(year, month, day)))
+
+        if not path.isfile(filename):
+            return None
+
+        with open(filename, 'r') as cachestream:
+            return load(cachestream)['messages']
+
+    def groups(self):
+        """
+        Iterate through every cached message group, oldest day first.
+        """
+
+        for year, month, day in self.days():
+            for group in self.day(year, month, day):
+                yield group
+
+    def find(self, id):
+        """
+        Return the cached message group that was found for a message, or None if it hasn't been cached.
+        :param id: The message ID.
+        """
+
+        # Work out which day the message was posted on from its snowflake (the milliseconds since the start of 2015 are in the top bits).
+        posted = datetime.utcfromtimestamp(((int(id) >> 22) + 1420070400000) / 1000.0)
+
+        # Check the month's pack.
+        monthpack = self.pack(posted.year, posted.month)
+
+        if monthpack is not None and id in monthpack:
+            return monthpack.find(id)
+
+        # Otherwise search the day (and the days either side of it, which runs from before the days were in UTC may have filed it under).
+        for offset in [0, -1, 1]:
+            day = posted + timedelta(days=offset)
+
+            for group in self.day(day.year, day.month, day.day) or []:
+                if hitId(group) == int(id):
+                    return group
+
+def compactFolder(folder, onwrite=None):
+    """
+    Merge the day caches of a channel folder into a pack for each month, dropping the message groups that turn up more than once.
+    :param folder: The channel's cache folder.
+    :param onwrite: A function that is called with the file name of each pack that was written, e.g. to copy it to the storage backend.
+    :return: The number of day caches that were compacted and the number of duplicate message groups that were dropped.
+    """
+
+    # Sort the day caches by the month they belong to.
+    months = {}
+
+    for name in listdir(folder):
+        match = DAYFILE.match(name)
+
+        if match is not None:
+            year, month, day = match.groups()
+            months.setdefault((int(year), int(month)), []).append((int(day), path.join(folder, name)))
+
+    # Create some variables to store the counts.
+    compacted = 0
+    duplicates = 0
+
+    # Merge each month.
+    reader = CacheReader(folder)
+
+    for (year, month), dayfiles in sorted(months.items()):
+
+        # Start from the month's pack if it has already been compacted before.
+        monthpack = reader.pack(year, month)
+        days = dict((name, monthpack.day(name)) for name in monthpack.days) if monthpack is not None else {}
+        seen = set(monthpack.ids) if monthpack is not None else set()
+
+        # Add each day cache, oldest first, keeping the first copy of a message group (older runs filed the groups on the edge of a day under both days).
+        for day, filename in sorted(dayfiles):
+            with open(filename, 'r') as cachestream:
+                groups = load(cachestream)['messages']
+
+            name = dayName(year, month, day)
+            days.setdefault(name, [])
+
+            for group in groups:
+                if hitId(group) in seen:
+                    duplicates += 1
+                    continue
+
+                seen.add(hitId(group))
+                days[name].append(group)
+
+        # Sort each day by message ID.
+        for name in days:
+            days[name].sort(key=hitId)
+
+        # Write the pack, then throw away the day caches that are in it.
+        packname = path.join(folder, '{0}_{1}.cache.pack'.format(year, month))
+        MonthPack.write(packname, days)
+
+        for day, filename in dayfiles:
+            remove(filename)
+
+        compacted += len(dayfiles)
+
+        # Let the caller know that the pack was written.
+        if onwrite is not None:
+            onwrite(packname)
+
+    # Return the counts.
+    return compacted, duplicates
+
+def compact(folder, onwrite=None):
+    """
+    Merge the day caches in every channel folder under a folder into month packs.
+    :param folder: The folder to search for channel folders, e.g. the cached folder.
+    :param onwrite: A function that is called with the file name of each pack that was written.
+    :return: The number of day caches that were compacted and the number of duplicate message groups that were dropped.
+    """
+
+    # Create some variables to store the counts.
+    compacted = 0
+    duplicates = 0
+
+    # Iterate through every folder that has day caches.
+    for folder, folders, files in walk(folder):
+        if any(DAYFILE.match(name) is not None for name in files):
+            counts = compactFolder(folder, onwrite)
+            compacted += counts[0]
+            duplicates += counts[1]
+
+    # Return the counts.
+    return compacted, duplicates
@@ -0,0 +1,185 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+datetime.datetime: Used to timestamp the changes as they're detected.
+"""
+from datetime import datetime
+
+"""
+hashlib.sha1: Used to hash the parts of a message that can change.
+"""
+from hashlib import sha1
+
+"""
+json.dumps: Used to convert the parts of a message into a serialized string to hash, and the hash file back into one.
+json.load:  Used to read a hash file into a dictionary object.
+"""
+from json import dumps, load
+
+"""
+os.makedirs: Used to create the folder that stores the hash files.
+os.rename:   Used to move a finished hash file into place.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, rename, path
+
+"""
+module.CacheArchive.CacheReader: Used to work out what a day looked like from its cache when it has no hashes yet.
+module.CacheArchive.hitId:       Used to grab the ID of the message that a message group was found for.
+module.CacheArchive.searchHit:   Used to grab the message that a message group was found for.
+"""
+from .CacheArchive import CacheReader, hitId, searchHit
+
+"""
+module.JSONCache.appendJSONLines: Used to append the changes to the change log.
+"""
+from .JSONCache import appendJSONLines
+
+def messageHash(message):
+    """
+    Return a short hash of the parts of a message that an edit or a removed attachment changes.
+    :param message: The message dictionary.
+    """
+
+    # Grab the content, the attachments, and when the message was last edited.
+    attachments = sorted([attachment.get('id'), attachment.get('filename'), attachment.get('size')] for attachment in message.get('attachments', []))
+    parts = [message.get('content'), attachments, message.get('edited_timestamp')]
+
+    # Hash them, 16 hex digits is plenty to tell two versions of the same message apart.
+    return sha1(dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+class ChangeTracker(object):
+    """
+    Keep a hash of every message that a scrape found, by day, and compare each new scrape of a day with the last one to find the new, edited, and deleted messages.
+    The hashes of a month are kept in a single YEAR_MONTH.hashes.json file next to the cache files, and the changes are appended to changes.jsonl.
+    """
+
+    def __init__(self, folder):
+        """
+        The class constructor.
+        :param folder: The channel's cache folder, e.g. cached/guild/channel.
+        """
+
+        # Create some class variables to store the folder and the change log.
+        self.folder = folder
+        self.changelog = path.join(folder, 'changes.jsonl')
+
+    def hashfile(self, year, month):
+        """
+        Return the full file path to the hash file of a month.
+        :param year: The year of the month.
+        :param month: The month.
+        """
+
+        return path.join(self.folder, '{0}_{1}.hashes.json'.format(year, month))
+
+    def load(self, year, month):
+        """
+        Return the hashes of a month as a dictionary of day names to dictionaries of message IDs to hashes.
+        :param year: The year of the month.
+        :param month: The month.
+        """
+
+        # Return an empty month if it has no hash file yet.
+        if not path.isfile(self.hashfile(year, month)):
+            return {}
+
+        with open(self.hashfile(year, month), 'r') as hashstream:
+            return load(hashstream)
+
+    def baseline(self, year, month, day, bounds):
+        """
+        Return what a day looked like when it was cached as a dictionary of message IDs to hashes, or None if it wasn't cached.
+        :param year: The year of the day.
+        :param month: The month of the day.
+        :param day: The day of the month.
+        :param bounds: The (min_id, max_id) snowflakes of the day, the cache of a day from before the days were in UTC can have messages from either side of it.
+        """
+
+        # Work the hashes out from the day's cache, if it has one.
+        groups = CacheReader(self.folder).day(year, month, day)
+
+        if groups is None:
+            return None
+
+        return dict((str(hitId(group)), messageHash(searchHit(group))) for group in groups if bounds[0] < hitId(group) < bounds[1])
+
+    def update(self, year, month, day, messages, bounds):
+        """
+        Compare a fresh scrape of a day with the last one, append the differences to the change log, and keep the fresh hashes for next time.
+        A day that we know nothing about is only recorded, so turning this on doesn't log every message that was already there as new.
+        :param year: The year of the day.
+        :param month: The month of the day.
+        :param day: The day of the month.
+        :param messages: The messages that the searches found for the day (the search hits, not the surrounding context).
+        :param bounds: The (min_id, max_id) snowflakes of the day.
+        :return: The number of new, edited, and deleted messages.
+        """
+
+        # Hash every message that was found.
+        current = dict((str(message['id']), messageHash(message)) for message in messages)
+        found = dict((str(message['id']), message) for message in messages)
+
+        # Grab what the day looked like the last time it was checked, or when it was cached if it has never been checked.
+        stored = self.load(year, month).get('{0}_{1}_{2}'.format(year, month, day))
+        previous = stored if stored is not None else self.baseline(year, month, day, bounds)
+
+        # Create a list to store the changes.
+        changes = []
+
+        if previous is not None:
+            detected = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+            name = '{0}_{1}_{2}'.format(year, month, day)
+
+            # The messages that weren't there before are new, and the ones with a different hash were edited.
+            for id in sorted(current, key=int):
+                if id not in previous:
+                    changes.append({'kind': 'new', 'id': id, 'day': name, 'detected': detected, 'hash': current[id], 'message': found[id]})
+
+                elif previous[id] != current[id]:
+                    changes.append({'kind': 'edited', 'id': id, 'day': name, 'detected': detected, 'hash': current[id], 'previous': previous[id], 'message': found[id]})
+
+            # The messages that aren't there anymore were deleted.
+            for id in sorted(previous, key=int):
+                if id not in current:
+                    changes.append({'kind': 'deleted', 'id': id, 'day': name, 'detected': detected, 'previous': previous[id]})
+
+        # Append the changes to the change log.
+        if len(changes) > 0:
+            appendJSONLines(self.changelog, changes)
+
+        # Keep the fresh hashes, skipping the write if they're the same as the ones we already have.
+        if current != stored:
+            self.store(year, month, day, current)
+
+        # Return the number of each kind of change.
+        return tuple(len([change for change in changes if change['kind'] == kind]) for kind in ['new', 'edited', 'deleted'])
+
+    def store(self, year, month, day, hashes):
+        """
+        Replace the hashes of a day in its month's hash file.
+        :param year: The year of the day.
+        :param month: The month of the day.
+        :param day: The day of the month.
+        :param hashes: A dictionary of message IDs to hashes.
+        """
+
+        # Update the month.
+        months = self.load(year, month)
+        months['{0}_{1}_{2}'.format(year, month, day)] = hashes
+
+        # Determine if the folder exists, if not then create it.
+        if not path.exists(self.folder):
+            makedirs(self.folder)
+
+        # Write the month next to where it goes and move it into place once it's complete.
+        hashfile = self.hashfile(year, month)
+
+        with open('{0}.tmp'.format(hashfile), 'w') as hashstream:
+            hashstream.write(dumps(months, sort_keys=True))
+
+        rename('{0}.tmp'.format(hashfile), hashfile)
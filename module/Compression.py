@@ -0,0 +1,179 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+zlib.decompressobj: Used to decompress gzip and deflate response bodies as they stream in.
+zlib.MAX_WBITS:     Used to tell zlib which kind of header (if any) to expect on the compressed data.
+zlib.error:         Used to detect deflate bodies that were sent without the zlib header.
+"""
+from zlib import decompressobj, MAX_WBITS, error as ZlibError
+
+"""
+brotli: Used to decompress brotli response bodies, this is optional and brotli is only negotiated when it's installed.
+"""
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def acceptEncoding():
+    """
+    Return the value of the Accept-Encoding header for the encodings that we can decompress.
+    """
+
+    # Only advertise brotli if we're able to decompress it.
+    return 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+class Decoder(object):
+    """
+    An incremental decompressor for a single response body.
+    """
+
+    def __init__(self, encoding):
+        """
+        The class constructor.
+        :param encoding: The value of the Content-Encoding response header.
+        """
+
+        # Create some class variables to store the encoding.
+        self.encoding = encoding.lower().strip()
+        self.started = False
+
+        # Create the decompressor for the encoding, adding 16 to the window bits makes zlib expect a gzip header.
+        if self.encoding in ['gzip', 'x-gzip']:
+            self.decompressor = decompressobj(16 + MAX_WBITS)
+
+        elif self.encoding == 'deflate':
+            self.decompressor = decompressobj(MAX_WBITS)
+
+        elif self.encoding == 'br' and brotli is not None:
+            self.decompressor = brotli.Decompressor()
+
+        # Otherwise pass the data on through untouched.
+        else:
+            self.decompressor = None
+
+    def decompress(self, data):
+        """
+        Decompress the next piece of the response body.
+        :param data: The compressed bytes that were just read.
+        """
+
+        # Pass the data on through if there's nothing to decompress.
+        if self.decompressor is None or len(data) == 0:
+            return data
+
+        # Some servers send deflate bodies without the zlib header, so retry the first piece as a raw deflate stream.
+        if self.encoding == 'deflate' and not self.started:
+            self.started = True
+
+            try:
+                return self.decompressor.decompress(data)
+
+            except ZlibError:
+                self.decompressor = decompressobj(-MAX_WBITS)
+
+        # Brotli has its own method name for this.
+        if self.encoding == 'br':
+            return self.decompressor.process(data)
+
+        # Decompress the data.
+        return self.decompressor.decompress(data)
+
+    def flush(self):
+        """
+        Return whatever is left over in the decompressor once the body has been read in full.
+        """
+
+        # Only zlib keeps anything buffered.
+        if self.decompressor is None or self.encoding == 'br':
+            return b''
+
+        return self.decompressor.flush()
+
+class DecodedResponse(object):
+    """
+    Wrap a blocking response object so that read() returns the decompressed body.
+    """
+
+    def __init__(self, response, encoding, chunksize=None):
+        """
+        The class constructor.
+        :param response: The response object that we're wrapping, everything but read() is passed on through to it.
+        :param encoding: The value of the Content-Encoding response header.
+        :param chunksize: The number of compressed bytes to read from the response at a time.
+        """
+
+        # Determine if the chunksize argument is not set.
+        if chunksize is None:
+
+            # Set it to the default value of 64 KiB.
+            chunksize = 65536
+
+        # Create some class variables to store the response and its decoder.
+        self.response = response
+        self.decoder = Decoder(encoding)
+        self.chunksize = chunksize
+        self.buffer = b''
+        self.done = False
+
+    def __getattr__(self, name):
+        """
+        Pass every attribute that we don't override on through to the wrapped response.
+        :param name: The name of the attribute.
+        """
+
+        return getattr(self.response, name)
+
+    def fill(self):
+        """
+        Read and decompress the next piece of the response body into the buffer.
+        """
+
+        # Read the next piece of the compressed body.
+        data = self.response.read(self.chunksize)
+
+        # Flush the decompressor once we've hit the end of the body.
+        if len(data) == 0:
+            self.done = True
+            self.buffer += self.decoder.flush()
+
+        # Otherwise decompress what we've read.
+        else:
+            self.buffer += self.decoder.decompress(data)
+
+    def read(self, amt=None):
+        """
+        Read up to amt bytes of the decompressed body, or all of it when amt is empty.
+        :param amt: The maximum number of decompressed bytes to read.
+        """
+
+        # Keep decompressing until we have enough data or there's nothing left.
+        while not self.done and (amt is None or len(self.buffer) < amt):
+            self.fill()
+
+        # Return everything if we weren't given an amount.
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+            return data
+
+        # Otherwise return the amount that we were asked for.
+        data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+def decodeResponse(response, encoding):
+    """
+    Wrap the response in a DecodedResponse if its body is compressed.
+    :param response: The response object that we might wrap.
+    :param encoding: The value of the Content-Encoding response header, this can be empty.
+    """
+
+    # Return the response untouched if it isn't compressed.
+    if encoding is None or encoding.lower().strip() in ['', 'identity']:
+        return response
+
+    # Otherwise decompress it as it's read.
+    return DecodedResponse(response, encoding)
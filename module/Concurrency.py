@@ -0,0 +1,257 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+sys.stderr: Used to write to the standard error filestream.
+"""
+from sys import stderr
+
+"""
+threading.Condition: Used to hold requests back while the limit is reached, and wake them up as slots free up.
+"""
+from threading import Condition
+
+"""
+time.time: Used to space out the log messages about the limit going up.
+"""
+from time import time
+
+def info(message):
+    """
+    Throw an informational message without halting the script.
+    :param message: A string that will be printed out to STDERR.
+    """
+
+    # Append our message with a newline character.
+    stderr.write('[INFO] {0}\n'.format(message))
+
+"""
+The error classes (see RetryEngine.classify) that tell us the server or the network is struggling, these cut the limit.
+Client errors and a full disk say nothing about how busy the server is, so they're left alone.
+"""
+OVERLOADED = ['ratelimit', 'server', 'timeout', 'reset']
+
+"""
+The hosts that serve the API, every other host is treated as the CDN.
+"""
+APIHOSTS = ['discord.com', 'discordapp.com']
+
+class AIMDLimiter(object):
+    """
+    Limit the number of requests in flight, raising the limit by one for every full window of healthy requests (additive increase) and halving it on a rate limit, a server error, or a network error (multiplicative decrease).
+    The time to first byte is tracked with a fast and a slow moving average, the limit is cut as well once the fast one rises past the slow one by the tolerance.
+    """
+
+    def __init__(self, name, minimum=None, maximum=None, initial=None, adaptive=None, tolerance=None):
+        """
+        The class constructor.
+        :param name: The name of the limiter that is used in the log messages, e.g. "API" or "CDN".
+        :param minimum: The smallest limit, defaults to 1.
+        :param maximum: The largest limit, defaults to 100.
+        :param initial: The limit to start with, defaults to a quarter of the largest limit.
+        :param adaptive: Whether or not the limit changes with how the requests go, the limit stays at the largest limit if this is false, defaults to true.
+        :param tolerance: How many times slower than usual the requests can get before the limit is cut, defaults to 2.
+        """
+
+        # Determine if the minimum argument is not set.
+        if minimum is None:
+
+            # Set it to the default value of 1.
+            minimum = 1
+
+        # Determine if the maximum argument is not set.
+        if maximum is None:
+
+            # Set it to the default value of 100.
+            maximum = 100
+
+        # Determine if the adaptive argument is not set.
+        if adaptive is None:
+
+            # Set it to the default value of true.
+            adaptive = True
+
+        # Determine if the tolerance argument is not set.
+        if tolerance is None:
+
+            # Set it to the default value of 2.
+            tolerance = 2.0
+
+        # A limit that doesn't adapt starts (and stays) at the largest limit.
+        if initial is None or not adaptive:
+            initial = maximum if not adaptive else max(minimum, maximum // 4)
+
+        # Create some class variables to store the limiter settings.
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.adaptive = adaptive
+        self.tolerance = float(tolerance)
+
+        # Create some class variables to store the limiter state, the limit is fractional so that it can go up by 1/limit for each healthy request.
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.inflight = 0
+        self.cooldown = 0       # The number of requests to let finish before the limit can be cut again, the requests that were already in flight during a cut shouldn't cut it again.
+        self.fast = None        # The fast moving average of the time to first byte (in seconds).
+        self.slow = None        # The slow moving average of the time to first byte (in seconds), this is what "usual" means.
+        self.samples = 0        # The number of times to first byte that went into the averages.
+        self.logged = 0         # The time that we last logged the limit going up.
+        self.condition = Condition()
+
+    def current(self):
+        """
+        Return the whole number of requests that can be in flight at the same time.
+        """
+
+        return int(self.limit)
+
+    def tryAcquire(self):
+        """
+        Take a slot if one is free, returning whether or not we got one.
+        """
+
+        with self.condition:
+
+            # Return false if every slot is taken.
+            if self.inflight >= int(self.limit):
+                return False
+
+            # Take the slot.
+            self.inflight += 1
+            return True
+
+    def acquire(self):
+        """
+        Take a slot, waiting for one to free up if every slot is taken.
+        """
+
+        with self.condition:
+
+            # Wait until the number of requests in flight drops under the limit.
+            while self.inflight >= int(self.limit):
+                self.condition.wait()
+
+            # Take the slot.
+            self.inflight += 1
+
+    def release(self, latency=None, kind=None):
+        """
+        Give a slot back, and raise or cut the limit depending on how the request went.
+        :param latency: The number of seconds the request took to get its first byte back, if it got that far.
+        :param kind: The error class of the request (see RetryEngine.classify), or empty if it went through.
+        """
+
+        with self.condition:
+
+            # Give the slot back.
+            self.inflight -= 1
+
+            # Count down the requests that were in flight during the last cut, they don't get to raise or cut the limit.
+            if self.cooldown > 0:
+                self.cooldown -= 1
+
+            # Otherwise adjust the limit if it adapts.
+            elif self.adaptive:
+
+                # Cut the limit if the server or the network is struggling.
+                if kind in OVERLOADED:
+                    self.decrease(kind)
+
+                # Otherwise check the request didn't take much longer than usual.
+                elif kind is None and latency is not None:
+                    self.sample(latency)
+
+            # Wake up the requests that are waiting on a slot, there might be more than one free if the limit went up.
+            self.condition.notify_all()
+
+    def sample(self, latency):
+        """
+        Add a time to first byte to the moving averages, cutting the limit if it's rising and raising the limit otherwise. The lock has to be held by the caller.
+        :param latency: The number of seconds the request took to get its first byte back.
+        """
+
+        # Update the moving averages, both start at the first sample.
+        self.fast = latency if self.fast is None else self.fast + 0.3 * (latency - self.fast)
+        self.slow = latency if self.slow is None else self.slow + 0.02 * (latency - self.slow)
+        self.samples += 1
+
+        # Cut the limit if the requests are getting slower, waiting for a few samples so that a single slow request doesn't count.
+        if self.samples >= 10 and self.fast > self.slow * self.tolerance:
+            self.decrease('latency {0:.2f}s over {1:.2f}s'.format(self.fast, self.slow))
+
+            # Start the fast average over from the usual time so that it takes new slow requests to cut the limit again.
+            self.fast = self.slow
+            return None
+
+        # Otherwise raise the limit by one for every full window of healthy requests.
+        self.increase()
+
+    def increase(self):
+        """
+        Raise the limit by a fraction of a slot. The lock has to be held by the caller.
+        """
+
+        # Skip this function if we're already at the largest limit.
+        if self.limit >= self.maximum:
+            return None
+
+        # Raise the limit, a whole slot takes as many healthy requests as there are slots.
+        before = int(self.limit)
+        self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+        # Log the new limit, at most every thirty seconds so that a climbing limit doesn't flood the log.
+        if int(self.limit) != before and time() - self.logged >= 30:
+            self.logged = time()
+            info('{0} concurrency raised to {1} (of {2}).'.format(self.name, int(self.limit), self.maximum))
+
+    def decrease(self, reason):
+        """
+        Halve the limit. The lock has to be held by the caller.
+        :param reason: Why the limit is being cut, this is logged.
+        """
+
+        # Halve the limit.
+        before = int(self.limit)
+        self.limit = max(float(self.minimum), self.limit / 2.0)
+
+        # Let the requests that are still in flight finish before the limit can be cut again.
+        self.cooldown = self.inflight
+
+        # Log the new limit and why it was cut.
+        if int(self.limit) != before:
+            info('{0} concurrency cut from {1} to {2} ({3}).'.format(self.name, before, int(self.limit), reason))
+
+class ConcurrencyLimits(object):
+    """
+    Keep a separate limiter for the API and for the CDN, the API's rate limits and the CDN's bandwidth are very different things to run into.
+    """
+
+    def __init__(self, api=None, cdn=None, adaptive=None):
+        """
+        The class constructor.
+        :param api: The largest number of API requests in flight at the same time, defaults to 8.
+        :param cdn: The largest number of downloads in flight at the same time, defaults to 100.
+        :param adaptive: Whether or not the limits change with how the requests go, defaults to true.
+        """
+
+        # Create a limiter for each kind of host.
+        self.api = AIMDLimiter('API', 1, api if api is not None else 8, None, adaptive)
+        self.cdn = AIMDLimiter('CDN', 1, cdn if cdn is not None else 100, None, adaptive)
+
+    def pick(self, url):
+        """
+        Return the limiter for the host of a URL.
+        :param url: The URL that we're about to request.
+        """
+
+        return self.api if url.split('/')[2] in APIHOSTS else self.cdn
+
+    def summary(self):
+        """
+        Return a line describing the current limits.
+        """
+
+        return 'Concurrency limits: API {0} (of {1}), CDN {2} (of {3}).'.format(self.api.current(), self.api.maximum, self.cdn.current(), self.cdn.maximum)
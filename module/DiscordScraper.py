@@ -16,11 +16,6 @@ datetime.timedelta: Used to make the process of subtracting time much easier wit
 """
 from datetime import datetime, timedelta
 
-"""
-mimetypes.MimeTypes: Used to access the MimeTypes class and its functions for quickly determining if a file extension is an image, video, or something else.
-"""
-from mimetypes import MimeTypes
-
 """
 os.makedirs: Used to create a folder with subfolders.
 os.getcwd:   Used to get the current working directory for the commandline, hopefully this is the same directory as the discord.py file.
@@ -31,48 +26,113 @@ from os import makedirs, getcwd, path
 from os import _exit as exit
 
 """
-signal.SIGINT: Used to detect CTRL+C (Command+C) inputs during runtime.
-signal.signal: Used to tie in the SIGINT with an event function that can allow us to clear up any cached JSON data upon exiting.
+json.loads: Used to convert a serialized string into a dictionary object.
 """
-from signal import SIGINT, signal
+from json import loads
 
 """
-json.loads: Used to convert a serialized string into a dictionary object.
-json.dumps: Used to convert a dictionary object into a serialized string.
+calendar.timegm: Used to turn a UTC date into a timestamp, unlike time.mktime this isn't thrown off by the local timezone or daylight saving time.
 """
-from json import loads, dump
+from calendar import timegm
 
 """
-random.choice: Used to simplify the process of "randomly" choosing a value from an array.
+This conditional statement will be used to stop the import on a version of Python that the script doesn't support.
 """
-from random import choice
+if version_info.major not in [2, 3]:  # This means that we're running some version of Python before 2.X or after 3.X
+    raise ImportError('Invalid version of Python detected! This script only supports Python 2 and Python 3.')
 
 """
-time.mktime: Used to get the current timestamp of the system, this is here to uphold Python 2 compatibility in the script.
+The string types that the configuration file values can be (json gives us unicode strings on Python 2).
 """
-from time import mktime
+try:
+    stringtypes = (str, unicode)
+except NameError:
+    stringtypes = (str, )
 
 """
-This conditional statement will be used to import the class from the correct file based on the version of the Python interpreter used.
+copy.copy: Used to create a copy of the scraper for each authorization token.
 """
-if version_info.major == 3:  # This means that we're running Python 3.X
-    from .RequestB import DiscordRequest
+from copy import copy
 
-elif version_info.major == 2:  # This means that we're running Python 2.X
-    from .RequestA import DiscordRequest
+"""
+threading.Lock: Used to keep the change totals right when more than one token is detecting changes.
+"""
+from threading import Lock
 
-else:  # This means that we're running some version of Python before 2.X or after 3.X
-    stderr.write('[ERROR]: Invalid version of Python detected! This script only supports Python 2 and Python 3.\n')
-    exit(1)
+"""
+module.TokenPool.TokenPool: Used to keep track of the rate limits of each authorization token.
+"""
+from .TokenPool import TokenPool
 
 """
-Create a function and tie SIGINT to said function.
+module.NameCache.NameCache: Used to persist guild and channel names between runs.
+"""
+from .NameCache import NameCache
+
+"""
+module.JSONCache.CacheWriter:     Used to stream search pages into the cache files one page at a time.
+module.JSONCache.appendJSONLines: Used to append the messages that follow mode picks up to the day's follow file.
+"""
+from .JSONCache import CacheWriter, appendJSONLines
+
+"""
+module.RetryEngine.RetryEngine: Used to retry failed requests and keep track of the ones that failed for good.
+module.RetryEngine.RetryError:  Used to detect requests that failed for good.
+"""
+from .RetryEngine import RetryEngine, RetryError
+
+"""
+module.Scheduler.Progress:  Used to remember the range of days that has been scraped for each channel.
+module.Scheduler.Scheduler: Used to bring every channel up to date before backfilling their older history.
+"""
+from .Scheduler import Progress, Scheduler
+
 """
-def sigintEvent(sig, frame):
-    print('You pressed CTRL + C')
-    exit(0)
+module.Throttle.Throttle:       Used to limit the download bandwidth across every download and per host.
+module.Throttle.DiskGovernor:   Used to hold downloads back while the disk is nearly full.
+module.Throttle.DiskSpaceError: Used to detect a download that was held back.
+"""
+from .Throttle import Throttle, DiskGovernor, DiskSpaceError
+
+"""
+module.Embeds.resolveEmbed: Used to pick the proxied media variant of an embed to download.
+"""
+from .Embeds import resolveEmbed
+
+"""
+module.Concurrency.ConcurrencyLimits: Used to adapt the number of API requests and downloads in flight to how the server is coping.
+"""
+from .Concurrency import ConcurrencyLimits
+
+"""
+module.Selection.AttachmentFilter: Used to skip the attachments we don't want from what the message tells us about them, before any request is sent.
+"""
+from .Selection import AttachmentFilter
+
+"""
+module.SeenFilter.SeenFilter: Used to drop the messages that have already gone through the scraper.
+"""
+from .SeenFilter import SeenFilter
+
+"""
+module.Shutdown.Shutdown: Used to stop once the work in flight is done when CTRL+C is pressed.
+"""
+from .Shutdown import Shutdown
+
+def DiscordRequest():
+    """
+    Create a request object with the transport for the version of Python being used, the transport (and the HTTP client and ssl modules behind it) is only imported the first time it's needed.
+    """
+
+    # Import the class from the correct file based on the version of the Python interpreter used.
+    if version_info.major == 3:  # This means that we're running Python 3.X
+        from .RequestB import DiscordRequest as Request
 
-signal(SIGINT, sigintEvent)
+    else:  # This means that we're running Python 2.X
+        from .RequestA import DiscordRequest as Request
+
+    # Return a new request object.
+    return Request()
 
 def error(message):
     """
@@ -84,7 +144,7 @@ def error(message):
     stderr.write('[ERROR]: {0}\n'.format(message))
 
     # Halt the script right here, do not continue running the script after this point.
-    exit()
+    exit(1)
 
 def warn(message):
     """
@@ -95,16 +155,164 @@ def warn(message):
     # Append our message with a newline character.
     stderr.write('[WARN] {0}\n'.format(message))
 
+class ConfigError(Exception):
+    """
+    Raised when the configuration file (or the authorization token file it points to) is missing or invalid.
+    """
+
 class DiscordConfig(object):
     """
-    This class will only serve the purpose of converting a dictionary object into a class object.
+    The validated contents of the configuration file, every setting is checked against its expected type when the file is loaded.
     """
 
+    __slots__ = ['tokenfile', 'useragent', 'buffer', 'options', 'query', 'types', 'directs', 'guilds']
+
+    # The expected type of each top-level setting.
+    settings = {
+        'tokenfile': stringtypes,
+        'useragent': stringtypes,
+        'buffer':    int,
+        'options':   dict,
+        'query':     dict,
+        'types':     dict,
+        'directs':   dict,
+        'guilds':    dict,
+    }
+
+    # The default value of each option, the type of the default is the type that the option has to be (numbers can be whole or not).
+    defaults = {
+        'validateFileHeaders': False,
+        'generateFileChecksums': False,
+        'sanitizeFileNames': True,
+        'compressImageData': False,
+        'compressTextData': False,
+        'gatherJSONData': True,
+        'guildWideSearch': False,
+        'nameCacheTTL': 604800,
+        'asyncDownloads': False,
+        'downloadConcurrency': 100,
+        'apiConcurrency': 8,
+        'adaptiveConcurrency': True,
+        'retryPolicies': {},
+        'retryBudget': 50,
+        'catchupDays': 7,
+        'backfillDays': 7,
+        'channelWeights': {},
+        'followMinInterval': 5,
+        'followMaxInterval': 300,
+        'downloadRate': 0,
+        'downloadHostRate': 0,
+        'minFreeSpace': 1073741824,
+        'embedMaxPixels': 0,
+        'searchFilters': {},
+        'attachmentFilters': {},
+        'packSmallFiles': False,
+        'packThreshold': 1048576,
+        'packSize': 268435456,
+        'storageBackend': 'local',
+        'storageRoot': '',
+        'storageOptions': {},
+        'detectChanges': False,
+    }
+
+    # The search query flags and the file types, every one of them has to be set to true or false.
+    flags = {
+        'query': ['images', 'files', 'embeds', 'links', 'videos', 'nsfw'],
+        'types': ['images', 'videos', 'files', 'text'],
+    }
+
+    def __init__(self, data):
+        """
+        The class constructor.
+        :param data: The dictionary object read from the configuration file.
+        """
+
+        # Check that the configuration is a JSON object at all.
+        if not isinstance(data, dict):
+            raise ConfigError('The configuration file has to contain a JSON object.')
+
+        # Check each top-level setting and store it.
+        for name, kind in DiscordConfig.settings.items():
+
+            # Throw an error if the setting is missing.
+            if name not in data:
+                raise ConfigError('The "{0}" setting is missing from the configuration file.'.format(name))
+
+            # Throw an error if the setting has the wrong type (a boolean is an integer in Python, so rule that out separately).
+            if not isinstance(data[name], kind) or isinstance(data[name], bool):
+                raise ConfigError('The "{0}" setting in the configuration file has the wrong type.'.format(name))
+
+            setattr(self, name, data[name])
+
+        # Fill the missing options in with their defaults.
+        self.options = dict(DiscordConfig.defaults, **self.options)
+
+        # Check the type of each option that we know about.
+        for name, default in DiscordConfig.defaults.items():
+            value = self.options[name]
+
+            # Booleans have to be booleans.
+            if isinstance(default, bool):
+                valid = isinstance(value, bool)
+
+            # Numbers can be whole or not, but not booleans.
+            elif isinstance(default, int):
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+
+            # Strings can be either kind of string, the JSON strings are unicode on Python 2.
+            elif isinstance(default, str):
+                valid = isinstance(value, stringtypes)
+
+            # Everything else has to match the type of its default.
+            else:
+                valid = isinstance(value, type(default))
+
+            # Throw an error if the option has the wrong type.
+            if not valid:
+                raise ConfigError('The "{0}" option in the configuration file has the wrong type.'.format(name))
+
+        # Check the search query flags and the file types.
+        for name, keys in DiscordConfig.flags.items():
+            for key in keys:
+                if not isinstance(getattr(self, name).get(key), bool):
+                    raise ConfigError('The "{0}.{1}" setting in the configuration file has to be true or false.'.format(name, key))
+
+        # Throw an error if there are no direct messages or guilds to scrape, since it would be useless to run this script without any data to scrape.
+        if len(self.directs) == 0 and len(self.guilds) == 0:
+            raise ConfigError('No guilds or DMs were set to be grabbed, exiting!')
+
+    @staticmethod
+    def load(configfile):
+        """
+        Read and validate a configuration file.
+        :param configfile: The full file path to the configuration file.
+        """
+
+        # Throw an error if the configuration file doesn't exist.
+        if not path.exists(configfile):
+            raise ConfigError('Configuration file can not be found at the following location: {0}'.format(configfile))
+
+        # Open the config file in text-mode for reading.
+        with open(configfile, 'r') as configfilestream:
+
+            try:
+                # Convert the serialized JSON contents of the configuration file into a dictionary.
+                configdata = loads(configfilestream.read())
+
+            except ValueError as ex:
+                raise ConfigError('Configuration file is not valid JSON: {0}'.format(ex))
+
+        # Return the validated configuration.
+        return DiscordConfig(configdata)
+
 class DiscordScraper(object):
     """
     This class will contain all of the important functions that will be used that works with both Python 2 and Python 3 interpreters.
     """
 
+    # The mimetype database that getFileMimetype loads the first time it's called.
+    mimetypes = None
+
     def __init__(self, configfile=None, apiversion=None):
         """
         The class constructor function that is not needed for calling any of the static functions.
@@ -125,37 +333,31 @@ class DiscordScraper(object):
             # Set it to the default value of "v8"
             apiversion = 'v8'
         
-        # Generate a direct file path to the configuration file.
-        configfile = path.join(getcwd(), configfile)
-
-        # Throw an error if the configuration file doesn't exist.
-        if not path.exists(configfile):
-            error('Configuration file can not be found at the following location: {0}'.format(configfile))
-        
-        # Open the config file in text-mode for reading.
-        with open(configfile, 'r') as configfilestream:
-
-            # Read the entire config file.
-            configfiledata = configfilestream.read()
-        
-        # Convert the serialized JSON contents of the configuration file into a dictionary.
-        configdata = loads(configfiledata)
-
-        # Convert the configuration dictionary into a class object.
-        config = type('DiscordConfig', (object, ), configdata)()
+        # Read and validate the configuration file (this raises a ConfigError if there's anything wrong with it).
+        config = DiscordConfig.load(path.join(getcwd(), configfile))
 
         # Generate a direct file path to the authorization token file.
         tokenfile = path.join(getcwd(), config.tokenfile)
 
         # Throw an error if the authorization token file doesn't exist.
         if not path.exists(tokenfile):
-            error('Authorization token file can not be found at the following location: {0}'.format(tokenfile))
+            raise ConfigError('Authorization token file can not be found at the following location: {0}'.format(tokenfile))
         
         # Open the authorization token file in text-mode for reading.
         with open(tokenfile, 'r') as tokenfilestream:
 
-            # Read the first line of the authorization token file.
-            tokenfiledata = tokenfilestream.readline().rstrip()
+            # Read every token in the authorization token file, one token per line.
+            tokens = [line.strip() for line in tokenfilestream if len(line.strip()) > 0]
+
+        # Throw an error if the authorization token file is empty.
+        if len(tokens) == 0:
+            raise ConfigError('Authorization token file is empty: {0}'.format(tokenfile))
+
+        # The first token is the one that we use unless the work is spread over the whole pool.
+        tokenfiledata = tokens[0]
+
+        # Create the token pool that keeps track of each token's rate limits and the channels it can see.
+        self.tokens = TokenPool(tokens)
         
         # Create a dictionary to store the HTTP request headers that we will be using for all requests.
         self.headers = {
@@ -168,6 +370,7 @@ class DiscordScraper(object):
         self.buffersize = config.buffer   # The file download buffer that will be stored in memory before offloading to the hard drive.
         self.options    = config.options  # The experimental options portion of the configuration file that will give extra control over how the script functions.
         self.types      = config.types    # The file types that we are wanting to scrape and download to our storage device.
+        self.query      = config.query    # The search query flags that narrow down which messages are searched for.
 
         # Make the options available for quick and easy access.
         self.validateFileHeaders = config.options['validateFileHeaders']      # The option that will not only check the MIME type of a file but go one step further and check the magic number (header) of the file.
@@ -176,49 +379,137 @@ class DiscordScraper(object):
         self.compressImageData = config.options['compressImageData']          # The option that will enable image file compression to save on storage space when downloading data, this will likely be a generic algorithm.
         self.compressTextData = config.options['compressTextData']            # The option that will enable textual data compression to save on storage space when downloading data, this will most likely be GZIP compression.
         self.gatherJSONData = config.options['gatherJSONData']                # The option that will determine whether or not the script should cache the response text in JSON formatting.
+        self.guildWideSearch = config.options['guildWideSearch']              # The option that will search every configured channel of a guild with one request per day instead of one request per channel per day.
+        self.asyncDownloads = config.options['asyncDownloads']                # The option that will download files concurrently on a single thread with the asyncio transport (Python 3 only).
+        self.downloadConcurrency = config.options['downloadConcurrency']      # The maximum number of concurrent downloads.
+        self.embedMaxPixels = config.options['embedMaxPixels']                # The largest resolution (width times height) of embedded media to download, larger images are scaled down by the media proxy.
+        self.detectChanges = config.options['detectChanges']                  # The option that will compare every scraped day with the last scrape of it and log the new, edited, and deleted messages.
+
+        # Create a list to store the number of new, edited, and deleted messages found during the run, every copy of the scraper adds to the same one under the same lock.
+        self.changes = [0, 0, 0]
+        self.changelock = Lock()
+
+        # The asyncio transport isn't available on Python 2.
+        if self.asyncDownloads and version_info.major < 3:
+            warn('The asyncio transport requires Python 3, downloading files one-by-one instead!')
+            self.asyncDownloads = False
+
+        # Create a blank list to store the files that are queued up for the asyncio transport, and a variable to store how many bytes of them we know about.
+        self.pending = []
+        self.pendingBytes = 0
+
+        # Create the storage backend that the downloads are kept in, packSmallFiles is the same as the pack backend.
+        backend = 'pack' if config.options['packSmallFiles'] and config.options['storageBackend'] == 'local' else config.options['storageBackend']
+        storageoptions = dict({'packThreshold': config.options['packThreshold'], 'packSize': config.options['packSize']}, **config.options['storageOptions'])
+
+        # Import the storage backends only when the scraper is created, the S3 and pack backends import what they need when they're picked.
+        from .Storage import openStorage
+
+        try:
+            self.storage = openStorage(config.options['storageRoot'] or getcwd(), backend, storageoptions)
+
+        except ValueError as ex:
+            raise ConfigError(ex)
+
+        # Create the filter that picks the attachments to download by their size, content type, and resolution.
+        self.attachmentFilter = AttachmentFilter(config.options['attachmentFilters'])
         
         # Use Python ternary operators to set the class variables for direct messages and guilds that we should scrape.
-        self.directs = config.directs if len(config.directs) > 0 else {}
-        self.guilds  = config.guilds  if len(config.guilds ) > 0 else {}
+        self.directs = config.directs
+        self.guilds  = config.guilds
+
+        # Create the retry engine that every request goes through, requests that fail for good are written to the dead letter file.
+        self.retry = RetryEngine(self.storage.path('cached', 'deadletters.jsonl'), config.options['retryPolicies'], config.options['retryBudget'])
+
+        # Keep the token pool up to date with every API response, and hold requests back while their token is rate limited.
+        self.retry.before = lambda request: self.tokens.wait(request.headers.get('Authorization'))
+        self.retry.after = lambda request, url: self.tokens.update(request.headers.get('Authorization'), request, url)
+
+        # Create the limiters that raise the number of API requests and downloads in flight while the server keeps up, and cut it on rate limits, server errors, or slower responses.
+        self.limits = ConcurrencyLimits(config.options['apiConcurrency'], self.downloadConcurrency, config.options['adaptiveConcurrency'])
+        self.retry.limits = self.limits
+
+        # Create the persistent name cache so guild and channel names (and their folders) survive between runs.
+        self.names = NameCache(self.storage.path('cached', 'names.json'), config.options['nameCacheTTL'])
+
+        # Create the scheduler that brings every channel up to date before backfilling their older history, the progress file remembers how far each channel got.
+        self.scheduler = Scheduler(Progress(self.storage.path('cached', 'progress.json')), config.options['catchupDays'], config.options['backfillDays'], config.options['channelWeights'])
+
+        # Create a class variable to store the follower that remembers the last message seen in each channel, it's only created once follow mode asks for it.
+        self.follower = None
+
+        # Create the download bandwidth throttle and the disk space governor that every copy of the scraper shares.
+        self.throttle = Throttle(config.options['downloadRate'], config.options['downloadHostRate'])
+        self.governor = DiskGovernor(config.options['minFreeSpace'])
+
+        # Create the filter of the message IDs that have gone through the scraper, duplicates are dropped before they reach the caches or the downloads.
+        self.seen = SeenFilter()
+
+        # Create the shutdown handler that every copy of the scraper shares, the script ties SIGINT to it when it starts.
+        self.shutdown = Shutdown()
+
+        # Create a class variable to store the downloader that every copy of the scraper hands its queued files to, its event loop and connection pool last the whole run.
+        self.downloader = None
+
+        if self.asyncDownloads:
+
+            # Import the asyncio transport only when we're going to use it.
+            from .RequestC import Downloader
+
+            self.downloader = Downloader(self.buffersize, self.downloadConcurrency, self.retry, self.shutdown.requested, self.throttle, self.governor, self.limits.cdn)
 
         # Create a blank guild name, channel name, and folder location class variable.
         self.guildname = None
         self.channelname = None
         self.location = None
-
-        # Halt the script if there are no direct messages or guilds to scrape, since it would be useless to run this script without any data to scrape.
-        if len(config.directs) == 0 and len(config.guilds) == 0:
-            error('No guilds or DMs were set to be grabbed, exiting!')
         
-        # Create a class variable to store the URI query for our search requests.
-        self.query = DiscordScraper.generateQueryBody(
-            images = config.query['images'],
-            files  = config.query['files' ],
-            embeds = config.query['embeds'],
-            links  = config.query['links' ],
-            videos = config.query['videos'],
-            nsfw   = config.query['nsfw'  ]
-        )
+        # Create a class variable to store the URI queries for our search requests, every day is searched once per query.
+        self.planSearch()
+
+    def planSearch(self):
+        """
+        Plan the URI queries that every day is searched with, this has to be done again if detectChanges is turned on afterwards.
+        """
+
+        # Detecting changes needs every message, an edit can take a message out of a has= search and make it look like it was deleted.
+        query = dict((key, value if key == 'nsfw' else False) for key, value in self.query.items()) if self.detectChanges else self.query
+
+        # Plan the queries.
+        self.queries = DiscordScraper.planQueries(query, self.types, self.gatherJSONData or self.types['text'] or self.detectChanges, self.options['searchFilters'])
     
-    def grabGuildName(self, id, dm=None):
+    def clone(self, token):
         """
-        Send a request to retrieve the guild name by its ID.
-        :param id: The ID for the guild we want to retrieve the name for.
-        :param dm: A true or false (boolean) value that determines if we're scraping a direct message.
+        Return a copy of the scraper that sends its requests with another authorization token, the name cache, retry engine, and token pool are shared.
+        :param token: The authorization token that the copy should use.
         """
 
-        # If the dm is empty, then set it to false.
-        if dm is None:
-            dm = False
+        # Create a shallow copy of the scraper.
+        scraper = copy(self)
 
-        # Determine if we're in a dm.
-        if dm:
+        # Give the copy its own headers and per-channel state.
+        scraper.headers = dict(self.headers, Authorization=token)
+        scraper.guildname = None
+        scraper.channelname = None
+        scraper.location = None
+        scraper.pending = []
+        scraper.pendingBytes = 0
 
-            # Just pass the safe name on through.
-            self.guildname = DiscordScraper.getSafeName(id)
+        # Return the copy.
+        return scraper
 
-            # Exit the function.
-            return None
+    def grabName(self, id, kind):
+        """
+        Retrieve the name for a guild or channel from the name cache, or send a request for it if the cached name is missing or expired.
+        :param id: The ID for the guild or channel we want to retrieve the name for.
+        :param kind: Either "guilds" or "channels" depending on which API function we should use.
+        """
+
+        # Use the cached name if it hasn't expired yet.
+        name = self.names.get(id)
+
+        # Return the cached name if we had one.
+        if name is not None:
+            return name
 
         # Create a variable that references the DiscordRequest object.
         request = DiscordRequest()
@@ -227,40 +518,82 @@ class DiscordScraper(object):
         request.setHeaders(self.headers)
 
         # Generate the API location from the parameters.
-        url = 'https://discord.com/api/{0}/guilds/{1}'.format(self.apiversion, id)
+        url = 'https://discord.com/api/{0}/{1}/{2}'.format(self.apiversion, kind, id)
 
-        # Make a request to retrieve the API data from Discord.
-        response = request.sendRequest(url)
+        try:
+            # Make a request to retrieve the API data from Discord.
+            response = self.retry.send(request, url)
 
-        # Return a randomized name if the request data is empty.
+        except RetryError:
+            response = None
+
+        # Fall back on an older name (or a generated one) if the request data is empty.
         if response is None:
 
-            # Send a warning to notify the user that we're creating a random name for the guild.
-            warn('Unable to gather guild name from its ID, generating one instead!')
+            # Reuse the expired name if we have one so the folder doesn't move.
+            name = self.names.get(id, True)
 
-            # Generate 8 "random" characters to serve as our generated guild name.
-            randomguildname = DiscordScraper.randomString(8)
+            # Return the expired name if we had one.
+            if name is not None:
+                return name
 
-            # Set the guild name class variable with our new name.
-            self.guildname = u'{0}_{1}'.format(id, randomguildname)
-        
-        # Otherwise use the gathered guild data to retrieve the guild name.
-        else:
+            # Send a warning to notify the user that we're creating a random name.
+            warn('Unable to gather {0} name from its ID, generating one instead!'.format(kind[:-1]))
 
-            # Convert the response data from serialized text to a dictionary.
-            data = loads(response.read())
+            # Generate 8 "random" characters to serve as our generated name.
+            name = DiscordScraper.randomString(8)
 
-            # Grab the guild name from the data.
-            guildname = DiscordScraper.getSafeName(data['name']) if self.sanitizeFileNames else data['name']
+            # Remember the generated name so later runs write into the same folder.
+            self.names.set(id, name, True)
 
-            # Set the guild name class variable with the guild name.
-            self.guildname = u'{0}_{1}'.format(id, guildname)
+            # Return the generated name.
+            return name
 
-    
-    def grabChannelName(self, id, dm=None):
+        # Convert the response data from serialized text to a dictionary.
+        data = loads(response.read())
+
+        # Remember the name for the next run.
+        self.names.set(id, data['name'])
+
+        # Return the gathered name.
+        return data['name']
+
+    def prefetchChannelNames(self, guild):
         """
-        Send a request to retrieve the channel name by its ID.
-        :param id: The ID for the channel that we want to retrieve the name for.
+        Fill the name cache with every channel in a guild using a single request.
+        :param guild: The ID for the guild whose channel names we want to retrieve.
+        """
+
+        # Create a variable that references the DiscordRequest object.
+        request = DiscordRequest()
+
+        # Set the headers for the request.
+        request.setHeaders(self.headers)
+
+        # Generate the API location from the parameters.
+        url = 'https://discord.com/api/{0}/guilds/{1}/channels'.format(self.apiversion, guild)
+
+        try:
+            # Make a request to retrieve the API data from Discord.
+            response = self.retry.send(request, url)
+
+        except RetryError:
+            response = None
+
+        # Leave it to the per-channel lookups if the request data is empty.
+        if response is None:
+            return None
+
+        # Convert the response data from serialized text to a list of channels.
+        data = loads(response.read())
+
+        # Store the names of every channel at once.
+        self.names.update(dict((channel['id'], channel['name']) for channel in data))
+
+    def grabGuildName(self, id, dm=None):
+        """
+        Set the guild name by its ID, using the name cache where possible.
+        :param id: The ID for the guild we want to retrieve the name for.
         :param dm: A true or false (boolean) value that determines if we're scraping a direct message.
         """
 
@@ -271,47 +604,49 @@ class DiscordScraper(object):
         # Determine if we're in a dm.
         if dm:
 
-            # Just set the ID.
-            self.channelname = id
+            # Just pass the safe name on through.
+            self.guildname = DiscordScraper.getSafeName(id)
 
-            # Exit this function
+            # Exit the function.
             return None
 
-        # Create a variable that references the DiscordRequest object.
-        request = DiscordRequest()
+        # Grab the guild name from the cache or from Discord.
+        guildname = self.grabName(id, 'guilds')
 
-        # Set the headers for the request.
-        request.setHeaders(self.headers)
+        # Sanitize the guild name if we've configured the script to do so.
+        guildname = DiscordScraper.getSafeName(guildname) if self.sanitizeFileNames else guildname
 
-        # Generate the API location from the parameters.
-        url = 'https://discord.com/api/{0}/channels/{1}'.format(self.apiversion, id)
+        # Set the guild name class variable with the guild name.
+        self.guildname = u'{0}_{1}'.format(id, guildname)
 
-        # Make a request to retrieve the API data from Discord.
-        response = request.sendRequest(url)
+    def grabChannelName(self, id, dm=None):
+        """
+        Set the channel name by its ID, using the name cache where possible.
+        :param id: The ID for the channel that we want to retrieve the name for.
+        :param dm: A true or false (boolean) value that determines if we're scraping a direct message.
+        """
 
-        # Return a randomized name if the request data is empty.
-        if response is None:
+        # If the dm is empty, then set it to false.
+        if dm is None:
+            dm = False
 
-            # Send a warning to notify the user that we're creating a random name for the channel.
-            warn('Unable to gather channel name from its ID, generating one instead!')
+        # Determine if we're in a dm.
+        if dm:
 
-            # Generate 8 "random" characters to serve as our generated channel name.
-            randomchannelname = DiscordScraper.randomString(8)
+            # Just set the ID.
+            self.channelname = id
 
-            # Set the channel name class variable with our new name.
-            self.channelname = u'{0}_{1}'.format(id, randomchannelname)
-        
-        # Otherwise use the gathered channel data to retrieve the channel name.
-        else:
+            # Exit this function
+            return None
 
-            # Convert the response data from serialized text to a dictionary.
-            data = loads(response.read())
+        # Grab the channel name from the cache or from Discord.
+        channelname = self.grabName(id, 'channels')
 
-            # Grab the channel name from the data.
-            channelname = DiscordScraper.getSafeName(data['name']) if self.sanitizeFileNames else data['name']
+        # Sanitize the channel name if we've configured the script to do so.
+        channelname = DiscordScraper.getSafeName(channelname) if self.sanitizeFileNames else channelname
 
-            # Set the channel name class variable with the channel name.
-            self.channelname = u'{0}_{1}'.format(id, channelname)
+        # Set the channel name class variable with the channel name.
+        self.channelname = u'{0}_{1}'.format(id, channelname)
     
     def createFolders(self):
         """
@@ -319,7 +654,7 @@ class DiscordScraper(object):
         """
 
         # Set the direct folder path for the current channel.
-        folderpath = path.join(getcwd(), 'scrapes', self.guildname, self.channelname)
+        folderpath = self.storage.path('scrapes', self.guildname, self.channelname)
 
         # Create the path if it does not exist.
         if not path.exists(folderpath):
@@ -328,65 +663,215 @@ class DiscordScraper(object):
         # Set the location class variable.
         self.location = folderpath
 
-    def downloadJSON(self, data, year, month, day):
+    def openJSONCache(self, year, month, day):
         """
-        Cache the JSON data from all the scraped channels.
-        :param data: The response data from Discord's backend API that should contain the information we desire.
-        :param month: The month when the data was scraped.
+        Open a cache writer that the search pages for a day can be streamed into one page at a time.
         :param year: The year when the data was scraped.
+        :param month: The month when the data was scraped.
+        :param day: The day when the data was scraped.
         """
-        
-        # Determine if we have configured the script to cache JSON data to begin with.
-        if self.gatherJSONData:
 
-            # Create a cache directory.
-            cachedir = path.join(getcwd(), 'cached', self.guildname, self.channelname)
+        # Return nothing if we haven't configured the script to cache JSON data.
+        if not self.gatherJSONData:
+            return None
+
+        # Generate the direct file name for the cachefile.
+        cachefile = self.storage.path('cached', self.guildname, self.channelname, '{0}_{1}_{2}.cache.json'.format(year, month, day))
 
-            # Check if it already exists, if not then create it.
-            if not path.exists(cachedir):
-                makedirs(cachedir)
+        # Import the cache reader the first time a day is cached.
+        from .CacheArchive import CacheReader
 
-            # Generate the direct file name for the cachefile.
-            cachefile = path.join(cachedir, '{0}_{1}_{2}.cache.json'.format(year, month, day))
+        # Determine if the day's cache file was written before the day was over (e.g. the newest day of the last run), the messages posted after that are missing from it so it's replaced.
+        incomplete = path.isfile(cachefile) and path.getmtime(cachefile) < timegm(datetime(year, month, day).timetuple()) + 86400
 
-            # Determine if the cachefile already exists, if so then skip it (TODO this might cause issues for incomplete runs, so this needs to be figured out in due time).
-            if path.isfile(cachefile):
-                return None
-            
-            # Open the cachefile for appending textual data.
-            with open(cachefile, 'w') as cachefilestream:
-                
-                # Write the JSON data directly to the file.
-                dump(data, cachefilestream, indent=4)
+        # Determine if the day is already cached (in its cache file or its month's pack), if so then skip it (the writer only moves complete files into place).
+        if not incomplete and CacheReader(path.dirname(cachefile)).hasDay(year, month, day):
+            return None
+
+        # Return the writer for the cachefile, the finished file stays where it is (it tells the next run that the day is done) and the backend gets a copy of it.
+        return CacheWriter(cachefile, self.storage.mirror)
+
+    def getFollower(self):
+        """
+        Return the follower that decides which channel to poll next in follow mode, it's created (and the follow file is read) the first time it's asked for.
+        """
+
+        # Determine if the follower hasn't been created yet.
+        if self.follower is None:
+
+            # Import the follower only when follow mode uses it.
+            from .Follower import Follower
+
+            self.follower = Follower(self.storage.path('cached', 'follow.json'), self.options['followMinInterval'], self.options['followMaxInterval'])
+
+        # Return the follower.
+        return self.follower
+
+    def appendJSONCache(self, year, month, day, messages):
+        """
+        Append the message groups that follow mode picked up to the day's follow file (the next full scrape of the day writes its cache file as usual).
+        :param year: The year when the data was scraped.
+        :param month: The month when the data was scraped.
+        :param day: The day when the data was scraped.
+        :param messages: The list of message groups to append.
+        """
+
+        # Skip this function if we haven't configured the script to cache JSON data.
+        if not self.gatherJSONData:
+            return None
+
+        # Append the messages to the follow file for the day.
+        appendJSONLines(self.storage.path('cached', self.guildname, self.channelname, '{0}_{1}_{2}.follow.jsonl'.format(year, month, day)), messages)
     
-    def startDownloading(self, url, location):
+    def recordChanges(self, year, month, day, messages):
         """
-        Call the Requests.download function to begin downloading our files.
-        :param url: The direct URL (proxied URL to protect from requesting any malicious sites that might be watching out for the request header that stores our authorization token) for our content.
+        Compare the messages that were found for a day with the last scrape of it, logging the differences to the channel's change log.
+        :param year: The year when the data was scraped.
+        :param month: The month when the data was scraped.
+        :param day: The day when the data was scraped.
+        :param messages: The messages that the searches found for the day (the search hits, not the surrounding context).
+        """
+
+        # Skip this function if we haven't configured the script to detect changes.
+        if not self.detectChanges:
+            return None
+
+        # Import the change tracker the first time a day is compared.
+        from .ChangeLog import ChangeTracker
+
+        # Compare the day with the last scrape of it.
+        counts = ChangeTracker(self.storage.path('cached', self.guildname, self.channelname)).update(year, month, day, messages, DiscordScraper.getDayBounds(day, month, year))
+
+        # Add the changes to the totals for the run.
+        with self.changelock:
+            for index, count in enumerate(counts):
+                self.changes[index] += count
+
+    def getFileName(self, url, location):
+        """
+        Return the full file path that a file is downloaded to.
+        :param url: The direct URL for our content.
         :param location: The folder that we will be downloading the content into.
         """
-        
-        # Split the url into parts.
-        urlparts = url.split('/')
+
+        # Split the url into parts, leaving out the query (e.g. the size that the media proxy scales an image down to).
+        urlparts = url.split('?')[0].split('/')
 
         # Generate a file name from the url parts.
         filename = DiscordScraper.getSafeName('{0}_{1}'.format(urlparts[-2], urlparts[-1])) if self.sanitizeFileNames else '{0}_{1}'.format(urlparts[-2], urlparts[-1])
 
         # Join the file name with the location.
-        filename = path.join(location, filename)
+        return path.join(location, filename)
+
+    def startDownloading(self, url, location, size=None):
+        """
+        Call the Requests.download function to begin downloading our files.
+        :param url: The direct URL (proxied URL to protect from requesting any malicious sites that might be watching out for the request header that stores our authorization token) for our content.
+        :param location: The folder that we will be downloading the content into.
+        :param size: The number of bytes that the message says the file has, if it says.
+        """
+
+        # Grab the full file path to download the file to.
+        filename = self.getFileName(url, location)
+
+        # Skip this function if the file has already been downloaded (wherever the storage backend keeps it).
+        if self.storage.exists(filename):
+            return None
+
+        # Don't start any new downloads once we've been asked to stop, the dead letter lets --refetch download the file later.
+        if self.shutdown.requested():
+            self.retry.deadLetter(url, 'shutdown', 'Stopped before the download started.', {'filename': filename})
+            return None
+
+        try:
+            # Hold the download back while the disk is nearly full, the scrape carries on and --refetch downloads the file later.
+            # The queued up files count as well when we know their size, since they all land on the disk before the next check.
+            self.governor.check(filename, (size or 0) + (self.pendingBytes if self.asyncDownloads else 0))
 
-        # Skip this function if the file already exists.
-        if path.isfile(filename):
+        except DiskSpaceError as ex:
+            warn(ex)
+            self.retry.deadLetter(url, 'disk', ex, {'filename': filename})
+            return None
+
+        # Queue the file up for the concurrent downloader if we've configured the script to use it.
+        if self.asyncDownloads:
+            self.pending.append((url, filename))
+            self.pendingBytes += size or 0
             return None
         
         # Create a request.
         request = DiscordRequest()
 
-        # Set the request headers.
+        # Set the request headers and the limits.
         request.setHeaders(self.headers)
+        request.throttle = self.throttle
+        request.governor = self.governor
 
-        # Download the file directly.
-        request.downloadFile(url, filename, self.buffersize)
+        try:
+            # Download the file directly.
+            self.retry.download(request, url, filename, self.buffersize)
+
+        except RetryError as ex:
+            # The download has already been written to the dead letter file.
+            warn(ex)
+            return None
+
+        # Hand the finished file to the storage backend.
+        self.storage.put(filename)
+
+    def selectFiles(self, data):
+        """
+        Return the files that we want to download from a page of messages in accordance with the configuration file settings, without downloading anything.
+        :param data: The response data from Discord's backend API that should contain the information we desire.
+        :return: A list of (url, size) tuples, the size is the number of bytes that the message says the file has (embeds don't say, so theirs is None).
+        """
+
+        # Create a blank list to store the files that we want.
+        files = []
+
+        # Iterate through all messages one-by-one.
+        for messages in data['messages']:
+
+            # Iterate through each message one-by-one.
+            for message in messages:
+
+                # Iterate through all of the attachments to check them one-by-one.
+                for attachment in message['attachments']:
+
+                    # Get the proxied URL for our content.
+                    proxied = attachment['proxy_url']
+
+                    # Get the proxied file name from the proxied URL.
+                    proxiedfilename = proxied.split('/')[-1].split('?')[0]
+
+                    # Get the content type that Discord sniffed when the file was uploaded, falling back to guessing it from the proxied file name.
+                    contenttype = attachment.get('content_type') or DiscordScraper.getFileMimetype(proxiedfilename)
+
+                    # Get the mimetype for the proxied file.
+                    proxiedfilemime = contenttype.split('/')[0]
+
+                    # Determine if the proxied file is an image file, a video file, or neither, and whether we want that type of file.
+                    if (self.types['images'] and proxiedfilemime == 'image') or (self.types['videos'] and proxiedfilemime == 'video') or (self.types['files'] and proxiedfilemime not in ['image', 'video']):
+
+                        # Select this file if it passes the size, content type, and resolution filters.
+                        if self.attachmentFilter.accepts(attachment, contenttype):
+                            files.append((proxied, attachment.get('size')))
+
+                # Iterate through all of the embedded contents to check them one-by-one.
+                for embed in message['embeds']:
+
+                    # Determine if this is an embedded image (a gifv counts as an image even though we download its video) or an embedded video that we want.
+                    if (self.types['images'] and embed['type'] in ['image', 'gifv']) or (self.types['videos'] and embed['type'] == 'video'):
+
+                        # Get the proxied URL for the best variant of our content.
+                        url = resolveEmbed(embed, self.embedMaxPixels)
+
+                        # Select this file if there's a variant that we can download.
+                        if url is not None:
+                            files.append((url, None))
+
+        # Return the files that we want.
+        return files
 
     def checkMimetypes(self, data):
         """
@@ -394,70 +879,63 @@ class DiscordScraper(object):
         :param data: The response data from Discord's backend API that should contain the information we desire.
         """
 
-        try:
+        # Determine if there are any results from our scrape.
+        if data['total_results'] > 0:
 
-            # Determine if there are any results from our scrape.
-            if data['total_results'] > 0:
-
-                # Iterate through all messages one-by-one.
-                for messages in data['messages']:
-
-                    # Iterate through each message one-by-one.
-                    for message in messages:
-
-                        # Iterate through all of the attachments to check them one-by-one.
-                        for attachment in message['attachments']:
-
-                            # Get the proxied URL for our content.
-                            proxied = attachment['proxy_url']
-
-                            # Get the proxied file name from the proxied URL.
-                            proxiedfilename = proxied.split('/')[-1].split('?')[0]
-
-                            # Get the mimetype for the proxied file name.
-                            proxiedfilemime = DiscordScraper.getFileMimetype(proxiedfilename).split('/')[0]
-
-                            # Determine if the proxied file is an image file.
-                            if self.types['images'] and proxiedfilemime == 'image':
-                                
-                                # Begin downloading this file if so.
-                                self.startDownloading(proxied, self.location)
-                            
-                            # Determine if the proxied file is a video file.
-                            if self.types['videos'] and proxiedfilemime == 'video':
-                                
-                                # Begin downloading this file if so.
-                                self.startDownloading(proxied, self.location)
-                            
-                            # Determine if the proxied file is neither an image or a video file.
-                            if self.types['files'] and proxiedfilemime not in ['image', 'video']:
-                                
-                                # Begin downloading this file if so.
-                                self.startDownloading(proxied, self.location)
-                            
-                        # Iterate through all of the embedded contents to check them one-by-one.
-                        for embed in message['embeds']:
-
-                            # Determine if there are any embedded images.
-                            if self.types['images'] and embed['type'] in ['image', 'gifv']:
-
-                                # Get the URL for our content.
-                                url = embed['url']
-                                
-                                # Begin downloading this file if so.
-                                self.startDownloading(url, self.location)
-
-                            # Determine if there are any embedded videos.
-                            if self.types['videos'] and embed['type'] == 'video':
-
-                                # Get the URL for our content.
-                                url = embed['url']
-
-                                # Begin downloading this file if so.
-                                self.startDownloading(url, self.location)
-        except:
-            pass
+            # Check the files one message group at a time so a message that we can't make sense of only costs us its own files.
+            for messages in data['messages']:
+
+                try:
+                    files = self.selectFiles({'messages': [messages]})
+
+                except Exception as ex:
+                    warn('Skipped the files of a message that could not be read: {0}'.format(ex))
+                    continue
+
+                # Begin downloading the files that we want one-by-one, the known sizes let us check the disk space before sending any request.
+                for url, size in files:
+
+                    try:
+                        self.startDownloading(url, self.location, size)
+
+                    except Exception as ex:
+                        # Carry on with the other files, the dead letter lets --refetch download this one later.
+                        warn('Failed to download {0}: {1}'.format(url, ex))
+                        self.retry.deadLetter(url, 'error', ex, {'filename': self.getFileName(url, self.location)})
+
+    def flushDownloads(self):
+        """
+        Download every queued file concurrently with the asyncio transport, the files are queued up across a whole day so there are plenty of them in flight.
+        """
+
+        # Skip this function if there's nothing queued up.
+        if len(self.pending) == 0:
+            return None
+
+        # Grab the queued files and clear the queue.
+        downloads, self.pending = self.pending, []
+        self.pendingBytes = 0
+
+        # Download the queued files over the shared connection pool.
+        self.downloader.download(dict(self.headers), downloads)
+
+        # Hand the finished files to the storage backend (the ones that failed aren't there to hand over).
+        for url, filename in downloads:
+            if path.isfile(filename):
+                self.storage.put(filename)
     
+    def close(self):
+        """
+        Stop the downloader and wait for the storage backend to store the last of the downloads, this is called once the run is over.
+        """
+
+        # Stop the downloader's event loop and close its pooled connections.
+        if self.downloader is not None:
+            self.downloader.close()
+
+        # Store whatever the storage backend is still holding on to.
+        self.storage.close()
+
     @staticmethod
     def randomString(length):
         """
@@ -468,6 +946,9 @@ class DiscordScraper(object):
         # This will be the character set for the random string, the random string will only consist of these characters.
         charset = "0123456789ABCDEF"  # Some will recognize this as the character set for hexadecimal values, and that is true.
 
+        # Import the random module the first time it's needed.
+        from random import choice
+
         # Return a string formed from the joining of an array of "random" characters.
         return ''.join([choice(charset) for i in range(length)])
 
@@ -478,8 +959,13 @@ class DiscordScraper(object):
         :param name: The file name whose mimetype we want to guess.
         """
 
+        # Load the mimetype database the first time it's needed, reading it is slow so every call shares the same one.
+        if DiscordScraper.mimetypes is None:
+            from mimetypes import MimeTypes
+            DiscordScraper.mimetypes = MimeTypes()
+
         # Create a variable to store the guessed mimetype for the file.
-        mimetype = MimeTypes().guess_type(name)[0]
+        mimetype = DiscordScraper.mimetypes.guess_type(name)[0]
 
         # Determine if the mimetype value is empty, return a blob mimetype if it is empty.
         if mimetype is None:
@@ -520,29 +1006,41 @@ class DiscordScraper(object):
         # Return the snowflake value divided by 1000 to get the timestamp value to the nearest second.
         return snowflake / 1000.0
     
+    @staticmethod
+    def getWindowBounds(start, end):
+        """
+        Return the min_id and max_id snowflakes for the half-open window of time [start, end), windows that share an end and a start cover every millisecond between them exactly once.
+        :param start: The datetime object (in UTC) for the start of the window.
+        :param end: The datetime object (in UTC) for the end of the window, this moment belongs to the next window.
+        """
+
+        # Get the timestamps of the start and the end of the window in UTC.
+        mintime = timegm((start.year, start.month, start.day, start.hour, start.minute, start.second, 0, 0, 0))
+        maxtime = timegm((end.year, end.month, end.day, end.hour, end.minute, end.second, 0, 0, 0))
+
+        # The smallest snowflake of the first millisecond of the window, less one since min_id only matches the IDs after it (a window that starts at the Discord epoch can't go below zero).
+        minsnow = max(0, DiscordScraper.timestampToSnowflake(mintime) - 1)
+
+        # The smallest snowflake of the first millisecond after the window, max_id only matches the IDs before it.
+        maxsnow = max(0, DiscordScraper.timestampToSnowflake(maxtime))
+
+        # Return an array with the minimum snowflake and maximum snowflake values in it.
+        return [minsnow, maxsnow]
+
     @staticmethod
     def getDayBounds(day, month, year):
         """
-        Return an array of snowflakes that is representative of the start and end of the specified date.
+        Return an array of snowflakes that is representative of the start and end of the specified date in UTC.
         :param day: The day that we're wanting to grab the snowflakes for.
         :param month: The month that we're wanting to grab the snowflakes for.
         :param year: The year that we're wanting to grab the snowflakes for, we're assuming the use of the Gregorian calendar.
         """
 
-        # Get the minimum timestamp value or 00:00 (12:00 AM).
-        mintime = mktime((year, month, day,  0,  0,  0, -1, -1, -1))
-
-        # Get the maximum timestamp value or 23:59 (11:59 PM).
-        maxtime = mktime((year, month, day, 23, 59, 59, -1, -1, -1))
-
-        # Convert the minimum timestamp value to a snowflake.
-        minsnow = DiscordScraper.timestampToSnowflake(mintime)
-
-        # Convert the maximum timestamp value to a snowflake.
-        maxsnow = DiscordScraper.timestampToSnowflake(maxtime)
+        # Get the start of the day, the window runs up to (but not including) the start of the next day.
+        start = datetime(year, month, day)
 
         # Return an array with the minimum snowflake and maximum snowflake values in it.
-        return [minsnow, maxsnow]
+        return DiscordScraper.getWindowBounds(start, start + timedelta(days=1))
     
     @staticmethod
     def getSafeName(name):
@@ -624,11 +1122,53 @@ class DiscordScraper(object):
         return '&'.join(parameters)
 
     @staticmethod
-    def requestData(url, headers=None):
+    def planQueries(query, types, everything, filters=None):
+        """
+        Return the URI queries that a day has to be searched with, the results of the queries can overlap so the messages have to be told apart by their IDs.
+        When we don't need every message, the file types that we want are pushed down into the search so the text-only messages are never paged through.
+        :param query: The dictionary of search query flags from the configuration file, any has= flags that are set here are used as they are.
+        :param types: The dictionary of file types that we want to download.
+        :param everything: A true or false (boolean) value that determines if we need every message (e.g. to cache them or for their text).
+        :param filters: A dictionary of lists of "authors", "mentions", "filenames", and "extensions" to narrow every query down with.
+        """
+
+        # Import the URL quoting function the first time it's needed.
+        try:
+            from urllib.parse import quote
+        except ImportError:
+            from urllib import quote
+
+        # Create an array to store the partial query strings that every query shares.
+        shared = []
+
+        # Turn the filters into their search parameters, Discord matches any of the values given for the same parameter.
+        for key, parameter in [('authors', 'author_id'), ('mentions', 'mentions'), ('filenames', 'attachment_filename'), ('extensions', 'attachment_extension')]:
+            for value in (filters or {}).get(key, []):
+                shared.append('{0}={1}'.format(parameter, quote(u'{0}'.format(value).encode('utf-8'))))
+
+        # Use the search query flags as they are if any has= flags were set, or if we need every message anyway.
+        if everything or any(value for key, value in query.items() if key != 'nsfw'):
+            return ['&'.join([part for part in [DiscordScraper.generateQueryBody(**query)] + shared if len(part) > 0])]
+
+        # Otherwise search once for each kind of content that we want to download.
+        has = [name for key, name in [('images', 'image'), ('videos', 'video'), ('files', 'file')] if types[key]]
+
+        # Embedded images and videos might not be counted as images or videos by the search, so look for embeds as well.
+        if types['images'] or types['videos']:
+            has.append('embed')
+
+        # Build one query per kind of content (there are none if we don't want anything at all).
+        nsfw = DiscordScraper.generateQueryBody(nsfw=query['nsfw'])
+        return ['&'.join([part for part in ['has={0}'.format(name), nsfw] + shared if len(part) > 0]) for name in has]
+
+    @staticmethod
+    def requestData(url, headers=None, retry=None, context=None):
         """
         Make a simplified alias to the Discord Requests sendRequest class function.
         :param url: The URL that we want to grab data from.
         :param headers: The headers dictionary that we want to set.
+        :param retry: The RetryEngine to send the request through, the request is only sent once if this is empty.
+        :param context: A dictionary describing what the request was for, this is written alongside the dead letter (nothing is written if it's empty).
         """
 
         # Determine if the headers are empty, if so then use an empty dictionary.
@@ -641,5 +1181,31 @@ class DiscordScraper(object):
         # Set the headers.
         request.setHeaders(headers)
 
+        # Send the request through the retry engine if we were given one (this raises a RetryError once the request fails for good).
+        if retry is not None:
+            return retry.send(request, url, context)
+
         # Return the response.
         return request.sendRequest(url)
+
+    @staticmethod
+    def requestSize(url, headers=None):
+        """
+        Return the size in bytes of a file with a HEAD request, or None if we couldn't find out.
+        :param url: The URL for the file that we're wanting the size of.
+        :param headers: The headers dictionary that we want to set.
+        """
+
+        # Create a request variable.
+        request = DiscordRequest()
+
+        # Set the headers, copying them so they don't change under any other request.
+        request.setHeaders(dict(headers or {}))
+
+        try:
+            # Ask for the headers of the file only.
+            return request.fileSize(url)
+
+        except Exception as ex:
+            warn('Unable to get the size of {0}: {1}'.format(url, ex))
+            return None
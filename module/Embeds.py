@@ -0,0 +1,56 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+The media fields of an embed to try, best first, for each embed type that we download.
+A gifv is a looping video with a still (or an animated GIF) as its thumbnail, the video is much smaller so it goes first.
+"""
+VARIANTS = {
+    'image': ['image', 'thumbnail'],
+    'gifv':  ['video', 'thumbnail'],
+    'video': ['video'],
+}
+
+"""
+The hosts of Discord's media proxy, these can scale images down for us with the width and height query.
+"""
+PROXYHOSTS = ['media.discordapp.net', 'images-ext-1.discordapp.net', 'images-ext-2.discordapp.net']
+
+def resolveEmbed(embed, maxpixels=None):
+    """
+    Return the proxied URL of the best media variant of an embed, or None if the embed has nothing that we can download.
+    The embed's own URL is usually the page that was linked rather than the media, so only the proxied media URLs are used.
+    :param embed: The embed dictionary from a message.
+    :param maxpixels: The largest number of pixels (width times height) to download, no limit if this is empty or zero.
+    """
+
+    # Iterate through the media fields of the embed, best first.
+    for field in VARIANTS.get(embed.get('type'), []):
+        media = embed.get(field) or {}
+
+        # Skip the media that isn't proxied, fetching the original from an external site often fails or is huge.
+        url = media.get('proxy_url')
+
+        if url is None:
+            continue
+
+        # Grab the resolution if the embed told us what it is.
+        width = media.get('width') or 0
+        height = media.get('height') or 0
+
+        # Use the variant as it is if there's no cap or it's under the cap.
+        if not maxpixels or width * height <= maxpixels:
+            return url
+
+        # Ask the media proxy to scale an image down to fit under the cap.
+        if field != 'video' and url.split('/')[2] in PROXYHOSTS:
+            scale = (float(maxpixels) / (width * height)) ** 0.5
+            return '{0}{1}width={2}&height={3}'.format(url, '&' if '?' in url else '?', max(1, int(width * scale)), max(1, int(height * scale)))
+
+        # Otherwise try the next variant.
+
+    # Return nothing if there's no variant that we can download.
+    return None
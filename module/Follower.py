@@ -0,0 +1,134 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+heapq.heappush: Used to add a channel to the polling schedule.
+heapq.heappop:  Used to take the channel that is due next off the polling schedule.
+"""
+from heapq import heappush, heappop
+
+"""
+json.load: Used to read the follow file into a dictionary object.
+json.dump: Used to write the last message IDs back to the follow file.
+"""
+from json import load, dump
+
+"""
+os.makedirs: Used to create the folder that stores the follow file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, path
+
+"""
+time.time: Used to work out when each channel is due to be polled.
+"""
+from time import time
+
+class Follower(object):
+    """
+    Keep track of the last message seen in each followed channel and when each channel should be polled again.
+    Channels that keep getting new messages are polled more often, and quiet channels back off towards the longest interval.
+    """
+
+    def __init__(self, filename, minimum=None, maximum=None):
+        """
+        The class constructor.
+        :param filename: The full file path to the JSON file that stores the last message ID of each channel.
+        :param minimum: The shortest number of seconds between two polls of the same channel, defaults to 5.
+        :param maximum: The longest number of seconds between two polls of the same channel, defaults to 300.
+        """
+
+        # Create some class variables to store the follower settings.
+        self.filename = filename
+        self.minimum = float(minimum if minimum is not None else 5)
+        self.maximum = float(maximum if maximum is not None else 300)
+
+        # Create a dictionary to store the last message ID of each channel.
+        self.after = {}
+
+        # Load the last message IDs from the previous runs if there are any.
+        if path.isfile(filename):
+
+            # Open the follow file in text-mode for reading.
+            with open(filename, 'r') as followstream:
+
+                try:
+                    # Read the last message IDs into the dictionary.
+                    self.after = load(followstream)
+
+                except ValueError:
+                    # A broken follow file only means that we start again from the given snowflakes.
+                    self.after = {}
+
+        # Create a dictionary to store the polling interval of each channel, and a heap of (due time, channel) pairs.
+        self.interval = {}
+        self.schedule = []
+
+    def add(self, channel, after):
+        """
+        Start following a channel, picking up from where a previous run left off if there was one.
+        :param channel: The ID for the channel.
+        :param after: The snowflake to start from if the channel hasn't been followed before.
+        """
+
+        # Only use the given snowflake for a channel that we haven't followed before.
+        self.after.setdefault(str(channel), str(after))
+
+        # Poll the channel straight away, starting at the shortest interval.
+        self.interval[str(channel)] = self.minimum
+        heappush(self.schedule, (time(), str(channel)))
+
+    def next(self):
+        """
+        Take the channel that is due next off the schedule, returning the number of seconds until it's due and its ID.
+        """
+
+        # Grab the channel that is due next.
+        due, channel = heappop(self.schedule)
+
+        # Return how long we have to wait for it.
+        return max(0.0, due - time()), channel
+
+    def polled(self, channel, newest=None, more=None):
+        """
+        Record the result of a poll and put the channel back on the schedule.
+        :param channel: The ID for the channel.
+        :param newest: The ID of the newest message that the poll returned, or None if there weren't any.
+        :param more: A true or false (boolean) value that determines if the poll was cut off by the page limit.
+        """
+
+        # Grab the current polling interval.
+        interval = self.interval[channel]
+
+        # Poll a busy channel twice as often (and again straight away if there's more to read).
+        if newest is not None:
+            self.after[channel] = str(newest)
+            interval = max(self.minimum, interval / 2)
+            self.save()
+
+        # Back off on a quiet channel.
+        else:
+            interval = min(self.maximum, interval * 1.5)
+
+        # Put the channel back on the schedule.
+        self.interval[channel] = interval
+        heappush(self.schedule, (time() + (0 if more else interval), channel))
+
+    def save(self):
+        """
+        Write the last message IDs to disk.
+        """
+
+        # Grab the folder path from the full file name.
+        folder = path.split(self.filename)[0]
+
+        # Determine if the folder path exists, if not then create it.
+        if not path.exists(folder):
+            makedirs(folder)
+
+        # Write the last message IDs to disk.
+        with open(self.filename, 'w') as followstream:
+            dump(self.after, followstream, indent=4)
@@ -0,0 +1,123 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+json.dumps: Used to convert a dictionary object into a serialized string.
+"""
+from json import dumps
+
+"""
+os.makedirs: Used to create a folder with subfolders.
+os.remove:   Used to throw away an unfinished cache file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, remove, path
+
+"""
+os.replace: Used to move a finished cache file into place, over the cache file that it replaces (os.rename on Python 2 already does this outside of Windows).
+"""
+try:
+    from os import replace
+except ImportError:
+    from os import rename as replace
+
+class CacheWriter(object):
+    """
+    Write a day's worth of search results to its cache file one page at a time so that only one page is ever held in memory.
+    """
+
+    def __init__(self, filename, onclose=None):
+        """
+        The class constructor.
+        :param filename: The full file path to the cache file that we're wanting to write.
+        :param onclose: A function that is called with the file name once the finished file is in place, e.g. to copy it to the storage backend.
+        """
+
+        # Create some class variables to store the cache file details.
+        self.filename = filename
+        self.onclose = onclose
+        self.tempname = '{0}.tmp'.format(filename)
+        self.count = 0
+        self.stream = None
+
+    def write(self, messages):
+        """
+        Append the message groups from a single search page to the cache file.
+        :param messages: The list of message groups from the search page.
+        """
+
+        # Open the temporary file the first time we have something to write so empty days never create a file.
+        if self.stream is None:
+
+            # Grab the folder path from the full file name.
+            cachedir = path.split(self.filename)[0]
+
+            # Determine if the folder path exists, if not then create it.
+            if not path.exists(cachedir):
+                makedirs(cachedir)
+
+            # Open the temporary file in text-mode for writing and start the messages array.
+            self.stream = open(self.tempname, 'w')
+            self.stream.write('{\n    "messages": [')
+
+        # Write each message group as its own array element.
+        for group in messages:
+            self.stream.write('{0}\n        {1}'.format(',' if self.count > 0 else '', dumps(group)))
+            self.count += 1
+
+    def close(self):
+        """
+        Finish the cache file and move it into place, the file keeps the same shape as a single search response.
+        """
+
+        # Skip this function if nothing was ever written.
+        if self.stream is None:
+            return None
+
+        # Close the messages array and record how many message groups we wrote.
+        self.stream.write('\n    ],\n    "total_results": {0}\n}}\n'.format(self.count))
+        self.stream.close()
+        self.stream = None
+
+        # Move the finished file into place, replacing the cache file of a day that was cached before it was over.
+        replace(self.tempname, self.filename)
+
+        # Let the caller know that the file is finished.
+        if self.onclose is not None:
+            self.onclose(self.filename)
+
+    def abort(self):
+        """
+        Throw away an unfinished cache file so that the day gets scraped again on the next run.
+        """
+
+        # Skip this function if nothing was ever written.
+        if self.stream is None:
+            return None
+
+        # Close and remove the temporary file.
+        self.stream.close()
+        self.stream = None
+        remove(self.tempname)
+
+def appendJSONLines(filename, messages):
+    """
+    Append message groups to a JSON lines file, one group per line, this is used by follow mode where a day's messages come in a few at a time.
+    :param filename: The full file path to the JSON lines file.
+    :param messages: The list of message groups to append.
+    """
+
+    # Grab the folder path from the full file name.
+    cachedir = path.split(filename)[0]
+
+    # Determine if the folder path exists, if not then create it.
+    if not path.exists(cachedir):
+        makedirs(cachedir)
+
+    # Open the file in text-mode for appending and write each message group on its own line.
+    with open(filename, 'a') as cachestream:
+        for group in messages:
+            cachestream.write('{0}\n'.format(dumps(group)))
@@ -0,0 +1,144 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+json.load: Used to read the name cache file into a dictionary object.
+json.dump: Used to write the name cache dictionary back to the name cache file.
+"""
+from json import load, dump
+
+"""
+os.makedirs: Used to create the folder that stores the name cache file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, path
+
+"""
+threading.Lock: Used to keep the name cache consistent when more than one scraper shares it.
+"""
+from threading import Lock
+
+"""
+time.time: Used to timestamp each cached name so we know when it has expired.
+"""
+from time import time
+
+class NameCache(object):
+    """
+    A persistent cache of guild and channel names keyed by their IDs so folder names stay the same between runs.
+    """
+
+    def __init__(self, filename, ttl=None):
+        """
+        The class constructor.
+        :param filename: The full file path to the JSON file that stores the cached names.
+        :param ttl: The number of seconds a cached name is considered fresh for, defaults to one week.
+        """
+
+        # Determine if the ttl argument is not set.
+        if ttl is None:
+
+            # Set it to the default value of one week.
+            ttl = 7 * 24 * 60 * 60
+
+        # Create some class variables to store the cache settings.
+        self.filename = filename
+        self.ttl = ttl
+        self.lock = Lock()
+
+        # Create a blank dictionary to store the cached names.
+        self.names = {}
+
+        # Load the cached names from the previous runs if there are any.
+        if path.isfile(filename):
+
+            # Open the name cache file in text-mode for reading.
+            with open(filename, 'r') as cachefilestream:
+
+                try:
+                    # Read the cached names into the dictionary.
+                    self.names = load(cachefilestream)
+
+                except ValueError:
+                    # A broken cache file is no worse than no cache file at all.
+                    self.names = {}
+
+    def get(self, id, stale=None):
+        """
+        Return the cached name for an ID, or None if there isn't a usable one.
+        :param id: The ID for the guild or channel we want the name for.
+        :param stale: A true or false (boolean) value that determines if an expired name is still acceptable.
+        """
+
+        # If stale is empty, then set it to false.
+        if stale is None:
+            stale = False
+
+        # Grab the cache entry for the ID.
+        entry = self.names.get(str(id))
+
+        # Return nothing if we've never seen this ID before.
+        if entry is None:
+            return None
+
+        # Generated names are only kept as a fallback, so treat them as always expired.
+        expired = entry.get('generated', False) or time() - entry['time'] > self.ttl
+
+        # Return nothing if the entry is expired and we don't want stale names.
+        if expired and not stale:
+            return None
+
+        # Return the cached name.
+        return entry['name']
+
+    def set(self, id, name, generated=None):
+        """
+        Store the name for an ID in the cache and write the cache to disk.
+        :param id: The ID for the guild or channel we're storing the name for.
+        :param name: The name for the guild or channel.
+        :param generated: A true or false (boolean) value that determines if the name was randomly generated instead of gathered from Discord.
+        """
+
+        # Store every name that we've been given in one go.
+        self.update({id: name}, generated)
+
+    def update(self, names, generated=None):
+        """
+        Store the names for many IDs in the cache and write the cache to disk once.
+        :param names: A dictionary of IDs and their names.
+        :param generated: A true or false (boolean) value that determines if the names were randomly generated instead of gathered from Discord.
+        """
+
+        # If generated is empty, then set it to false.
+        if generated is None:
+            generated = False
+
+        with self.lock:
+
+            # Store each name alongside the time we gathered it.
+            for id, name in names.items():
+                self.names[str(id)] = {'name': name, 'time': time(), 'generated': generated}
+
+            # Write the cache to disk.
+            self.save()
+
+    def save(self):
+        """
+        Write the name cache to disk.
+        """
+
+        # Grab the folder path from the full file name.
+        cachedir = path.split(self.filename)[0]
+
+        # Determine if the folder path exists, if not then create it.
+        if not path.exists(cachedir):
+            makedirs(cachedir)
+
+        # Open the name cache file in text-mode for writing.
+        with open(self.filename, 'w') as cachefilestream:
+
+            # Write the cached names directly to the file.
+            dump(self.names, cachefilestream, indent=4)
@@ -0,0 +1,404 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+json.dumps: Used to convert an index entry into a serialized string.
+json.loads: Used to convert a serialized index entry back into a dictionary object.
+"""
+from json import dumps, loads
+
+"""
+os.makedirs: Used to create the folder that stores the packs.
+os.remove:   Used to throw away a file once it's in a pack, and the packs once they've been extracted.
+os.rmdir:    Used to throw away the empty pack folder once it's been extracted.
+os.walk:     Used to find the channel folders to pack or extract.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, remove, rmdir, walk, path
+
+"""
+threading.Lock: Used to keep a pack and its index consistent between threads.
+"""
+from threading import Lock
+
+"""
+The name of the folder inside of a channel folder that stores its packs and their index.
+"""
+PACKFOLDER = 'packs'
+
+class PackStore(object):
+    """
+    Append the small files of a channel folder into size-capped pack files instead of keeping each of them as a file of its own.
+    A pack is just the files' bytes one after the other, the index next to it is a JSON lines file with the name, attachment ID, pack number, offset, and size of every file so any of them can be read back without reading the rest.
+    """
+
+    def __init__(self, folder, packsize=None):
+        """
+        The class constructor.
+        :param folder: The channel folder that the files belong to, the packs go in a folder inside of it.
+        :param packsize: The largest size in bytes of a pack, defaults to 256 MiB.
+        """
+
+        # Determine if the packsize argument is not set.
+        if packsize is None:
+
+            # Set it to the default value of 256 MiB.
+            packsize = 268435456
+
+        # Create some class variables to store the store settings.
+        self.folder = folder
+        self.packfolder = path.join(folder, PACKFOLDER)
+        self.indexfile = path.join(self.packfolder, 'index.jsonl')
+        self.packsize = packsize
+        self.lock = Lock()
+
+        # Create some class variables to store the index, by file name and by attachment ID.
+        self.entries = {}
+        self.ids = {}
+
+        # Create some class variables to store the pack that is being appended to and where its last file ends.
+        self.current = 0
+        self.end = 0
+
+        # Read the index if there is one.
+        self.load()
+
+    def load(self):
+        """
+        Read the index file, a line cut off by a crash is thrown away (its file is overwritten by the next one added).
+        """
+
+        # Skip this function if there's no index yet.
+        if not path.isfile(self.indexfile):
+            return None
+
+        # Read the index up to the end of its last whole line.
+        with open(self.indexfile, 'r') as indexstream:
+            contents = indexstream.read()
+
+        complete = contents[:contents.rfind('\n') + 1]
+
+        # Throw away a line that was cut off so the next entry starts on a line of its own.
+        if complete != contents:
+            with open(self.indexfile, 'w') as indexstream:
+                indexstream.write(complete)
+
+        # Read every entry in the index.
+        for line in complete.splitlines():
+            self.remember(loads(line))
+
+    def remember(self, entry):
+        """
+        Add an entry to the index in memory, and move the end of the packs past it.
+        :param entry: The index entry.
+        """
+
+        self.entries[entry['name']] = entry
+        self.ids[entry['id']] = entry['name']
+
+        # Keep track of the last pack and where its last file ends.
+        if entry['pack'] > self.current:
+            self.current, self.end = entry['pack'], 0
+
+        if entry['pack'] == self.current:
+            self.end = max(self.end, entry['offset'] + entry['size'])
+
+    def packname(self, number):
+        """
+        Return the full file path to a pack.
+        :param number: The number of the pack.
+        """
+
+        return path.join(self.packfolder, 'pack_{0:05d}.pack'.format(number))
+
+    def __contains__(self, name):
+        """
+        Return whether or not a file is in the packs.
+        :param name: The file name (without a folder).
+        """
+
+        return name in self.entries
+
+    def __len__(self):
+        """
+        Return the number of files in the packs.
+        """
+
+        return len(self.entries)
+
+    def add(self, name, data):
+        """
+        Append a file to the current pack (or a new one if it's full) and add it to the index.
+        :param name: The file name (without a folder), the attachment ID is the part before the first underscore.
+        :param data: The contents of the file.
+        """
+
+        with self.lock:
+
+            # Skip the file if it's already in the packs.
+            if name in self.entries:
+                return None
+
+            # Start a new pack if there isn't one yet or the file doesn't fit in the current one (a file bigger than a pack gets a pack of its own).
+            if self.current == 0 or (self.end > 0 and self.end + len(data) > self.packsize):
+                self.current, self.end = self.current + 1, 0
+
+            # Determine if the pack folder exists, if not then create it.
+            if not path.exists(self.packfolder):
+                makedirs(self.packfolder)
+
+            # Write the file where the last indexed file ends, anything after that was cut off by a crash and is thrown away.
+            packname = self.packname(self.current)
+
+            with open(packname, 'r+b' if path.isfile(packname) else 'wb') as packstream:
+                packstream.seek(self.end)
+                packstream.write(data)
+                packstream.truncate()
+
+            # Add the file to the index once its bytes are in the pack.
+            entry = {'name': name, 'id': name.split('_')[0], 'pack': self.current, 'offset': self.end, 'size': len(data)}
+
+            with open(self.indexfile, 'a') as indexstream:
+                indexstream.write('{0}\n'.format(dumps(entry)))
+
+            self.remember(entry)
+
+    def addFile(self, filename):
+        """
+        Move a file from the channel folder into the packs.
+        :param filename: The full file path to the file.
+        """
+
+        # Read the file.
+        with open(filename, 'rb') as filestream:
+            data = filestream.read()
+
+        # Append it to the packs, then throw away the loose file.
+        self.add(path.basename(filename), data)
+        remove(filename)
+
+    def addFiles(self, filenames):
+        """
+        Move a batch of files from the channel folder into the packs, opening each pack and the index once for the whole batch.
+        :param filenames: A list of the full file paths to the files.
+        """
+
+        with self.lock:
+
+            # Create a list to store the index entries of the batch.
+            entries = []
+
+            # Determine if the pack folder exists, if not then create it.
+            if not path.exists(self.packfolder):
+                makedirs(self.packfolder)
+
+            # Create some variables to store the pack that is open and where it ends, the class variables only move once the batch is in the index.
+            packstream = None
+            current, end = self.current, self.end
+
+            try:
+                for filename in filenames:
+                    name = path.basename(filename)
+
+                    # Skip the files that are already in the packs (or in this batch twice).
+                    if name in self.entries or any(entry['name'] == name for entry in entries):
+                        continue
+
+                    # Read the file.
+                    with open(filename, 'rb') as filestream:
+                        data = filestream.read()
+
+                    # Start a new pack if there isn't one yet or the file doesn't fit in the current one.
+                    if current == 0 or (end > 0 and end + len(data) > self.packsize):
+                        current, end = current + 1, 0
+
+                        if packstream is not None:
+                            packstream.close()
+                            packstream = None
+
+                    # Open the current pack and throw away anything after the last indexed file.
+                    if packstream is None:
+                        packname = self.packname(current)
+                        packstream = open(packname, 'r+b' if path.isfile(packname) else 'wb')
+                        packstream.seek(end)
+                        packstream.truncate()
+
+                    # Append the file and keep track of where the pack ends.
+                    entries.append({'name': name, 'id': name.split('_')[0], 'pack': current, 'offset': end, 'size': len(data)})
+                    packstream.write(data)
+                    end += len(data)
+
+            finally:
+                if packstream is not None:
+                    packstream.close()
+
+            # Add the batch to the index once its bytes are in the packs.
+            with open(self.indexfile, 'a') as indexstream:
+                indexstream.write(''.join('{0}\n'.format(dumps(entry)) for entry in entries))
+
+            for entry in entries:
+                self.remember(entry)
+
+        # Throw away the loose files now that they're indexed.
+        for entry in entries:
+            remove(path.join(self.folder, entry['name']))
+
+    def read(self, key):
+        """
+        Return the contents of a file in the packs, or None if it isn't in them.
+        :param key: The file name or the attachment ID of the file.
+        """
+
+        # Look the file up by its name, or by its attachment ID.
+        entry = self.entries.get(self.ids.get(key, key))
+
+        # Return nothing if the file isn't in the packs.
+        if entry is None:
+            return None
+
+        # Read the file's bytes straight out of its pack.
+        with open(self.packname(entry['pack']), 'rb') as packstream:
+            packstream.seek(entry['offset'])
+            return packstream.read(entry['size'])
+
+    def extract(self):
+        """
+        Write every file in the packs back out to the channel folder, then throw the packs away.
+        :return: The number of files that were extracted.
+        """
+
+        # Write out each file, skipping the ones that are already there.
+        for name in self.entries:
+            filename = path.join(self.folder, name)
+
+            if not path.isfile(filename):
+                with open(filename, 'wb') as filestream:
+                    filestream.write(self.read(name))
+
+        # Throw away the index and the packs now that every file is out.
+        for number in range(1, self.current + 1):
+            if path.isfile(self.packname(number)):
+                remove(self.packname(number))
+
+        if path.isfile(self.indexfile):
+            remove(self.indexfile)
+
+        if path.isdir(self.packfolder):
+            rmdir(self.packfolder)
+
+        # Forget about the packs.
+        count = len(self.entries)
+        self.entries, self.ids, self.current, self.end = {}, {}, 0, 0
+
+        # Return the number of files.
+        return count
+
+class PackArchive(object):
+    """
+    Keep a PackStore for every channel folder that has small files, and move the downloads that are small enough into them.
+    """
+
+    def __init__(self, threshold=None, packsize=None):
+        """
+        The class constructor.
+        :param threshold: The largest size in bytes of a file that goes into a pack, bigger files stay as files of their own, defaults to 1 MiB.
+        :param packsize: The largest size in bytes of a pack, defaults to 256 MiB.
+        """
+
+        # Determine if the threshold argument is not set.
+        if threshold is None:
+
+            # Set it to the default value of 1 MiB.
+            threshold = 1048576
+
+        # Create some class variables to store the archive settings.
+        self.threshold = threshold
+        self.packsize = packsize
+
+        # Create a dictionary to store the store for each channel folder.
+        self.stores = {}
+        self.lock = Lock()
+
+    def store(self, folder):
+        """
+        Return the PackStore for a channel folder, its index is read the first time it's needed.
+        :param folder: The channel folder.
+        """
+
+        with self.lock:
+            if folder not in self.stores:
+                self.stores[folder] = PackStore(folder, self.packsize)
+
+            return self.stores[folder]
+
+    def __contains__(self, filename):
+        """
+        Return whether or not a file is in the packs of its folder.
+        :param filename: The full file path to the file.
+        """
+
+        return path.basename(filename) in self.store(path.dirname(filename))
+
+    def pack(self, filename):
+        """
+        Move a downloaded file into the packs of its folder if it's small enough.
+        :param filename: The full file path to the file.
+        :return: True if the file was moved into a pack.
+        """
+
+        # Leave missing files and big files alone.
+        if not path.isfile(filename) or path.getsize(filename) > self.threshold:
+            return False
+
+        # Move the file into the packs.
+        self.store(path.dirname(filename)).addFile(filename)
+        return True
+
+def migrate(folder, threshold=None, packsize=None):
+    """
+    Move the small files that are already in the channel folders under a folder into packs.
+    :param folder: The folder to search for channel folders, e.g. the scrapes folder.
+    :param threshold: The largest size in bytes of a file that goes into a pack.
+    :param packsize: The largest size in bytes of a pack.
+    :return: The number of files that were moved into packs.
+    """
+
+    # Create an archive for the channel folders.
+    archive = PackArchive(threshold, packsize)
+
+    # Create a variable to store the number of files that were moved.
+    count = 0
+
+    # Iterate through every folder, leaving the pack folders themselves alone.
+    for folder, folders, files in walk(folder):
+        if path.basename(folder) == PACKFOLDER:
+            continue
+
+        # Move the small files in the folder into its packs, unfinished downloads are left to carry on.
+        for name in sorted(files):
+            if not name.endswith('.part') and archive.pack(path.join(folder, name)):
+                count += 1
+
+    # Return the number of files.
+    return count
+
+def extract(folder):
+    """
+    Write the files in every pack under a folder back out to their channel folders, and throw the packs away.
+    :param folder: The folder to search for packs, e.g. the scrapes folder.
+    :return: The number of files that were extracted.
+    """
+
+    # Create a variable to store the number of files that were extracted.
+    count = 0
+
+    # Iterate through every pack folder.
+    for folder, folders, files in walk(folder):
+        if path.basename(folder) == PACKFOLDER and 'index.jsonl' in files:
+            count += PackStore(path.dirname(folder)).extract()
+
+    # Return the number of files.
+    return count
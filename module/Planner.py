@@ -0,0 +1,175 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+datetime.timedelta: Used to print the expected durations as hours, minutes, and seconds.
+"""
+from datetime import timedelta
+
+"""
+The number of message groups on each search page.
+"""
+PAGESIZE = 25
+
+def searchRequests(days, total):
+    """
+    Return the number of search requests that it takes to scrape a window of days one day at a time, assuming that the results are spread evenly over the days.
+    Every day takes at least one request even when it's empty, and one more for every full page of results on a busy day.
+    :param days: The number of days in the window.
+    :param total: The number of results that the search found over the whole window.
+    """
+
+    # Work out the number of results on an average day, rounding the pages up.
+    pages = -(-total // (PAGESIZE * days)) if days > 0 else 0
+
+    # Every day takes at least one request.
+    return days * max(1, pages)
+
+def formatBytes(size):
+    """
+    Return a number of bytes as a short string that is easy to read, e.g. "1.5 GiB".
+    :param size: The number of bytes.
+    """
+
+    # Move up a unit for every 1024 of the one below it.
+    for unit in ['B', 'KiB', 'MiB', 'GiB', 'TiB']:
+        if size < 1024 or unit == 'TiB':
+            break
+
+        size /= 1024.0
+
+    # Return the number with its unit.
+    return '{0:.1f} {1}'.format(size, unit) if unit != 'B' else '{0} B'.format(int(size))
+
+class ChannelPlan(object):
+    """
+    The estimate of what scraping a channel will take, built up from the search totals over coarse windows and a sample of the files on their first pages.
+    """
+
+    def __init__(self, name):
+        """
+        The class constructor.
+        :param name: The name of the channel that is printed with the estimate.
+        """
+
+        # Create some class variables to store the totals over every window.
+        self.name = name
+        self.days = 0       # The number of days that the scraper will walk through.
+        self.requests = 0   # The number of search requests that it takes to walk through them.
+        self.messages = 0   # The number of messages that the searches found (a message that more than one query finds is counted for each of them).
+
+        # Create some class variables to store the sample of messages and their files.
+        self.sampled = set()    # The IDs of the messages in the sample.
+        self.sizes = []         # The size of each file in the sample, None until we know it.
+        self.unknown = []       # The URLs of the files in the sample that didn't come with a size, with their index in the sizes list.
+        self.asked = []         # The sizes that we asked for, the rest of the files without a size are taken to be as big as these on average.
+
+        # Create a class variable to store how long each request took (including the pause between requests), this is what the durations are worked out from.
+        self.timings = []
+
+    def addWindow(self, days, totals):
+        """
+        Add a window of days to the estimate.
+        :param days: The number of days in the window.
+        :param totals: The number of results that each search query found over the window.
+        """
+
+        self.days += days
+        self.requests += sum(searchRequests(days, total) for total in totals)
+        self.messages += sum(totals)
+
+    def addSample(self, ids, files):
+        """
+        Add a page of messages and the files that we'd download from them to the sample.
+        :param ids: The IDs of the messages on the page that aren't in the sample yet.
+        :param files: The (url, size) tuples of the files that we'd download from those messages.
+        """
+
+        self.sampled.update(ids)
+
+        # Keep the sizes, and remember the files that we have to ask the size of.
+        for url, size in files:
+            if size is None:
+                self.unknown.append((len(self.sizes), url))
+
+            self.sizes.append(size)
+
+    def setSize(self, index, size):
+        """
+        Fill in the size of a file in the sample.
+        :param index: The index of the file in the sizes list.
+        :param size: The number of bytes the file has.
+        """
+
+        self.sizes[index] = size
+
+        # Remember the size for the files that we didn't ask about.
+        if size is not None:
+            self.asked.append(size)
+
+    def estimate(self):
+        """
+        Return the estimated number of files and bytes to download, scaled up from the sample to every message that the searches found.
+        """
+
+        # Return nothing to download if there's nothing in the sample.
+        if len(self.sampled) == 0:
+            return 0, 0
+
+        # Work out the average size of the files that didn't come with a size from the ones we asked about (or from every file if we didn't ask about any).
+        known = [size for size in self.sizes if size is not None]
+        asked = self.asked if len(self.asked) > 0 else known
+        average = float(sum(asked)) / len(asked) if len(asked) > 0 else 0.0
+
+        # Work out the number of files and bytes for each message in the sample.
+        files = float(len(self.sizes)) / len(self.sampled)
+        size = (sum(known) + average * (len(self.sizes) - len(known))) / len(self.sampled)
+
+        # Scale them up to every message.
+        return int(files * self.messages), int(size * self.messages)
+
+    def duration(self, buffer=0, asynchronous=False, rate=0):
+        """
+        Return the estimated number of seconds that scraping the channel takes with a single authorization token.
+        :param buffer: The buffer size in bytes that the files are downloaded in, every chunk is a request of its own for the one-by-one downloads.
+        :param asynchronous: Whether or not the files are downloaded with the asyncio transport, which doesn't pause between requests.
+        :param rate: The download bandwidth limit in bytes per second, there's no limit if this is zero.
+        """
+
+        # Work out how long a request takes (including the pause between requests), we assume one second if we never timed one.
+        perrequest = sum(self.timings) / len(self.timings) if len(self.timings) > 0 else 1.0
+
+        # The searches are sent one after another.
+        seconds = self.requests * perrequest
+
+        # Grab the files and bytes to download.
+        files, size = self.estimate()
+
+        # The one-by-one downloads send a request for the file and one more for every chunk of it.
+        if not asynchronous and files > 0:
+            chunks = int(size / files / buffer) if buffer > 0 else 0
+            seconds += files * (1 + chunks) * perrequest
+
+        # The downloads can't go faster than the bandwidth limit.
+        if rate:
+            seconds += float(size) / rate
+
+        # Return the number of seconds.
+        return seconds
+
+    def describe(self, buffer=0, asynchronous=False, rate=0):
+        """
+        Return a line describing the estimate for the channel.
+        :param buffer: The buffer size in bytes that the files are downloaded in.
+        :param asynchronous: Whether or not the files are downloaded with the asyncio transport.
+        :param rate: The download bandwidth limit in bytes per second.
+        """
+
+        # Grab the files and bytes to download.
+        files, size = self.estimate()
+
+        # Build the line.
+        return '{0}: {1} days, {2} search requests, {3} messages, {4} files ({5}), about {6}'.format(self.name, self.days, self.requests, self.messages, files, formatBytes(size), timedelta(seconds=int(self.duration(buffer, asynchronous, rate))))
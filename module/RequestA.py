@@ -13,9 +13,10 @@ from urllib2 import HTTPError, Request, urlopen
 
 """
 os.makedirs: Used to create a folder with subfolders.
+os.rename:   Used to move a finished download into place.
 os.path:     Used to combine and split file paths.
 """
-from os import makedirs, path
+from os import makedirs, rename, path
 
 """
 sys.stderr: Used to write to the standard error filestream.
@@ -24,8 +25,20 @@ from sys import stderr
 
 """
 time.sleep: Used to pause the script for a set time.
+time.time:  Used to time how long the server takes to respond.
 """
-from time import sleep
+from time import sleep, time
+
+"""
+module.Compression.acceptEncoding: Used to negotiate the response compression that we're able to decompress.
+module.Compression.decodeResponse: Used to decompress the response body as it's read.
+"""
+from .Compression import acceptEncoding, decodeResponse
+
+"""
+module.Tracer.TracedResponse: Used to time and count the response body as it's read when tracing.
+"""
+from .Tracer import TracedResponse
 
 def warn(message):
     """
@@ -48,6 +61,25 @@ class DiscordRequest(object):
 
         # Create a blank dictionary to serve as our request header class variable.
         self.headers = {}
+
+        # Create some class variables to store how the last request went, the retry engine uses these to decide what to do next.
+        self.status = None      # The HTTP status code of the last response.
+        self.retryAfter = None  # The number of seconds the server asked us to wait before trying again.
+        self.rateRemaining = None   # The number of requests left in the rate limit bucket, as of the last response.
+        self.rateResetAfter = None  # The number of seconds until the rate limit bucket refills, as of the last response.
+        self.latency = None     # The number of seconds the last request took to get its first byte back, the concurrency limiter watches this.
+
+        # The number of seconds to wait on the server before giving up on a request.
+        self.timeout = 30
+
+        # Create some class variables to store the request tracer, the number of seconds the next request waited before it was sent, and the trace of the last request.
+        self.tracer = None
+        self.queued = None
+        self.trace = None
+
+        # Create some class variables to store the bandwidth throttle and the disk space governor for downloads, there are no limits if these are empty.
+        self.throttle = None
+        self.governor = None
     
     def setHeaders(self, headers):
         """
@@ -58,31 +90,87 @@ class DiscordRequest(object):
         # Create and set the class variable to store our headers.
         self.headers = headers
     
-    def sendRequest(self, url):
+    def sendRequest(self, url, method=None):
         """
         Send a request to the target URL and return the response data.
         :param url: The URL to the target that we're wanting to grab data from.
+        :param method: The HTTP method to use, defaults to GET.
         """
 
+        # Determine if the method argument is not set.
+        if method is None:
+
+            # Set it to the default value of GET.
+            method = 'GET'
+
+        # Start tracing the request if we've been asked to, urllib2 does the handshakes out of our sight so they're timed along with the first byte.
+        trace = self.trace = self.tracer.start(method, url, self.queued) if self.tracer is not None else None
+        self.queued = None
+
         # Sleep for about half a second to avoid ratelimit.
+        started = time()
         sleep(1)
 
+        if trace is not None:
+            trace.phase('pause', started)
+
         # Catch HTTPError
         try:
 
+            # Copy the headers so the compression negotiation below doesn't leak into the caller's headers.
+            headers = dict(self.headers)
+
+            # Ask the API for a compressed response, file downloads are left alone since their ranges and lengths refer to the raw bytes.
+            if 'Range' not in headers and url.split('/')[2] in ['discord.com', 'discordapp.com']:
+                headers['Accept-Encoding'] = acceptEncoding()
+
             # Create a request to connect to the URL.
-            connection = Request(url, headers=self.headers)
+            connection = Request(url, headers=headers)
+
+            # Use the HTTP method that we were asked to, urllib2 only knows GET and POST on its own.
+            connection.get_method = lambda: method
+
+            # Clear out the results of the previous request.
+            self.status = None
+            self.retryAfter = None
+            self.rateRemaining = None
+            self.rateResetAfter = None
+            self.latency = None
 
-            # Grab the response data from the URL.
-            response = urlopen(connection)
+            # Grab the response data from the URL, timing how long it takes to get the response back.
+            started = time()
+            response = urlopen(connection, timeout=self.timeout)
+            self.latency = time() - started
 
-            # Return the response if the connection was successful.
+            if trace is not None:
+                trace.phase('firstByte', started)
+
+            # Remember how the request went for the retry engine.
+            self.status = response.getcode()
+            self.rateRemaining = response.info().getheader('X-RateLimit-Remaining')
+            self.rateResetAfter = response.info().getheader('X-RateLimit-Reset-After')
+
+            # Decompress the response body as it's read.
+            response = decodeResponse(response, response.info().getheader('Content-Encoding'))
+
+            # Return the response if the connection was successful, a traced response finishes its trace once the body has been read (a HEAD request has no body to read).
             if 199 < response.getcode() < 300:
+                if trace is not None and method == 'HEAD':
+                    trace.finish(response.getcode())
+
+                elif trace is not None:
+                    trace.entry['status'] = response.getcode()
+                    response = TracedResponse(response, trace)
+
                 return response
             
             # Recursively run this function if we hit a redirect page.
             elif 299 < response.getcode() < 400:
 
+                # Write the trace of the redirect.
+                if trace is not None:
+                    trace.finish(response.getcode())
+
                 # Grab the URL that we're redirecting to.
                 url = response.info().getheader('Location')
 
@@ -91,7 +179,7 @@ class DiscordRequest(object):
 
                 # If the domain is a part of Discord then re-run this function.
                 if domain in ['discordapp.com', 'discord.com']:
-                    self.sendRequest(url)
+                    return self.sendRequest(url, method)
                 
                 # Throw a warning message to acknowledge an untrusted redirect.
                 warn('Ignored unsafe redirect to {0}.'.format(url))
@@ -101,21 +189,58 @@ class DiscordRequest(object):
 
         except HTTPError as e:
 
-            # TODO: Remove this when releasing
-            print(self.headers)
+            # Remember how the request went for the retry engine.
+            self.status = e.code
+            self.latency = time() - started
+            self.retryAfter = e.info().getheader('Retry-After')
+            self.rateRemaining = e.info().getheader('X-RateLimit-Remaining')
+            self.rateResetAfter = e.info().getheader('X-RateLimit-Reset-After')
+
+            # Write the trace of the failed request.
+            if trace is not None:
+                trace.phase('firstByte', started)
+                trace.finish(e.code)
 
             # Otherwise throw a warning message to acknowledge a failed connection.
             warn('HTTP: {0} from {1}.'.format(e.code, url))
 
             # Return nothing to signify a failed request.
             return None
+
+        except Exception as ex:
+
+            # Write the trace of the failed request.
+            if trace is not None:
+                trace.finish(error=ex)
+
+            raise
     
+    def fileSize(self, url):
+        """
+        Return the size in bytes of a file from a HEAD request without downloading it, or None if the server didn't tell us.
+        :param url: The URL for the file that we're wanting the size of.
+        """
+
+        # Request only the headers of the file.
+        response = self.sendRequest(url, 'HEAD')
+
+        # Return nothing if the request failed.
+        if response is None:
+            return None
+
+        # Grab the file size in bytes.
+        size = response.info().getheader('Content-Length')
+
+        # Return the file size if the server sent one.
+        return int(size) if size is not None else None
+
     def downloadFile(self, url, filename, buffer=0):
         """
         Download the file to the correct location on our storage device.
         :param url: The URL for the file that we're wanting to download.
         :param filename: The full file path to where we are wanting to store the downloaded file.
         :param buffer: The buffer size in bytes that we want to use to download our file in chunks.
+        :return: True if the file is on disk once this function finishes, False if the download failed.
         """
 
         # Grab the folder path from the full file name.
@@ -127,29 +252,102 @@ class DiscordRequest(object):
         
         # Determine if the file already exists, if so then skip this function.
         if path.isfile(filename):
-            return None
+            return True
+
+        # Download into a .part file so a download that is cut off (even by a forced exit) can carry on where it left off.
+        partname = '{0}.part'.format(filename)
 
         # Request the response data from the URL.
         response = self.sendRequest(url)
 
         # Determine if the request data is not empty, if so then skip this function.
         if response is None:
+            return False
+
+        # Keep the trace open until the body is on the disk rather than only read.
+        trace = self.trace
+
+        if trace is not None:
+            trace.auto = False
+
+        try:
+            return self.writeFile(url, filename, partname, response, buffer)
+
+        finally:
+            # Write the trace of the request.
+            if trace is not None:
+                trace.finish()
+
+    def writeBody(self, url, response, filestream, buffer, trace=None):
+        """
+        Write the body of a response to a file, a step at a time with the bandwidth reserved before each read if the downloads are throttled.
+        :param url: The URL for the file that we're downloading.
+        :param response: The response whose body we want to write.
+        :param filestream: The file object to write the body to.
+        :param buffer: The buffer size in bytes that we want to use to download our file in chunks.
+        :param trace: The trace of the request, the time spent writing is added to it.
+        """
+
+        # Read the whole body at once if there's no throttle.
+        if self.throttle is None:
+            data = response.read()
+            started = time()
+            filestream.write(data)
+
+            if trace is not None:
+                trace.phase('write', started)
+
             return None
+
+        # Grab the number of bytes that we can read at a time without running ahead of the throttle.
+        size = self.throttle.step(buffer)
+
+        while True:
+
+            # Wait for the bandwidth before reading, then give back whatever the read didn't use.
+            sleep(self.throttle.delay(url, size))
+            data = response.read(size)
+            self.throttle.delay(url, len(data) - size)
+
+            # Stop once the body has been read in full.
+            if len(data) == 0:
+                break
+
+            started = time()
+            filestream.write(data)
+
+            if trace is not None:
+                trace.phase('write', started)
+
+    def writeFile(self, url, filename, partname, response, buffer):
+        """
+        Write the body of a file download to the disk, in chunks if the server lets us.
+        :param url: The URL for the file that we're downloading.
+        :param filename: The full file path to where we are wanting to store the downloaded file.
+        :param partname: The full file path to the .part file that the download goes into until it's finished.
+        :param response: The response to the request for the file.
+        :param buffer: The buffer size in bytes that we want to use to download our file in chunks.
+        :return: True if the file is on disk once this function finishes, False if the download failed.
+        """
         
         # Get the file size in bytes.
-        filesize = int(response.info().getheader('Content-Length'))
+        filesize = int(response.info().getheader('Content-Length') or 0)
         
+        # Hold the download back if the file would leave too little free disk space (this raises a DiskSpaceError).
+        if self.governor is not None:
+            self.governor.check(filename, filesize)
+
         # Create a variable to store the amount of bytes that we've already downloaded thus far.
         downloaded = 0
 
         # Determine how many chunks we can feasibly push with our filesize.
-        numchunks = int(filesize / buffer)
+        numchunks = int(filesize / buffer) if buffer > 0 else 0
 
         # Determine how much of the last chunk is needed to finish the download.
-        lastchunk = filesize % buffer
+        lastchunk = filesize % buffer if buffer > 0 else 0
 
-        # Open the new file for appending bytes to.
-        with open(filename, 'a+b') as filestream:
+        # Open the .part file for appending bytes to.
+        with open(partname, 'a+b') as filestream:
 
             # Determine if we can grab the file byte-by-byte or if our buffer is 0 or larger than our file size.
             if response.info().getheader('Accept-Ranges') != 'bytes' or buffer <= 0 or numchunks < 1:
@@ -157,35 +355,43 @@ class DiscordRequest(object):
                 # Print something out for the user to read.
                 print('Downloading...\r')
 
-                # Just simply write the full contents of the file instead of streaming it in chunks.
-                filestream.write(response.read())
+                # Start the .part file over and write the full contents of the file instead of streaming it in chunks.
+                filestream.truncate(0)
+                self.writeBody(url, response, filestream, buffer, self.trace)
 
-                # Close the file stream.
-                filestream.close()
+                # There's nothing left to request.
+                ranges = []
+
+            else:
+                # Carry on from the last whole chunk in the .part file, anything after it might be a chunk that was cut off.
+                chunks = min(int(path.getsize(partname) / buffer), numchunks)
+                filestream.truncate(buffer * chunks)
+                downloaded = buffer * chunks
+
+                # Create a list of the byte ranges that are still missing, the last one is left open-ended.
+                ranges = ['bytes={0}-{1}'.format(buffer * i, buffer * (i + 1) - 1) for i in range(chunks, numchunks)]
+
+                if lastchunk > 0:
+                    ranges.append('bytes={0}-'.format(buffer * numchunks))
 
-                # Continue the script.
-                return None
-            
             # Iterate through each chunk of the file until we hit the filesize limit.
-            for i in range(numchunks):
+            for byterange in ranges:
 
                 # Generate another request class.
                 request = DiscordRequest()
 
-                # Grab the current request headers.
-                headers = self.headers
-
-                # Create a variable to store the byte position for the end of the chunk.
-                chunk = downloaded + buffer - 1
+                # Copy the current request headers so the range never leaks into anyone else's requests.
+                headers = dict(self.headers)
 
                 # Update the headers to include the chunk depending on how close we are to finishing the download.
-                headers.update({'Range': 'bytes={0}-{1}'.format(downloaded, chunk)})
+                headers.update({'Range': byterange})
 
                 # Set the percentage to the current downloaded percent.
                 percentage = 100 * downloaded / float(filesize)
                 
-                # Set the headers for the new Request object.
+                # Set the headers and the tracer for the new Request object.
                 request.setHeaders(headers)
+                request.tracer = self.tracer
 
                 # Grab the data response from the new Request object.
                 response = request.sendRequest(url)
@@ -193,58 +399,35 @@ class DiscordRequest(object):
                 # If the response is empty then break free from this loop.
                 if response is None:
 
-                    # Close the file
-                    filestream.close()
+                    # Pass on how the chunk request went to the retry engine.
+                    self.status = request.status
+                    self.retryAfter = request.retryAfter
 
                     # Break free
-                    return None
+                    break
 
                 # Print something out to the user.
                 print('Downloading {0:3.2f}%...\r'.format(percentage))
                 
-                # Write the contents of the chunk to the file.
-                filestream.write(response.read())
+                # Write the contents of the chunk to the file, keeping the chunk's trace open until it's written.
+                if request.trace is not None:
+                    request.trace.auto = False
 
-                # Update the downloaded variable to reflect the current filesize.
-                downloaded += buffer
-            
-            if lastchunk > 0:
-
-                # Generate another request class.
-                request = DiscordRequest()
-
-                # Grab the current request headers.
-                headers = self.headers
+                self.writeBody(url, response, filestream, buffer, request.trace)
 
-                # Update the headers.
-                headers.update({'Range': 'bytes={0}-'.format(downloaded)})
-
-                # Set the percentage to 100% at this point.
-                percentage = 100.0
-
-                # Set the headers for the new Request object.
-                request.setHeaders(headers)
-
-                # Grab the data response from the new Request object.
-                response = request.sendRequest(url)
+                if request.trace is not None:
+                    request.trace.finish()
 
-                # If the response is empty then break free from this loop.
-                if response is None:
-
-                    # Close the file
-                    filestream.close()
+                # Update the downloaded variable to reflect the current filesize.
+                downloaded += buffer
 
-                    # Break free
-                    return None
+            # Move the finished file into place if every chunk made it to the file.
+            else:
+                filestream.close()
+                rename(partname, filename)
+                return True
 
-                # Print something out to the user.
-                print('Downloading {0:3.2f}%...\r'.format(percentage))
-                
-                # Write the contents of the chunk to the file.
-                filestream.write(response.read())
-            
-            # Close the file stream.
-            filestream.close()
+        # Keep the .part file so the next attempt carries on from the last whole chunk.
 
-            # Clear the headers of the range header
-            del self.headers['Range']
+        # Return false to signify a failed download.
+        return False
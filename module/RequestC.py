@@ -0,0 +1,825 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+asyncio: Used to run hundreds of requests concurrently on a single thread.
+"""
+import asyncio
+
+"""
+ssl.create_default_context: Used to create the TLS settings that every pooled connection will share.
+"""
+from ssl import create_default_context
+
+"""
+os.makedirs: Used to create a folder with subfolders.
+os.remove:   Used to throw away a .part file that can't be resumed.
+os.rename:   Used to move a finished download into place.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, remove, rename, path
+
+"""
+socket.timeout: Used to report a connection or a read that took too long the same way as the blocking transport, so the retry engine counts it as a timeout.
+"""
+from socket import timeout as SocketTimeout
+
+"""
+sys.stderr: Used to write to the standard error filestream.
+"""
+from sys import stderr
+
+"""
+threading.Thread: Used to keep the event loop of a Downloader running next to the scraping threads.
+"""
+from threading import Thread
+
+"""
+time.time: Used to time how long the server takes to respond.
+"""
+from time import time
+
+"""
+module.Concurrency.AIMDLimiter: Used to cap the number of downloads in flight when we aren't given a limiter.
+"""
+from .Concurrency import AIMDLimiter
+
+"""
+module.RetryEngine.RetryEngine: Used to sort failed downloads into error classes for the concurrency limiter.
+"""
+from .RetryEngine import RetryEngine
+
+def warn(message):
+    """
+    Throw a warning message without halting the script.
+    :param message: A string that will be printed out to STDERR.
+    """
+
+    # Append our message with a newline character.
+    stderr.write('[WARN] {0}\n'.format(message))
+
+async def within(awaitable, timeout):
+    """
+    Wait for a connection, a write, or a read to finish, a stalled one would otherwise hold up every download that is gathered with it.
+    :param awaitable: The coroutine that we're waiting on.
+    :param timeout: The number of seconds to wait before giving up.
+    """
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+
+    except asyncio.TimeoutError:
+        raise SocketTimeout('timed out after {0} seconds'.format(timeout))
+
+class ConnectionPool(object):
+    """
+    Keep idle keep-alive connections around per host so that later requests skip the TCP and TLS handshakes.
+    """
+
+    def __init__(self, maxidle=None, timeout=None):
+        """
+        The class constructor.
+        :param maxidle: The maximum number of idle connections that we keep around for each host.
+        :param timeout: The number of seconds that connecting, or any single write or read, can take before it's given up on.
+        """
+
+        # Determine if the maxidle argument is not set.
+        if maxidle is None:
+
+            # Set it to the default value of 32.
+            maxidle = 32
+
+        # Determine if the timeout argument is not set.
+        if timeout is None:
+
+            # Set it to the default value of 30 seconds, the same as the blocking transport.
+            timeout = 30
+
+        # Create some class variables to store the pool settings.
+        self.maxidle = maxidle
+        self.timeout = timeout
+        self.context = create_default_context()
+
+        # Create a blank dictionary to store the idle connections for each host.
+        self.idle = {}
+
+    async def acquire(self, host):
+        """
+        Return an idle connection to the host or open a new one.
+        :param host: The host name that we're wanting to connect to.
+        :return: The stream reader and writer for the connection, and whether or not it was reused.
+        """
+
+        # Grab the idle connections for the host.
+        connections = self.idle.get(host, [])
+
+        # Reuse the most recently released connection that the server hasn't closed on us.
+        while len(connections) > 0:
+            reader, writer = connections.pop()
+
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+
+            writer.close()
+
+        # Open a new TLS connection to the host.
+        reader, writer = await within(asyncio.open_connection(host, 443, ssl=self.context), self.timeout)
+        return reader, writer, False
+
+    def release(self, host, reader, writer):
+        """
+        Return a connection to the pool once its response has been read in full.
+        :param host: The host name that the connection belongs to.
+        :param reader: The stream reader for the connection.
+        :param writer: The stream writer for the connection.
+        """
+
+        # Grab the idle connections for the host.
+        connections = self.idle.setdefault(host, [])
+
+        # Close the connection instead if the pool for this host is already full.
+        if len(connections) >= self.maxidle:
+            writer.close()
+            return None
+
+        # Keep the connection around for the next request.
+        connections.append((reader, writer))
+
+    def close(self):
+        """
+        Close every idle connection in the pool.
+        """
+
+        # Iterate through each host's idle connections.
+        for connections in self.idle.values():
+            for reader, writer in connections:
+                writer.close()
+
+        # Forget about the closed connections.
+        self.idle = {}
+
+class Response(object):
+    """
+    A small stand-in for http.client.HTTPResponse that reads its body from an asyncio stream.
+    """
+
+    def __init__(self, pool, host, reader, writer, method):
+        """
+        The class constructor.
+        :param pool: The connection pool that the connection should be returned to.
+        :param host: The host name that the connection belongs to.
+        :param reader: The stream reader for the connection.
+        :param writer: The stream writer for the connection.
+        :param method: The HTTP method of the request, HEAD responses never have a body.
+        """
+
+        # Create some class variables to store the connection.
+        self.pool = pool
+        self.host = host
+        self.reader = reader
+        self.writer = writer
+        self.method = method
+
+        # Create some class variables to store the response details.
+        self.status = 0
+        self.headers = []
+        self.remaining = None
+        self.chunked = False
+        self.keepalive = True
+        self.done = False
+
+    async def begin(self):
+        """
+        Read the status line and the headers of the response.
+        """
+
+        # Read the status line, e.g. "HTTP/1.1 200 OK".
+        statusline = (await within(self.reader.readline(), self.pool.timeout)).decode('iso-8859-1').rstrip('\r\n')
+
+        # Throw an error if the server closed the connection before responding.
+        if len(statusline) == 0:
+            raise ConnectionResetError('Connection closed by {0} before a response was sent.'.format(self.host))
+
+        # Grab the status code from the status line.
+        self.status = int(statusline.split(' ')[1])
+
+        # Read the headers up to the blank line.
+        while True:
+            line = (await within(self.reader.readline(), self.pool.timeout)).decode('iso-8859-1').rstrip('\r\n')
+
+            if len(line) == 0:
+                break
+
+            name, value = line.split(':', 1)
+            self.headers.append((name.strip(), value.strip()))
+
+        # Determine how the body is framed.
+        self.chunked = (self.getheader('Transfer-Encoding') or '').lower() == 'chunked'
+        length = self.getheader('Content-Length')
+        self.keepalive = (self.getheader('Connection') or '').lower() != 'close'
+
+        # Responses to HEAD requests and these status codes never carry a body.
+        if self.method == 'HEAD' or self.status in (204, 304) or 99 < self.status < 200:
+            self.remaining = 0
+
+        # Otherwise use the content length if we have one.
+        elif not self.chunked and length is not None:
+            self.remaining = int(length)
+
+        # Otherwise the body ends when the server closes the connection.
+        elif not self.chunked:
+            self.keepalive = False
+
+        # Release the connection straight away if there's nothing to read.
+        if self.remaining == 0:
+            self.finish()
+
+    def getheader(self, name, default=None):
+        """
+        Return the value of a response header.
+        :param name: The case-insensitive name of the header.
+        :param default: The value to return if the header wasn't sent.
+        """
+
+        # Iterate through the headers until we find a matching name.
+        for header, value in self.headers:
+            if header.lower() == name.lower():
+                return value
+
+        # Return the default value if there was no match.
+        return default
+
+    def getheaders(self):
+        """
+        Return a list of (name, value) tuples for every response header.
+        """
+
+        return list(self.headers)
+
+    async def read(self, amt=None):
+        """
+        Read up to amt bytes of the body, or all of it when amt is empty.
+        :param amt: The maximum number of bytes to read.
+        """
+
+        # Return nothing if the body has already been read in full.
+        if self.done:
+            return b''
+
+        # Read the chunked body all at once (we only stream bodies that have a content length).
+        if self.chunked:
+            data = bytearray()
+
+            while True:
+                size = int((await within(self.reader.readline(), self.pool.timeout)).split(b';')[0].strip(), 16)
+
+                if size == 0:
+                    # Skip the trailers up to the blank line.
+                    while (await within(self.reader.readline(), self.pool.timeout)) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+
+                data += await within(self.reader.readexactly(size), self.pool.timeout)
+                await within(self.reader.readline(), self.pool.timeout)
+
+            self.finish()
+            return bytes(data)
+
+        # Read until the server closes the connection if there's no content length.
+        if self.remaining is None:
+            data = await within(self.reader.read(-1 if amt is None else amt), self.pool.timeout)
+
+            if amt is None or len(data) == 0:
+                self.finish()
+
+            return data
+
+        # Read no more than what is left of the body.
+        amt = self.remaining if amt is None else min(amt, self.remaining)
+        data = await within(self.reader.readexactly(amt), self.pool.timeout)
+        self.remaining -= len(data)
+
+        # Release the connection once the body has been read in full.
+        if self.remaining == 0:
+            self.finish()
+
+        return data
+
+    def finish(self):
+        """
+        Mark the body as read and return the connection to the pool if it can be reused.
+        """
+
+        # Do nothing if we've already finished.
+        if self.done:
+            return None
+
+        self.done = True
+
+        # Return the connection to the pool if the server is keeping it alive.
+        if self.keepalive:
+            self.pool.release(self.host, self.reader, self.writer)
+
+        # Otherwise close it.
+        else:
+            self.writer.close()
+
+    def close(self):
+        """
+        Throw away the connection without reading the rest of the body.
+        """
+
+        # Closing the connection is the only way to skip an unread body.
+        if not self.done:
+            self.done = True
+            self.writer.close()
+
+class DiscordRequest(object):
+    """
+    The asyncio version of the DiscordRequest class, every request function here is a coroutine.
+    """
+
+    def __init__(self, pool=None):
+        """
+        The class constructor.
+        :param pool: The connection pool to share with other requests, a new one is created if this is empty.
+        """
+
+        # Create a blank dictionary to serve as our request header class variable.
+        self.headers = {}
+
+        # Create or share the connection pool.
+        self.pool = pool if pool is not None else ConnectionPool()
+
+        # Create some class variables to store how the last request went, the retry engine uses these to decide what to do next.
+        self.status = None      # The HTTP status code of the last response.
+        self.retryAfter = None  # The number of seconds the server asked us to wait before trying again.
+        self.rateRemaining = None   # The number of requests left in the rate limit bucket, as of the last response.
+        self.rateResetAfter = None  # The number of seconds until the rate limit bucket refills, as of the last response.
+        self.latency = None     # The number of seconds the last request took to get its first byte back, the concurrency limiter watches this.
+
+        # Create some class variables to store the bandwidth throttle and the disk space governor for downloads, there are no limits if these are empty.
+        self.throttle = None
+        self.governor = None
+
+        # Create some class variables to store the request tracer, the number of seconds the next request waited before it was sent, and the trace of the last request.
+        self.tracer = None
+        self.queued = None
+        self.trace = None
+
+    def setHeaders(self, headers):
+        """
+        Set the request headers for this request.
+        :param headers: The dictionary that stores our header names and values.
+        """
+
+        # Create and set the class variable to store our headers.
+        self.headers = headers
+
+    async def sendRequest(self, url, method=None):
+        """
+        Send a request to the target URL and return the response data.
+        :param url: The URL to the target that we're wanting to grab data from.
+        :param method: The HTTP method to use, defaults to GET.
+        """
+
+        # Determine if the method argument is not set.
+        if method is None:
+
+            # Set it to the default value of GET.
+            method = 'GET'
+
+        # Clear out the results of the previous request.
+        self.status = None
+        self.retryAfter = None
+        self.rateRemaining = None
+        self.rateResetAfter = None
+        self.latency = None
+
+        # Split the URL into parts.
+        urlparts = url.split('/')
+
+        # Grab the host name and the URL path from the urlparts.
+        host = urlparts[2]
+        urlpath = '/{0}'.format('/'.join(urlparts[3:]))
+
+        # Build the request head, we always want keep-alive so the connection can go back into the pool.
+        lines = ['{0} {1} HTTP/1.1'.format(method, urlpath), 'Host: {0}'.format(host), 'Connection: keep-alive']
+        lines.extend('{0}: {1}'.format(name, value) for name, value in self.headers.items())
+        head = '\r\n'.join(lines) + '\r\n\r\n'
+
+        # Start tracing the request if we've been asked to, the TLS handshake is part of opening the connection here so it's timed along with the TCP one.
+        trace = self.trace = self.tracer.start(method, url, self.queued) if self.tracer is not None else None
+        self.queued = None
+
+        # A pooled connection might have been closed by the server since we last used it, so give a fresh one a second chance.
+        for attempt in range(2):
+            started = time()
+
+            try:
+                reader, writer, reused = await self.pool.acquire(host)
+
+            except Exception as ex:
+                # Write the trace of the failed request.
+                if trace is not None:
+                    trace.finish(error=ex)
+
+                raise
+
+            if trace is not None:
+                trace.phase('connect', started)
+                trace.entry['reused'] = reused
+
+            try:
+                # Send the request head.
+                phase = time()
+                writer.write(head.encode('iso-8859-1'))
+                await within(writer.drain(), self.pool.timeout)
+
+                # Read the status line and the headers of the response.
+                response = Response(self.pool, host, reader, writer, method)
+                await response.begin()
+                break
+
+            except (ConnectionError, asyncio.IncompleteReadError) as ex:
+                writer.close()
+
+                if attempt == 1:
+                    # Write the trace of the failed request.
+                    if trace is not None:
+                        trace.finish(error=ex)
+
+                    raise
+
+            except Exception as ex:
+                # Throw away a connection that stalled, it's in no state to be reused.
+                writer.close()
+
+                # Write the trace of the failed request.
+                if trace is not None:
+                    trace.finish(error=ex)
+
+                raise
+
+        # Time the wait for the response headers.
+        if trace is not None:
+            trace.phase('firstByte', phase)
+
+        # Remember how the request went for the retry engine, and how long it took to get the response back.
+        self.status = response.status
+        self.latency = time() - started
+        self.retryAfter = response.getheader('Retry-After')
+        self.rateRemaining = response.getheader('X-RateLimit-Remaining')
+        self.rateResetAfter = response.getheader('X-RateLimit-Reset-After')
+
+        # Return the response if the connection was successful, the trace is finished by whoever reads the body.
+        if 199 < response.status < 300:
+            if trace is not None:
+                trace.entry['status'] = response.status
+
+            return response
+
+        # Throw away the body of any response that we're not going to return.
+        response.close()
+
+        # Write the trace of a response that we're not going to return.
+        if trace is not None:
+            trace.finish(response.status)
+
+        # Follow the redirect if we hit a redirect page.
+        if 299 < response.status < 400:
+
+            # Grab the URL that we're redirecting to.
+            url = response.getheader('Location')
+
+            # Grab the domain name for the redirected location.
+            domain = url.split('/')[2].split(':')[0]
+
+            # If the domain is a part of Discord then re-run this function.
+            if domain in ['discordapp.com', 'discord.com', 'cdn.discordapp.com', 'media.discordapp.net']:
+                return await self.sendRequest(url, method)
+
+            # Throw a warning message to acknowledge an untrusted redirect.
+            warn('Ignored unsafe redirect to {0}.'.format(url))
+
+        # Otherwise throw a warning message to acknowledge a failed connection.
+        else: warn('HTTP {0} from {1}.'.format(response.status, url))
+
+        # Return nothing to signify a failed request.
+        return None
+
+    async def downloadFile(self, url, filename, buffer=0):
+        """
+        Download the file to the correct location on our storage device, streaming the body over a single pooled connection.
+        :param url: The URL for the file that we're wanting to download.
+        :param filename: The full file path to where we are wanting to store the downloaded file.
+        :param buffer: The buffer size in bytes that we want to use to write our file in chunks.
+        :return: True if the file is on disk once this function finishes, False if the download failed.
+        """
+
+        # Grab the folder path from the full file name.
+        filepath = path.split(filename)[0]
+
+        # Determine if the file path exists, if not then create it.
+        if not path.exists(filepath):
+            makedirs(filepath)
+
+        # Determine if the file already exists, if so then skip this function.
+        if path.isfile(filename):
+            return True
+
+        # Download into a .part file so a download that is cut off (even by a forced exit) can carry on where it left off.
+        partname = '{0}.part'.format(filename)
+
+        # Grab how much of the file we already have.
+        downloaded = path.getsize(partname) if path.isfile(partname) else 0
+
+        # Only ask for the rest of the file if we already have some of it (a copy of the headers keeps the range out of the other downloads).
+        if downloaded > 0:
+            self.headers = dict(self.headers, Range='bytes={0}-'.format(downloaded))
+
+        # Request the response data from the URL.
+        response = await self.sendRequest(url)
+
+        # A .part file that the server can't carry on from is thrown away so the next attempt starts over.
+        if response is None and downloaded > 0 and self.status == 416:
+            remove(partname)
+
+        # Determine if the request data is not empty, if so then skip this function.
+        if response is None:
+            return False
+
+        # Grab the trace of the request, it's finished once the body is on the disk.
+        trace = self.trace
+
+        try:
+            # Hold the download back if the rest of the file would leave too little free disk space (this raises a DiskSpaceError).
+            if self.governor is not None:
+                self.governor.check(filename, int(response.getheader('Content-Length') or 0))
+
+            # Append to the .part file if the server sent the rest of the file, otherwise start it over.
+            with open(partname, 'ab' if response.status == 206 else 'wb') as filestream:
+
+                # Write the body in buffer-sized chunks so a large file never sits in memory all at once (smaller ones if the downloads are throttled).
+                size = self.throttle.step(buffer) if self.throttle is not None else buffer if buffer > 0 else None
+
+                while True:
+
+                    # Wait for the bandwidth before reading.
+                    if self.throttle is not None:
+                        await asyncio.sleep(self.throttle.delay(url, size))
+
+                    started = time()
+                    data = await response.read(size)
+
+                    # Give back whatever the read didn't use.
+                    if self.throttle is not None:
+                        self.throttle.delay(url, len(data) - size)
+
+                    if trace is not None:
+                        trace.phase('body', started)
+                        trace.received(len(data))
+
+                    if len(data) == 0:
+                        break
+
+                    started = time()
+                    filestream.write(data)
+
+                    if trace is not None:
+                        trace.phase('write', started)
+
+        except BaseException as ex:
+            # Keep the .part file so the next attempt carries on from where this one stopped.
+            response.close()
+
+            # Write the trace of the failed download.
+            if trace is not None:
+                trace.finish(error=ex)
+
+            raise
+
+        finally:
+            # Write the trace of the download.
+            if trace is not None:
+                trace.finish()
+
+        # Move the finished file into place.
+        rename(partname, filename)
+
+        # Return true to signify a finished download.
+        return True
+
+async def downloadConcurrently(headers, downloads, buffer=0, limit=None, retry=None, stopping=None, throttle=None, governor=None, limiter=None, pool=None):
+    """
+    Download many files at once over a shared connection pool.
+    :param headers: The dictionary that stores our header names and values.
+    :param downloads: A list of (url, filename) tuples for the files that we're wanting to download.
+    :param buffer: The buffer size in bytes that we want to use to write our files in chunks.
+    :param limit: The maximum number of downloads in flight at the same time.
+    :param retry: The RetryEngine that decides when failed downloads are tried again, failed downloads are only warned about if this is empty.
+    :param stopping: A function that returns true once we've been asked to stop, the downloads that haven't started by then are written to the dead letter file.
+    :param throttle: The Throttle that limits the download bandwidth, there's no limit if this is empty.
+    :param governor: The DiskGovernor that holds downloads back while the disk is nearly full, there's no check if this is empty.
+    :param limiter: The AIMDLimiter that decides how many downloads can be in flight, a fixed limit is used if this is empty.
+    :param pool: The ConnectionPool to download over, it's left open for the next batch, a pool of our own is created (and closed once we're done) if this is empty.
+    """
+
+    # Determine if the limit argument is not set.
+    if limit is None:
+
+        # Set it to the default value of 100.
+        limit = 100
+
+    # Determine if the limiter argument is not set.
+    if limiter is None:
+
+        # Use a limiter that stays at the limit.
+        limiter = AIMDLimiter('CDN', limit, limit, limit, False)
+
+    # Create the pool that every download will share if we weren't given one, it never needs more idle connections than the largest limit.
+    owned = pool is None
+
+    if owned:
+        pool = ConnectionPool(limiter.maximum)
+
+    # Create a condition to wake up the downloads waiting on a slot whenever one of ours is given back.
+    condition = asyncio.Condition()
+
+    async def acquire():
+
+        async with condition:
+
+            # Wait for a slot, checking every second as well since the limiter can be shared with downloads on other threads.
+            while not limiter.tryAcquire():
+                try:
+                    await asyncio.wait_for(condition.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(request, exception):
+
+        # Give the slot back, letting the limiter know how the download went.
+        limiter.release(request.latency, RetryEngine.classify(request.status, exception))
+
+        async with condition:
+            condition.notify_all()
+
+    async def download(url, filename):
+
+        # Create a variable to store the number of attempts made so far.
+        attempt = 0
+
+        while True:
+            attempt += 1
+            exception = None
+
+            # Create a request that shares the pool.
+            request = DiscordRequest(pool)
+
+            # Set the request headers, the limits, and the tracer.
+            request.setHeaders(headers)
+            request.throttle = throttle
+            request.governor = governor
+            request.tracer = retry.tracer if retry is not None else None
+
+            # Wait for a download slot.
+            started = time()
+            await acquire()
+            request.queued = time() - started
+
+            # Don't start the download if we've been asked to stop in the meantime.
+            if stopping is not None and stopping():
+                await release(request, None)
+
+                if retry is not None:
+                    retry.deadLetter(url, 'shutdown', 'Stopped before the download started.', {'filename': filename})
+
+                return None
+
+            try:
+                # Download the file directly.
+                done = await request.downloadFile(url, filename, buffer)
+
+            except Exception as ex:
+                done = False
+                exception = ex
+
+            # Give the download slot back.
+            await release(request, exception)
+
+            # Stop here if the download finished.
+            if done:
+                if retry is not None:
+                    retry.succeeded()
+
+                return None
+
+            # Only warn about the failure if there's no retry engine.
+            if retry is None:
+                warn('Failed to download {0}: {1}'.format(url, exception or 'HTTP {0}'.format(request.status)))
+                return None
+
+            # Sort the failure into its error class, and work out how long to wait before the next attempt.
+            kind = retry.classify(request.status, exception) or 'server'
+            wait = retry.delay(kind, attempt, request.retryAfter if kind == 'ratelimit' else None)
+
+            # Write the dead letter and give up if we're out of attempts.
+            if wait is None:
+                retry.deadLetter(url, kind, exception or 'HTTP {0}'.format(request.status), {'filename': filename})
+                return None
+
+            # Wait out the backoff delay without holding on to a download slot.
+            await asyncio.sleep(wait)
+
+    try:
+        # Run every download and wait for all of them to finish.
+        await asyncio.gather(*[download(url, filename) for url, filename in downloads])
+
+    finally:
+        # Close the connections that are left over if the pool is ours.
+        if owned:
+            pool.close()
+
+class Downloader(object):
+    """
+    Run downloadConcurrently for blocking code on one event loop and one connection pool that last the whole run.
+    Every batch handed to it shares the pooled connections and the concurrency limit with the batches from the other scraping threads, instead of starting a loop and a pool of its own.
+    """
+
+    def __init__(self, buffer=0, limit=None, retry=None, stopping=None, throttle=None, governor=None, limiter=None):
+        """
+        The class constructor.
+        :param buffer: The buffer size in bytes that we want to use to write our files in chunks.
+        :param limit: The maximum number of downloads in flight at the same time.
+        :param retry: The RetryEngine that decides when failed downloads are tried again.
+        :param stopping: A function that returns true once we've been asked to stop.
+        :param throttle: The Throttle that limits the download bandwidth.
+        :param governor: The DiskGovernor that holds downloads back while the disk is nearly full.
+        :param limiter: The AIMDLimiter that decides how many downloads can be in flight.
+        """
+
+        # Determine if the limit argument is not set.
+        if limit is None:
+
+            # Set it to the default value of 100.
+            limit = 100
+
+        # Determine if the limiter argument is not set.
+        if limiter is None:
+
+            # Use a limiter that stays at the limit.
+            limiter = AIMDLimiter('CDN', limit, limit, limit, False)
+
+        # Create some class variables to store the download settings.
+        self.buffer = buffer
+        self.retry = retry
+        self.stopping = stopping
+        self.throttle = throttle
+        self.governor = governor
+        self.limiter = limiter
+
+        # Create the pool that every batch will share, it never needs more idle connections than the largest limit.
+        self.pool = ConnectionPool(limiter.maximum)
+
+        # Start the event loop on a thread of its own, it runs until the downloader is closed.
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """
+        Run the event loop until the downloader is closed.
+        """
+
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def download(self, headers, downloads):
+        """
+        Download a batch of files, returning once every one of them has finished or failed for good.
+        :param headers: The dictionary that stores our header names and values.
+        :param downloads: A list of (url, filename) tuples for the files that we're wanting to download.
+        """
+
+        # Hand the batch to the event loop and wait for it.
+        asyncio.run_coroutine_threadsafe(downloadConcurrently(headers, downloads, self.buffer, None, self.retry, self.stopping, self.throttle, self.governor, self.limiter, self.pool), self.loop).result()
+
+    def close(self):
+        """
+        Close the pooled connections and stop the event loop, the batches that are still running are given up on.
+        """
+
+        # Skip this function if the downloader has already been closed.
+        if self.loop.is_closed():
+            return None
+
+        # Close the connections and stop the loop from its own thread.
+        self.loop.call_soon_threadsafe(self.pool.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,380 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+json.dumps: Used to convert a dead letter into a serialized string.
+json.loads: Used to convert a serialized dead letter back into a dictionary object.
+"""
+from json import dumps, loads
+
+"""
+os.makedirs: Used to create the folder that stores the dead letter file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, path
+
+"""
+sys.stderr: Used to write to the standard error filestream.
+"""
+from sys import stderr
+
+"""
+module.Throttle.DiskSpaceError: Used to detect downloads that were held back because the disk is nearly full.
+"""
+from .Throttle import DiskSpaceError
+
+"""
+threading.Lock: Used to keep the retry budget and the dead letter file consistent between threads.
+"""
+from threading import Lock
+
+"""
+time.sleep: Used to wait out the backoff delay between attempts.
+time.time:  Used to timestamp the dead letters.
+"""
+from time import sleep, time
+
+def warn(message):
+    """
+    Throw a warning message without halting the script.
+    :param message: A string that will be printed out to STDERR.
+    """
+
+    # Append our message with a newline character.
+    stderr.write('[WARN] {0}\n'.format(message))
+
+class RetryError(Exception):
+    """
+    Raised when a request has failed for good and has been written to the dead letter file.
+    """
+
+class RetryEngine(object):
+    """
+    Retry failed requests with exponential backoff and jitter, and keep a dead letter file of the requests that failed for good.
+    """
+
+    # The retry policy for each class of error: the number of attempts, the base delay, and the largest delay (in seconds).
+    policies = {
+        'ratelimit': {'attempts': 8, 'base': 1.0, 'cap': 120.0},  # HTTP 429, we wait at least as long as Retry-After tells us to.
+        'server':    {'attempts': 5, 'base': 2.0, 'cap': 60.0},   # HTTP 5xx.
+        'timeout':   {'attempts': 4, 'base': 2.0, 'cap': 30.0},   # The request took too long.
+        'reset':     {'attempts': 4, 'base': 1.0, 'cap': 30.0},   # The connection was refused, reset, or cut off part way through.
+        'client':    {'attempts': 1, 'base': 0.0, 'cap': 0.0},    # Any other HTTP 4xx, asking again won't change the answer.
+        'disk':      {'attempts': 1, 'base': 0.0, 'cap': 0.0},    # The disk is nearly full, the download is left for --refetch.
+    }
+
+    def __init__(self, deadletterfile, policies=None, budget=None, ratio=None):
+        """
+        The class constructor.
+        :param deadletterfile: The full file path to the JSON lines file that stores the requests that failed for good.
+        :param policies: A dictionary of error classes to policy overrides, see the policies class variable above.
+        :param budget: The largest number of retries that can be spent before the budget has to refill, defaults to 50.
+        :param ratio: The number of retries that each successful request adds back to the budget, defaults to 0.1.
+        """
+
+        # Determine if the budget argument is not set.
+        if budget is None:
+
+            # Set it to the default value of 50.
+            budget = 50
+
+        # Determine if the ratio argument is not set.
+        if ratio is None:
+
+            # Set it to the default value of 0.1 (one retry for every ten successful requests).
+            ratio = 0.1
+
+        # Copy the default policies so the overrides don't leak into other engines.
+        self.policies = dict((kind, dict(policy)) for kind, policy in RetryEngine.policies.items())
+
+        # Apply the policy overrides.
+        for kind, policy in (policies or {}).items():
+            self.policies.setdefault(kind, {}).update(policy)
+
+        # Create some class variables to store the engine settings.
+        self.deadletterfile = deadletterfile
+        self.budget = float(budget)
+        self.capacity = float(budget)
+        self.ratio = ratio
+        self.lock = Lock()
+
+        # Create some class variables to store the hooks that are called around every attempt, e.g. to keep track of each token's rate limits.
+        self.before = None  # Called with the request before every attempt.
+        self.after = None   # Called with the request and the URL after every attempt.
+
+        # Create a class variable to store the ConcurrencyLimits that every attempt takes a slot from, there's no limit if this is empty.
+        self.limits = None
+
+        # Create a class variable to store the Tracer that every attempt is written to, nothing is traced if this is empty.
+        self.tracer = None
+
+    @staticmethod
+    def classify(status=None, exception=None):
+        """
+        Return the error class for a failed request, or None if the request didn't fail.
+        :param status: The HTTP status code of the response, if there was one.
+        :param exception: The exception that was raised by the request, if there was one.
+        """
+
+        # Sort the exceptions first since there won't be a status code.
+        if exception is not None:
+
+            # A download that was held back because the disk is nearly full.
+            if isinstance(exception, DiskSpaceError):
+                return 'disk'
+
+            # Import the socket exceptions here rather than at the top so importing the engine doesn't pull in the socket module.
+            from socket import timeout as SocketTimeout, error as SocketError
+
+            # A timeout is a subclass of the socket error on Python 3, so check for it first.
+            if isinstance(exception, SocketTimeout):
+                return 'timeout'
+
+            # Import the HTTP client exceptions here rather than at the top so importing the engine doesn't pull in the HTTP client.
+            try:
+                from http.client import HTTPException
+            except ImportError:
+                from httplib import HTTPException
+
+            # Connection resets, refusals, and responses cut off part way through.
+            if isinstance(exception, (SocketError, HTTPException)):
+                return 'reset'
+
+            # Anything else is a bug rather than a network problem, so don't retry it.
+            return 'client'
+
+        # Sort the status codes.
+        if status == 429:
+            return 'ratelimit'
+
+        if status is not None and status > 499:
+            return 'server'
+
+        # Any other 4xx (and redirects that we refused to follow) won't change on another attempt.
+        if status is not None and status > 299:
+            return 'client'
+
+        # Nothing went wrong.
+        return None
+
+    def delay(self, kind, attempt, retryafter=None):
+        """
+        Return the number of seconds to wait before the next attempt, or None if we should give up.
+        :param kind: The error class of the failed attempt.
+        :param attempt: The number of attempts that have been made so far.
+        :param retryafter: The number of seconds the server asked us to wait, if it did.
+        """
+
+        # Grab the policy for the error class.
+        policy = self.policies[kind]
+
+        # Give up if we're out of attempts for this request.
+        if attempt >= policy['attempts']:
+            return None
+
+        with self.lock:
+
+            # Give up if we're out of retries for the whole run, this stops us from hammering Discord through a long outage.
+            if self.budget < 1:
+                return None
+
+            # Spend a retry from the budget.
+            self.budget -= 1
+
+        # Import the random number generator the first time a request has to be retried.
+        from random import uniform
+
+        # Use the "full jitter" backoff: a random delay between zero and the exponential delay.
+        wait = uniform(0, min(policy['cap'], policy['base'] * (2 ** attempt)))
+
+        # Never wait less than the server asked us to.
+        if retryafter is not None:
+            wait = max(wait, float(retryafter) + uniform(0, 1))
+
+        # Return the delay.
+        return wait
+
+    def succeeded(self):
+        """
+        Refill the retry budget a little for every successful request.
+        """
+
+        with self.lock:
+            self.budget = min(self.capacity, self.budget + self.ratio)
+
+    def send(self, request, url, context=None):
+        """
+        Send a request with retries, returning the response or raising a RetryError once it has failed for good.
+        :param request: The DiscordRequest object with its headers already set.
+        :param url: The URL to the target that we're wanting to grab data from.
+        :param context: A dictionary describing what the request was for, this is written alongside the dead letter (nothing is written if it's empty since --refetch couldn't replay it).
+        """
+
+        # Create a variable to store the number of attempts made so far.
+        attempt = 0
+
+        while True:
+            attempt += 1
+            exception = None
+            queued = time()
+
+            # Let the hook hold the request back if it has to.
+            if self.before is not None:
+                self.before(request)
+
+            # Wait for a slot if there are too many requests to the host in flight.
+            limiter = self.limits.pick(url) if self.limits is not None else None
+
+            if limiter is not None:
+                limiter.acquire()
+
+            # Hand the tracer and the time the attempt spent waiting to the request.
+            if self.tracer is not None:
+                request.tracer, request.queued = self.tracer, time() - queued
+
+            try:
+                # Send the request.
+                response = request.sendRequest(url)
+
+            except Exception as ex:
+                response = None
+                exception = ex
+
+            # Give the slot back, letting the limiter know how the request went.
+            if limiter is not None:
+                limiter.release(request.latency, RetryEngine.classify(request.status, exception) if response is None else None)
+
+            # Let the hook know how the request went.
+            if self.after is not None:
+                self.after(request, url)
+
+            # Return the response if it was successful.
+            if response is not None:
+                self.succeeded()
+                return response
+
+            # Sort the failure into its error class.
+            kind = RetryEngine.classify(request.status, exception) or 'server'
+
+            # Work out how long to wait before the next attempt.
+            wait = self.delay(kind, attempt, request.retryAfter if kind == 'ratelimit' else None)
+
+            # Give up if we're out of attempts, writing the dead letter if the request can be replayed.
+            if wait is None:
+                if context is not None:
+                    self.deadLetter(url, kind, exception or 'HTTP {0}'.format(request.status), context)
+
+                raise RetryError('Giving up on {0} after {1} attempt(s) ({2}).'.format(url, attempt, kind))
+
+            # Wait out the backoff delay.
+            warn('Retrying {0} in {1:.1f}s ({2}).'.format(url, wait, kind))
+            sleep(wait)
+
+    def download(self, request, url, filename, buffer=0, context=None):
+        """
+        Download a file with retries, raising a RetryError once it has failed for good.
+        :param request: The DiscordRequest object with its headers already set.
+        :param url: The URL for the file that we're wanting to download.
+        :param filename: The full file path to where we are wanting to store the downloaded file.
+        :param buffer: The buffer size in bytes that we want to use to download our file in chunks.
+        :param context: A dictionary describing what the request was for, this is written alongside the dead letter.
+        """
+
+        # Create a variable to store the number of attempts made so far.
+        attempt = 0
+
+        while True:
+            attempt += 1
+            exception = None
+            queued = time()
+
+            # Wait for a slot if there are too many downloads from the host in flight.
+            limiter = self.limits.pick(url) if self.limits is not None else None
+
+            if limiter is not None:
+                limiter.acquire()
+
+            # Hand the tracer and the time the attempt spent waiting to the request.
+            if self.tracer is not None:
+                request.tracer, request.queued = self.tracer, time() - queued
+
+            try:
+                # Download the file.
+                done = request.downloadFile(url, filename, buffer)
+
+            except Exception as ex:
+                done = False
+                exception = ex
+
+            # Give the slot back, letting the limiter know how the download went.
+            if limiter is not None:
+                limiter.release(request.latency, RetryEngine.classify(request.status, exception) if not done else None)
+
+            # Stop here if the download finished.
+            if done:
+                self.succeeded()
+                return None
+
+            # Sort the failure into its error class.
+            kind = RetryEngine.classify(request.status, exception) or 'server'
+
+            # Work out how long to wait before the next attempt.
+            wait = self.delay(kind, attempt, request.retryAfter if kind == 'ratelimit' else None)
+
+            # Write the dead letter and give up if we're out of attempts.
+            if wait is None:
+                self.deadLetter(url, kind, exception or 'HTTP {0}'.format(request.status), dict(context or {}, filename=filename))
+                raise RetryError('Giving up on {0} after {1} attempt(s) ({2}).'.format(url, attempt, kind))
+
+            # Wait out the backoff delay.
+            warn('Retrying {0} in {1:.1f}s ({2}).'.format(url, wait, kind))
+            sleep(wait)
+
+    def deadLetter(self, url, kind, reason, context=None):
+        """
+        Append a request that failed for good to the dead letter file so it can be fetched again later.
+        :param url: The URL of the request.
+        :param kind: The error class of the last attempt.
+        :param reason: The exception or the status message of the last attempt.
+        :param context: A dictionary describing what the request was for.
+        """
+
+        # Build the dead letter.
+        letter = {'time': time(), 'url': url, 'kind': kind, 'reason': str(reason), 'context': context or {}}
+
+        with self.lock:
+
+            # Grab the folder path from the full file name.
+            folder = path.split(self.deadletterfile)[0]
+
+            # Determine if the folder path exists, if not then create it.
+            if not path.exists(folder):
+                makedirs(folder)
+
+            # Append the dead letter to the file, one JSON object per line.
+            with open(self.deadletterfile, 'a') as deadletterstream:
+                deadletterstream.write('{0}\n'.format(dumps(letter)))
+
+    def takeDeadLetters(self):
+        """
+        Read and clear the dead letter file, anything that fails again is written back to it.
+        """
+
+        # Return nothing if there are no dead letters.
+        if not path.isfile(self.deadletterfile):
+            return []
+
+        with self.lock:
+
+            # Read every dead letter.
+            with open(self.deadletterfile, 'r') as deadletterstream:
+                letters = [loads(line) for line in deadletterstream if len(line.strip()) > 0]
+
+            # Clear the file.
+            open(self.deadletterfile, 'w').close()
+
+        # Return the dead letters.
+        return letters
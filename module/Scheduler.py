@@ -0,0 +1,195 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+datetime.datetime:  Used to convert between the date strings in the progress file and datetime objects.
+datetime.timedelta: Used to size the catch-up and backfill windows.
+"""
+from datetime import datetime, timedelta
+
+"""
+json.load: Used to read the progress file into a dictionary object.
+json.dump: Used to write the progress dictionary back to the progress file.
+"""
+from json import load, dump
+
+"""
+os.makedirs: Used to create the folder that stores the progress file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, path
+
+"""
+threading.Lock: Used to keep the progress file consistent when more than one token is scraping.
+"""
+from threading import Lock
+
+class Progress(object):
+    """
+    Remember the range of days that has been scraped for each channel, the range always runs without gaps from its oldest day to its newest day.
+    """
+
+    def __init__(self, filename):
+        """
+        The class constructor.
+        :param filename: The full file path to the JSON file that stores the progress.
+        """
+
+        # Create some class variables to store the progress file details.
+        self.filename = filename
+        self.lock = Lock()
+
+        # Create a blank dictionary to store the progress of each channel.
+        self.channels = {}
+
+        # Load the progress from the previous runs if there is any.
+        if path.isfile(filename):
+
+            # Open the progress file in text-mode for reading.
+            with open(filename, 'r') as progressstream:
+
+                try:
+                    # Read the progress into the dictionary.
+                    self.channels = load(progressstream)
+
+                except ValueError:
+                    # A broken progress file only means that we scrape some days again.
+                    self.channels = {}
+
+    def get(self, channel):
+        """
+        Return the (newest, oldest) days that have been scraped for a channel, or None if we haven't scraped it yet.
+        :param channel: The ID for the channel.
+        """
+
+        # Grab the progress for the channel.
+        entry = self.channels.get(str(channel))
+
+        # Return nothing if we haven't scraped the channel yet.
+        if entry is None:
+            return None
+
+        # Return the range of days as datetime objects.
+        return datetime.strptime(entry['newest'], '%Y-%m-%d'), datetime.strptime(entry['oldest'], '%Y-%m-%d')
+
+    def update(self, channel, newest=None, oldest=None):
+        """
+        Move the ends of the scraped range for a channel and write the progress to disk.
+        :param channel: The ID for the channel.
+        :param newest: The datetime object for the new newest day, this is left alone if it's empty.
+        :param oldest: The datetime object for the new oldest day, this is left alone if it's empty.
+        """
+
+        with self.lock:
+
+            # Grab the progress for the channel, starting a new range if we haven't scraped it yet.
+            entry = self.channels.setdefault(str(channel), {'newest': (newest or oldest).strftime('%Y-%m-%d'), 'oldest': (oldest or newest).strftime('%Y-%m-%d')})
+
+            # Move the ends of the range.
+            if newest is not None:
+                entry['newest'] = newest.strftime('%Y-%m-%d')
+
+            if oldest is not None:
+                entry['oldest'] = oldest.strftime('%Y-%m-%d')
+
+            # Grab the folder path from the full file name.
+            folder = path.split(self.filename)[0]
+
+            # Determine if the folder path exists, if not then create it.
+            if not path.exists(folder):
+                makedirs(folder)
+
+            # Write the progress to disk.
+            with open(self.filename, 'w') as progressstream:
+                dump(self.channels, progressstream, indent=4)
+
+class Scheduler(object):
+    """
+    Hand out windows of days per channel: every channel is first brought up to date, then the older history is backfilled a slice at a time in turn.
+    """
+
+    def __init__(self, progress, catchup=None, backfill=None, weights=None):
+        """
+        The class constructor.
+        :param progress: The Progress object that remembers what has been scraped.
+        :param catchup: The number of days to scrape for a channel that has never been scraped before it counts as up to date, defaults to 7.
+        :param backfill: The number of days in each backfill slice, defaults to 7.
+        :param weights: A dictionary of channel IDs to the number of slices they get per turn, channels that aren't listed get one.
+        """
+
+        # Create some class variables to store the scheduler settings.
+        self.progress = progress
+        self.catchup = catchup if catchup is not None else 7
+        self.backfill = backfill if backfill is not None else 7
+        self.weights = weights or {}
+
+    def catchUp(self, channel, lastdate):
+        """
+        Return the (newest, oldest) window that brings a channel up to date, or None if it already is.
+        :param channel: The ID for the channel.
+        :param lastdate: The datetime object for the most recent post in the channel.
+        """
+
+        # Grab the day of the most recent post without the time.
+        newest = datetime(lastdate.year, lastdate.month, lastdate.day)
+
+        # Grab what has been scraped so far.
+        scraped = self.progress.get(channel)
+
+        # Start a new channel with a short window of its most recent days.
+        if scraped is None:
+            return newest, max(newest - timedelta(days=self.catchup - 1), datetime(2015, 1, 1))
+
+        # Otherwise scrape from the most recent post back to the newest day we have (that day may have been incomplete, its cache is replaced if it was written before the day was over).
+        if newest >= scraped[0]:
+            return newest, scraped[0]
+
+        # The channel is already up to date.
+        return None
+
+    def nextBackfill(self, channel):
+        """
+        Return the (newest, oldest) window for the next backfill slice of a channel, or None once it has been scraped back to the start.
+        :param channel: The ID for the channel.
+        """
+
+        # Grab what has been scraped so far.
+        scraped = self.progress.get(channel)
+
+        # Nothing can be backfilled before the channel has been caught up.
+        if scraped is None or scraped[1] <= datetime(2015, 1, 1):
+            return None
+
+        # The next slice ends the day before the oldest day we have.
+        newest = scraped[1] - timedelta(days=1)
+
+        # Weighted channels get bigger slices.
+        days = self.backfill * self.weights.get(str(channel), 1)
+
+        # Return the window.
+        return newest, max(newest - timedelta(days=days - 1), datetime(2015, 1, 1))
+
+    def caughtUp(self, channel, window):
+        """
+        Record that a catch-up window was scraped in full.
+        :param channel: The ID for the channel.
+        :param window: The (newest, oldest) window that was handed out by catchUp.
+        """
+
+        # A new channel starts its range with the whole window, otherwise the window joins onto the newest day we already had.
+        if self.progress.get(channel) is None:
+            self.progress.update(channel, window[0], window[1])
+        else:
+            self.progress.update(channel, newest=window[0])
+
+    def backfilled(self, channel, day):
+        """
+        Record that a backfill day was scraped (or written to the dead letter file), the days are scraped from newest to oldest so the range stays without gaps.
+        :param channel: The ID for the channel.
+        :param day: The datetime object for the day that was scraped.
+        """
+
+        self.progress.update(channel, oldest=day)
@@ -0,0 +1,99 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+array.array: Used to store the message IDs as packed 64-bit integers instead of Python objects.
+"""
+from array import array
+
+"""
+bisect.bisect_left: Used to look a message ID up in the sorted array.
+"""
+from bisect import bisect_left
+
+"""
+heapq.merge: Used to merge the new IDs into the sorted array without building a list of every ID.
+"""
+from heapq import merge
+
+"""
+threading.Lock: Used to keep the filter consistent when more than one token is scraping.
+"""
+from threading import Lock
+
+class SeenFilter(object):
+    """
+    Remember every message ID that has gone through the scraper in a sorted array of 64-bit integers (8 bytes per message).
+    New IDs are held in a small set first and merged into the array in batches that grow with the array, so adding an ID doesn't have to shift the whole array.
+    """
+
+    def __init__(self, batch=None):
+        """
+        The class constructor.
+        :param batch: The smallest number of new IDs to hold before merging them into the sorted array (an eighth of the array is held once that's larger), defaults to 4096.
+        """
+
+        # Create some class variables to store the IDs.
+        self.sorted = array('Q' if array('L').itemsize < 8 else 'L')
+        self.pending = set()
+        self.batch = batch if batch is not None else 4096
+        self.lock = Lock()
+
+    def __len__(self):
+        """
+        Return the number of IDs in the filter.
+        """
+
+        return len(self.sorted) + len(self.pending)
+
+    def __contains__(self, id):
+        """
+        Return whether or not an ID is in the filter.
+        :param id: The message ID (a string or an integer).
+        """
+
+        with self.lock:
+            return self.contains(int(id))
+
+    def contains(self, id):
+        """
+        Return whether or not an integer ID is in the filter, the lock has to be held by the caller.
+        :param id: The message ID as an integer.
+        """
+
+        # Check the IDs that haven't been merged yet.
+        if id in self.pending:
+            return True
+
+        # Look the ID up in the sorted array.
+        index = bisect_left(self.sorted, id)
+        return index < len(self.sorted) and self.sorted[index] == id
+
+    def add(self, id):
+        """
+        Add an ID to the filter, returning true if it's new and false if it has been seen before.
+        :param id: The message ID (a string or an integer).
+        """
+
+        # Message IDs are snowflakes, which fit in an unsigned 64-bit integer.
+        id = int(id)
+
+        with self.lock:
+
+            # Skip the ID if we've already seen it.
+            if self.contains(id):
+                return False
+
+            # Hold on to the new ID.
+            self.pending.add(id)
+
+            # Merge the new IDs into the sorted array once there are enough of them.
+            if len(self.pending) >= max(self.batch, len(self.sorted) >> 3):
+                self.sorted = array(self.sorted.typecode, merge(self.sorted, sorted(self.pending)))
+                self.pending = set()
+
+        # The ID is new.
+        return True
@@ -0,0 +1,71 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+class AttachmentFilter(object):
+    """
+    Decide which attachments to download from what the message already tells us about them (size, content type, and resolution), so the files that we'd throw away never cost a request.
+    """
+
+    # The filters that can be set and their defaults, a zero or an empty list means there's no limit.
+    defaults = {
+        'minSize': 0,         # The smallest file size in bytes.
+        'maxSize': 0,         # The largest file size in bytes.
+        'contentTypes': [],   # The content types to download, e.g. "image/png" or "video/" for every kind of video.
+        'minWidth': 0,        # The smallest width in pixels of an image or a video.
+        'minHeight': 0,       # The smallest height in pixels of an image or a video.
+        'maxWidth': 0,        # The largest width in pixels of an image or a video.
+        'maxHeight': 0,       # The largest height in pixels of an image or a video.
+    }
+
+    def __init__(self, filters=None):
+        """
+        The class constructor.
+        :param filters: A dictionary of the filters to use, see the defaults class variable above.
+        """
+
+        # Apply the filters over the defaults.
+        settings = dict(AttachmentFilter.defaults, **(filters or {}))
+
+        # Create some class variables to store the filters.
+        self.minSize = settings['minSize']
+        self.maxSize = settings['maxSize']
+        self.contentTypes = [contenttype.lower() for contenttype in settings['contentTypes']]
+        self.minWidth = settings['minWidth']
+        self.minHeight = settings['minHeight']
+        self.maxWidth = settings['maxWidth']
+        self.maxHeight = settings['maxHeight']
+
+    def accepts(self, attachment, contenttype):
+        """
+        Return whether or not an attachment passes every filter, the limits that the attachment doesn't tell us about are skipped.
+        :param attachment: The attachment dictionary from a message.
+        :param contenttype: The content type of the attachment, from the message or guessed from the file name.
+        """
+
+        # Grab the file size, the attachments always come with one.
+        size = attachment.get('size')
+
+        # Check the file size.
+        if size is not None and (size < self.minSize or (self.maxSize and size > self.maxSize)):
+            return False
+
+        # Check the content type against the ones we want (ignoring any parameters, e.g. "; charset=utf-8").
+        if len(self.contentTypes) > 0 and not any(contenttype.split(';')[0].strip().lower().startswith(wanted) for wanted in self.contentTypes):
+            return False
+
+        # Grab the resolution, only images and videos come with one.
+        width = attachment.get('width')
+        height = attachment.get('height')
+
+        # Check the resolution.
+        if width is not None and (width < self.minWidth or (self.maxWidth and width > self.maxWidth)):
+            return False
+
+        if height is not None and (height < self.minHeight or (self.maxHeight and height > self.maxHeight)):
+            return False
+
+        # The attachment passed every filter.
+        return True
@@ -0,0 +1,65 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+os._exit: Used to halt the script straight away on the second CTRL+C.
+"""
+from os import _exit as exit
+
+"""
+sys.stderr: Used to write to the standard error filestream.
+"""
+from sys import stderr
+
+"""
+threading.Event: Used to let every thread know that we're stopping, and to wake up anything that is sleeping.
+"""
+from threading import Event
+
+class Shutdown(object):
+    """
+    Turn the first CTRL+C (Command+C) into a request to stop once the work in flight is done, and the second one into a forced exit.
+    Nothing new is started once a stop has been requested: the day being scraped is finished, downloads that haven't started are written to the dead letter file for --refetch, and a download cut off by a forced exit is resumed from its .part file.
+    """
+
+    def __init__(self):
+        """
+        The class constructor.
+        """
+
+        # Create an event that is set once a stop has been requested.
+        self.event = Event()
+
+    def requested(self):
+        """
+        Return whether or not a stop has been requested.
+        """
+
+        return self.event.is_set()
+
+    def wait(self, seconds):
+        """
+        Sleep for a number of seconds, waking up early if a stop is requested. Returns whether or not a stop has been requested.
+        :param seconds: The number of seconds to sleep for.
+        """
+
+        return self.event.wait(seconds)
+
+    def handle(self, sig, frame):
+        """
+        The SIGINT handler.
+        :param sig: The signal number.
+        :param frame: The stack frame that was interrupted.
+        """
+
+        # Stop straight away on the second CTRL+C.
+        if self.event.is_set():
+            stderr.write('\n[WARN] Stopping straight away, unfinished downloads will carry on from their .part files next time.\n')
+            exit(1)
+
+        # Otherwise ask everything to stop once the work in flight is done.
+        self.event.set()
+        stderr.write('\n[WARN] Stopping once the work in flight is done, press CTRL + C again to stop straight away.\n')
@@ -0,0 +1,629 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+os.makedirs: Used to create a folder with subfolders.
+os.remove:   Used to throw away a local file once it has been uploaded.
+os.rename:   Used to move a file into its shard folder.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, remove, rename, path
+
+"""
+sys.stderr: Used to write to the standard error filestream.
+"""
+from sys import stderr
+
+"""
+threading.Condition: Used to wake up the flush thread when there's something to write, and the callers of flush when it's done.
+threading.Thread:    Used to write the batches in the background so the scraper never waits on them.
+"""
+from threading import Condition, Thread
+
+"""
+time.gmtime:   Used to timestamp the S3 requests.
+time.strftime: Used to format the S3 request timestamps.
+time.time:     Used to work out when a batch has waited long enough.
+"""
+from time import gmtime, strftime, time
+
+def warn(message):
+    """
+    Throw a warning message without halting the script.
+    :param message: A string that will be printed out to STDERR.
+    """
+
+    # Append our message with a newline character.
+    stderr.write('[WARN] {0}\n'.format(message))
+
+class LocalStorage(object):
+    """
+    Keep the downloads where they were downloaded to, every other backend builds on this one.
+    Files are always downloaded to a local path first (so an unfinished download can carry on from its .part file), a backend then moves the finished file to where it's stored.
+    """
+
+    def __init__(self, root):
+        """
+        The class constructor.
+        :param root: The folder that the scrapes and cached folders are created in.
+        """
+
+        # Create a class variable to store the root folder.
+        self.root = root
+
+    def path(self, *parts):
+        """
+        Return the local path to a file or a folder under the root folder.
+        :param parts: The folder and file names, e.g. "scrapes", the guild, and the channel.
+        """
+
+        return path.join(self.root, *parts)
+
+    def key(self, filename):
+        """
+        Return the name that a local file is stored under, its path from the root folder with forward slashes.
+        :param filename: The full file path to the local file.
+        """
+
+        return path.relpath(filename, self.root).replace(path.sep, '/')
+
+    def stored(self, filename):
+        """
+        Return whether or not a file has been stored.
+        :param filename: The full file path that the file was downloaded to.
+        """
+
+        return path.isfile(filename)
+
+    def exists(self, filename):
+        """
+        Return whether or not a file has already been downloaded.
+        :param filename: The full file path that the file would be downloaded to.
+        """
+
+        return self.stored(filename)
+
+    def put(self, filename, keep=None):
+        """
+        Store a finished file, local files are already where they're stored.
+        :param filename: The full file path to the finished file.
+        :param keep: Whether or not the local file has to stay where it is, e.g. a cache file that the scraper reads again.
+        """
+
+        self.putMany([(filename, keep)])
+
+    def putMany(self, files):
+        """
+        Store a batch of finished files.
+        :param files: A list of (filename, keep) tuples.
+        """
+
+    def mirror(self, filename):
+        """
+        Store a copy of a file that has to stay where it is, e.g. a finished cache file.
+        :param filename: The full file path to the file.
+        """
+
+        self.put(filename, True)
+
+    def flush(self):
+        """
+        Wait for every file handed to put to be stored.
+        """
+
+    def close(self):
+        """
+        Store everything that is left and stop.
+        """
+
+        self.flush()
+
+class ShardedStorage(LocalStorage):
+    """
+    Spread the downloads of a channel over shard folders named after the hash of their file name, so no single folder ends up with hundreds of thousands of files.
+    """
+
+    def __init__(self, root, depth=None):
+        """
+        The class constructor.
+        :param root: The folder that the scrapes and cached folders are created in.
+        :param depth: The number of levels of shard folders (each level has 256 of them), defaults to 2.
+        """
+
+        # Determine if the depth argument is not set.
+        if depth is None:
+
+            # Set it to the default value of 2.
+            depth = 2
+
+        LocalStorage.__init__(self, root)
+        self.depth = depth
+
+    def location(self, filename):
+        """
+        Return the path that a file is stored at, e.g. scrapes/guild/channel/3f/a2/name.png.
+        :param filename: The full file path that the file was downloaded to.
+        """
+
+        # Import the hash function here rather than at the top so that it's only loaded when the sharded backend is used.
+        from hashlib import md5
+
+        # Hash the file name.
+        folder, name = path.split(filename)
+        digest = md5(name.encode('utf-8')).hexdigest()
+
+        # Use two hex digits of the hash for each level.
+        return path.join(folder, *([digest[2 * level:2 * level + 2] for level in range(self.depth)] + [name]))
+
+    def stored(self, filename):
+        """
+        Return whether or not a file has been stored in its shard folder.
+        :param filename: The full file path that the file was downloaded to.
+        """
+
+        return path.isfile(self.location(filename))
+
+    def putMany(self, files):
+        """
+        Move a batch of finished files into their shard folders.
+        :param files: A list of (filename, keep) tuples, the cache files that have to stay aren't sharded.
+        """
+
+        for filename, keep in files:
+            if keep or not path.isfile(filename):
+                continue
+
+            # Grab the shard folder and create it if it doesn't exist.
+            location = self.location(filename)
+
+            if not path.exists(path.dirname(location)):
+                makedirs(path.dirname(location))
+
+            # Move the file into place.
+            rename(filename, location)
+
+class PackStorage(LocalStorage):
+    """
+    Append the small downloads of each channel to pack files (see PackStore), the bigger ones stay where they were downloaded to.
+    """
+
+    def __init__(self, root, threshold=None, packsize=None):
+        """
+        The class constructor.
+        :param root: The folder that the scrapes and cached folders are created in.
+        :param threshold: The largest size in bytes of a file that goes into a pack.
+        :param packsize: The largest size in bytes of a pack.
+        """
+
+        # Import the packs here rather than at the top so that they're only loaded when the pack backend is used.
+        from .PackStore import PackArchive
+
+        LocalStorage.__init__(self, root)
+        self.packs = PackArchive(threshold, packsize)
+
+    def stored(self, filename):
+        """
+        Return whether or not a file is in the packs, or is big enough to be stored where it was downloaded to.
+        :param filename: The full file path that the file was downloaded to.
+        """
+
+        return filename in self.packs or (path.isfile(filename) and path.getsize(filename) > self.packs.threshold)
+
+    def putMany(self, files):
+        """
+        Append a batch of finished files to the packs, writing to each pack and its index once.
+        :param files: A list of (filename, keep) tuples, the cache files that have to stay aren't packed.
+        """
+
+        # Sort the small files by the channel folder that they belong to.
+        folders = {}
+
+        for filename, keep in files:
+            if not keep and path.isfile(filename) and path.getsize(filename) <= self.packs.threshold:
+                folders.setdefault(path.dirname(filename), []).append(filename)
+
+        # Move each folder's files into its packs all at once.
+        for folder, filenames in folders.items():
+            self.packs.store(folder).addFiles(filenames)
+
+class S3Storage(LocalStorage):
+    """
+    Upload the downloads to an S3-compatible object store (AWS S3, MinIO, Ceph, and so on) and throw away the local copies.
+    The keys that have been uploaded are kept in a manifest file next to the other cached files, so checking if a file was already downloaded never costs a request.
+    """
+
+    def __init__(self, root, endpoint, bucket, accesskey, secretkey, region=None, prefix=None, keeplocal=None, manifest=None):
+        """
+        The class constructor.
+        :param root: The folder that the files are downloaded to before they're uploaded.
+        :param endpoint: The URL of the object store, e.g. "https://s3.amazonaws.com" or "http://127.0.0.1:9000".
+        :param bucket: The name of the bucket to upload to.
+        :param accesskey: The access key ID.
+        :param secretkey: The secret access key.
+        :param region: The region of the bucket, defaults to us-east-1.
+        :param prefix: The prefix to put in front of every key, defaults to nothing.
+        :param keeplocal: Whether or not the local copies are kept after they're uploaded, defaults to false.
+        :param manifest: The full file path to the manifest file, defaults to cached/storage.manifest under the root folder.
+        """
+
+        LocalStorage.__init__(self, root)
+
+        # Create some class variables to store the object store settings.
+        self.endpoint = endpoint.rstrip('/')
+        self.bucket = bucket
+        self.accesskey = accesskey
+        self.secretkey = secretkey
+        self.region = region or 'us-east-1'
+        self.prefix = prefix or ''
+        self.keeplocal = keeplocal or False
+        self.manifest = manifest or path.join(root, 'cached', 'storage.manifest')
+
+        # Read the keys that have already been uploaded.
+        self.uploaded = set()
+
+        if path.isfile(self.manifest):
+            with open(self.manifest, 'r') as manifeststream:
+                self.uploaded.update(line.strip() for line in manifeststream if len(line.strip()) > 0)
+
+    def stored(self, filename):
+        """
+        Return whether or not a file has been uploaded.
+        :param filename: The full file path that the file was downloaded to.
+        """
+
+        return self.key(filename) in self.uploaded
+
+    @staticmethod
+    def signature(method, uri, query, headers, payloadhash, amzdate, region, accesskey, secretkey):
+        """
+        Return the Authorization header for a request with AWS Signature Version 4.
+        :param method: The HTTP method.
+        :param uri: The URL-encoded path of the request.
+        :param query: The canonical query string (empty if there isn't one).
+        :param headers: A dictionary of every header to sign, the host header has to be one of them.
+        :param payloadhash: The hex SHA-256 hash of the body, or "UNSIGNED-PAYLOAD".
+        :param amzdate: The timestamp of the request, e.g. "20130524T000000Z".
+        :param region: The region of the bucket.
+        :param accesskey: The access key ID.
+        :param secretkey: The secret access key.
+        """
+
+        # Import the hashing and signing functions here rather than at the top so that they're only loaded when the S3 backend is used.
+        from hashlib import sha256
+        import hmac
+
+        # Build the canonical request.
+        names = sorted(name.lower() for name in headers)
+        values = dict((name.lower(), ' '.join(str(value).strip().split())) for name, value in headers.items())
+        canonical = '\n'.join([method, uri, query, ''.join('{0}:{1}\n'.format(name, values[name]) for name in names), ';'.join(names), payloadhash])
+
+        # Build the string to sign.
+        scope = '{0}/{1}/s3/aws4_request'.format(amzdate[:8], region)
+        tosign = '\n'.join(['AWS4-HMAC-SHA256', amzdate, scope, sha256(canonical.encode('utf-8')).hexdigest()])
+
+        # Derive the signing key from the secret key, one step at a time.
+        key = ('AWS4' + secretkey).encode('utf-8')
+
+        for part in [amzdate[:8], region, 's3', 'aws4_request']:
+            key = hmac.new(key, part.encode('utf-8'), sha256).digest()
+
+        # Sign the string and return the header.
+        return 'AWS4-HMAC-SHA256 Credential={0}/{1}, SignedHeaders={2}, Signature={3}'.format(accesskey, scope, ';'.join(names), hmac.new(key, tosign.encode('utf-8'), sha256).hexdigest())
+
+    def connect(self):
+        """
+        Open a connection to the object store, every upload in a batch shares it.
+        """
+
+        # Import the HTTP client here rather than at the top so that it's only loaded when the S3 backend is used.
+        try:
+            from http.client import HTTPConnection, HTTPSConnection
+        except ImportError:
+            from httplib import HTTPConnection, HTTPSConnection
+
+        # Split the endpoint into its scheme and its host.
+        scheme, host = self.endpoint.split('://', 1)
+
+        # Open the connection.
+        return (HTTPSConnection if scheme == 'https' else HTTPConnection)(host.split('/')[0], timeout=60)
+
+    def upload(self, connection, filename):
+        """
+        Upload a file, returning whether or not it worked.
+        :param connection: The connection to the object store.
+        :param filename: The full file path to the file.
+        """
+
+        # Import the URL quoting function here for the same reason as the HTTP client.
+        try:
+            from urllib.parse import quote
+        except ImportError:
+            from urllib import quote
+
+        # Import the hash function here for the same reason as the HTTP client.
+        from hashlib import sha256
+
+        # Hash the file for the signature.
+        digest = sha256()
+
+        with open(filename, 'rb') as filestream:
+            for chunk in iter(lambda: filestream.read(1048576), b''):
+                digest.update(chunk)
+
+        # Build the path-style URL path of the object (this works with every S3-compatible store).
+        uri = '/{0}/{1}'.format(self.bucket, quote('{0}{1}'.format(self.prefix, self.key(filename)).encode('utf-8'), safe='/~'))
+
+        # Build and sign the headers.
+        amzdate = strftime('%Y%m%dT%H%M%SZ', gmtime())
+        headers = {'Host': self.endpoint.split('://', 1)[1].split('/')[0], 'x-amz-content-sha256': digest.hexdigest(), 'x-amz-date': amzdate}
+        headers['Authorization'] = S3Storage.signature('PUT', uri, '', headers, digest.hexdigest(), amzdate, self.region, self.accesskey, self.secretkey)
+        headers['Content-Length'] = str(path.getsize(filename))
+
+        # Stream the file up.
+        with open(filename, 'rb') as filestream:
+            connection.request('PUT', uri, body=filestream, headers=headers)
+            response = connection.getresponse()
+            response.read()
+
+        # Warn about the upload if it didn't work.
+        if not 199 < response.status < 300:
+            warn('HTTP {0} uploading {1} to the object store.'.format(response.status, filename))
+            return False
+
+        return True
+
+    def putMany(self, files):
+        """
+        Upload a batch of finished files over a single connection, then add them to the manifest all at once.
+        :param files: A list of (filename, keep) tuples.
+        """
+
+        # Create a list to store the keys that were uploaded.
+        done = []
+
+        # Open a connection for the batch.
+        connection = self.connect()
+
+        try:
+            for filename, keep in files:
+                if not path.isfile(filename):
+                    continue
+
+                try:
+                    # Upload the file, trying once more on a fresh connection if the object store closed the old one.
+                    try:
+                        uploaded = self.upload(connection, filename)
+                    except (IOError, OSError):
+                        connection.close()
+                        connection = self.connect()
+                        uploaded = self.upload(connection, filename)
+
+                except Exception as ex:
+                    warn('Unable to upload {0}: {1}'.format(filename, ex))
+                    connection.close()
+                    connection = self.connect()
+                    continue
+
+                # Throw away the local copy unless it has to stay.
+                if uploaded:
+                    done.append(self.key(filename))
+
+                    if not keep and not self.keeplocal:
+                        remove(filename)
+
+        finally:
+            connection.close()
+
+        # Skip the manifest if nothing was uploaded.
+        if len(done) == 0:
+            return None
+
+        # Add the uploaded keys to the manifest.
+        if not path.exists(path.dirname(self.manifest)):
+            makedirs(path.dirname(self.manifest))
+
+        with open(self.manifest, 'a') as manifeststream:
+            manifeststream.write(''.join('{0}\n'.format(key) for key in done))
+
+        self.uploaded.update(done)
+
+class BatchWriter(object):
+    """
+    Hand the finished files to a backend in batches on a background thread, so the scraper carries on while they're stored.
+    A batch is written once it's full or has waited long enough, whichever comes first.
+    """
+
+    def __init__(self, backend, batch=None, interval=None):
+        """
+        The class constructor.
+        :param backend: The storage backend that writes the batches.
+        :param batch: The largest number of files in a batch, defaults to 64.
+        :param interval: The number of seconds a file can wait for its batch to fill up, defaults to 5.
+        """
+
+        # Determine if the batch argument is not set.
+        if batch is None:
+
+            # Set it to the default value of 64.
+            batch = 64
+
+        # Determine if the interval argument is not set.
+        if interval is None:
+
+            # Set it to the default value of 5.
+            interval = 5
+
+        # Create some class variables to store the writer settings.
+        self.backend = backend
+        self.batch = batch
+        self.interval = interval
+
+        # Create some class variables to store the files waiting to be written, and the files being written right now.
+        self.queue = []
+        self.writing = []
+        self.closed = False
+        self.flushing = False   # Whether or not a caller is waiting for everything to be written, the batches don't wait to fill up while this is true.
+        self.condition = Condition()
+
+        # Start the background thread.
+        self.thread = Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def path(self, *parts):
+        """
+        Return the local path to a file or a folder under the root folder.
+        :param parts: The folder and file names.
+        """
+
+        return self.backend.path(*parts)
+
+    def exists(self, filename):
+        """
+        Return whether or not a file has already been downloaded (it might still be waiting to be stored).
+        :param filename: The full file path that the file would be downloaded to.
+        """
+
+        with self.condition:
+
+            # Check the files that are waiting to be stored.
+            if any(queued == filename for queued, keep in self.queue + self.writing):
+                return True
+
+        # Check the backend.
+        if self.backend.stored(filename):
+            return True
+
+        # A finished file that never made it to the backend (e.g. the script was stopped straight away) is stored now instead of downloaded again.
+        if path.isfile(filename):
+            self.put(filename)
+            return True
+
+        # Otherwise the file has to be downloaded.
+        return False
+
+    def put(self, filename, keep=None):
+        """
+        Queue a finished file up to be stored.
+        :param filename: The full file path to the finished file.
+        :param keep: Whether or not the local file has to stay where it is.
+        """
+
+        with self.condition:
+            self.queue.append((filename, keep))
+            self.condition.notify_all()
+
+    def mirror(self, filename):
+        """
+        Queue a copy of a file that has to stay where it is up to be stored.
+        :param filename: The full file path to the file.
+        """
+
+        self.put(filename, True)
+
+    def run(self):
+        """
+        Write the batches until the writer is closed, this runs on the background thread.
+        """
+
+        while True:
+            with self.condition:
+
+                # Wait for something to write.
+                while len(self.queue) == 0 and not self.closed:
+                    self.condition.wait()
+
+                # Stop once everything has been written.
+                if len(self.queue) == 0:
+                    return None
+
+                # Give the batch some time to fill up, unless we're flushing or closing.
+                deadline = time() + self.interval
+
+                while len(self.queue) < self.batch and not self.closed and time() < deadline and not self.flushing:
+                    self.condition.wait(deadline - time())
+
+                # Take the batch.
+                self.writing, self.queue = self.queue[:self.batch], self.queue[self.batch:]
+
+            try:
+                # Write the batch.
+                self.backend.putMany(self.writing)
+
+            except Exception as ex:
+                warn('Unable to store {0} files: {1}'.format(len(self.writing), ex))
+
+            with self.condition:
+
+                # Let the callers of flush know that the batch is done.
+                self.writing = []
+                self.condition.notify_all()
+
+    def flush(self):
+        """
+        Wait for every queued file to be stored.
+        """
+
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+
+            # Wait until there's nothing queued or being written.
+            while len(self.queue) > 0 or len(self.writing) > 0:
+                self.condition.wait()
+
+            self.flushing = False
+
+    def close(self):
+        """
+        Store everything that is left and stop the background thread.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        # Wait for the background thread to finish the last batches.
+        self.thread.join()
+
+def openStorage(root, backend=None, options=None):
+    """
+    Create the storage backend that the configuration file asks for.
+    :param root: The folder that the scrapes and cached folders are created in.
+    :param backend: The name of the backend: "local", "sharded", "pack", or "s3", defaults to local.
+    :param options: A dictionary of the backend's settings, see the README.
+    """
+
+    # Determine if the options argument is not set.
+    if options is None:
+
+        # Set it to an empty dictionary.
+        options = {}
+
+    # Local files don't need a background thread since there's nothing to move.
+    if backend is None or backend == 'local':
+        return LocalStorage(root)
+
+    # Create the backend.
+    if backend == 'sharded':
+        storage = ShardedStorage(root, options.get('depth'))
+
+    elif backend == 'pack':
+        storage = PackStorage(root, options.get('packThreshold'), options.get('packSize'))
+
+    elif backend == 's3':
+        missing = [name for name in ['endpoint', 'bucket', 'accessKey', 'secretKey'] if not options.get(name)]
+
+        if len(missing) > 0:
+            raise ValueError('The S3 storage backend needs {0} in storageOptions.'.format(', '.join(missing)))
+
+        storage = S3Storage(root, options['endpoint'], options['bucket'], options['accessKey'], options['secretKey'], options.get('region'), options.get('prefix'), options.get('keepLocal'))
+
+    else:
+        raise ValueError('Unknown storage backend "{0}", it has to be local, sharded, pack, or s3.'.format(backend))
+
+    # Store the files in batches on a background thread.
+    return BatchWriter(storage, options.get('batchSize'), options.get('flushInterval'))
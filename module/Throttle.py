@@ -0,0 +1,181 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+os.path: Used to find the folder that a download is written to.
+"""
+from os import path
+
+"""
+threading.Lock: Used to keep the buckets consistent between threads.
+"""
+from threading import Lock
+
+"""
+time.time: Used to work out how many tokens have been added to a bucket since it was last used.
+"""
+from time import time
+
+class DiskSpaceError(Exception):
+    """
+    Raised when a download would leave less free disk space than the configured minimum.
+    """
+
+class TokenBucket(object):
+    """
+    A token bucket that limits the number of bytes per second, a download reserves the bytes it's about to read and waits off any debt.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        The class constructor.
+        :param rate: The number of bytes per second that the bucket refills at.
+        :param burst: The largest number of bytes the bucket can hold, defaults to one second's worth.
+        """
+
+        # Create some class variables to store the bucket settings.
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+
+        # The bucket starts full.
+        self.tokens = self.burst
+        self.updated = time()
+        self.lock = Lock()
+
+    def delay(self, amount):
+        """
+        Take bytes out of the bucket, returning the number of seconds to wait before carrying on.
+        :param amount: The number of bytes that are about to be read, a negative amount gives back bytes that weren't read after all.
+        """
+
+        with self.lock:
+            now = time()
+
+            # Refill the bucket for the time that has gone by.
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Take the bytes out, the bucket can go into debt so that everyone waiting is served in turn.
+            self.tokens = min(self.burst, self.tokens - amount)
+
+            # Return how long it takes for the debt to be paid off.
+            return max(0.0, -self.tokens / self.rate)
+
+class Throttle(object):
+    """
+    Limit the download bandwidth, both across every download and per host.
+    """
+
+    def __init__(self, rate=None, hostrate=None):
+        """
+        The class constructor.
+        :param rate: The number of bytes per second across every download, no limit if this is empty or zero.
+        :param hostrate: The number of bytes per second for each host, no limit if this is empty or zero.
+        """
+
+        # Create the bucket that every download shares.
+        self.total = TokenBucket(rate) if rate else None
+
+        # Create some class variables to store the buckets of each host.
+        self.hostrate = hostrate
+        self.hosts = {}
+        self.lock = Lock()
+
+        # Read a tenth of a second's worth of the slowest limit at a time (at least 1 KiB) so a read never runs far ahead of the limit.
+        self.stepsize = max(1024, int(min(rate for rate in [rate, hostrate] if rate) / 10)) if rate or hostrate else None
+
+    def step(self, buffer=0):
+        """
+        Return the number of bytes to read at a time, this is never more than the buffer size and is empty if there's no limit or buffer.
+        :param buffer: The buffer size in bytes that the download uses, zero reads the whole body at once.
+        """
+
+        # Return the buffer size if there's no limit.
+        if self.stepsize is None:
+            return buffer if buffer > 0 else None
+
+        # Return the smaller of the two.
+        return min(buffer, self.stepsize) if buffer > 0 else self.stepsize
+
+    def delay(self, url, amount):
+        """
+        Take bytes out of the buckets, returning the number of seconds to wait before carrying on.
+        :param url: The URL that the bytes are read from.
+        :param amount: The number of bytes that are about to be read, a negative amount gives back bytes that weren't read after all.
+        """
+
+        # Create a variable to store the time to wait.
+        wait = 0.0
+
+        # Take the bytes out of the bucket that every download shares.
+        if self.total is not None:
+            wait = self.total.delay(amount)
+
+        # Take the bytes out of the host's bucket.
+        if self.hostrate:
+            host = url.split('/')[2]
+
+            with self.lock:
+                bucket = self.hosts.setdefault(host, TokenBucket(self.hostrate))
+
+            wait = max(wait, bucket.delay(amount))
+
+        # Return the longest wait.
+        return wait
+
+class DiskGovernor(object):
+    """
+    Hold back downloads while the free disk space is below a minimum, the scrape itself carries on and the held back downloads are left for --refetch.
+    """
+
+    def __init__(self, minimum=None):
+        """
+        The class constructor.
+        :param minimum: The number of bytes of disk space that have to stay free, no check if this is empty or zero.
+        """
+
+        # Create a class variable to store the minimum free space.
+        self.minimum = minimum or 0
+
+    @staticmethod
+    def free(folder):
+        """
+        Return the number of bytes free on the disk that holds a folder.
+        :param folder: The folder to check, the nearest existing parent folder is used if it doesn't exist yet.
+        """
+
+        # Walk up to a folder that exists.
+        while not path.exists(folder) and path.dirname(folder) != folder:
+            folder = path.dirname(folder)
+
+        try:
+            # Use disk_usage where we can (it works on Windows as well).
+            from shutil import disk_usage
+            return disk_usage(folder).free
+
+        except ImportError:
+            # Fall back to statvfs on Python 2.
+            from os import statvfs
+            stats = statvfs(folder)
+            return stats.f_bavail * stats.f_frsize
+
+    def check(self, filename, size=None):
+        """
+        Raise a DiskSpaceError if writing a file would leave less free disk space than the minimum.
+        :param filename: The full file path to the file that we're wanting to write.
+        :param size: The number of bytes that we're about to write, if we know it.
+        """
+
+        # Skip this function if there's no minimum.
+        if self.minimum <= 0:
+            return None
+
+        # Grab the free disk space.
+        free = DiskGovernor.free(path.dirname(filename))
+
+        # Throw an error if the file wouldn't fit.
+        if free - (size or 0) < self.minimum:
+            raise DiskSpaceError('Only {0} bytes of disk space are free, holding back {1}.'.format(free, filename))
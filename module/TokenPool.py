@@ -0,0 +1,231 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+re.search: Used to pull the channel ID out of a request URL.
+"""
+from re import search
+
+"""
+threading.Condition: Used to hand out work to the token threads and wake them up when work is put back.
+threading.Lock:      Used to keep the rate limit state consistent between threads.
+"""
+from threading import Condition, Lock
+
+"""
+time.sleep: Used to wait for a token's rate limit to reset.
+time.time:  Used to work out when a token's rate limit resets.
+"""
+from time import sleep, time
+
+class TokenPool(object):
+    """
+    Keep track of the rate limit state of each authorization token and which channels each token is able to see.
+    """
+
+    def __init__(self, tokens):
+        """
+        The class constructor.
+        :param tokens: A list of authorization tokens.
+        """
+
+        # Create some class variables to store the tokens.
+        self.tokens = list(tokens)
+        self.lock = Lock()
+
+        # Create a dictionary to store the rate limit state of each token.
+        self.state = dict((token, {'remaining': None, 'reset': 0.0, 'blocked': 0.0, 'dead': False}) for token in self.tokens)
+
+        # Create a dictionary to store the channels that each token was refused access to.
+        self.denied = dict((token, set()) for token in self.tokens)
+
+    def __len__(self):
+        """
+        Return the number of tokens in the pool.
+        """
+
+        return len(self.tokens)
+
+    def wait(self, token):
+        """
+        Block until the token is allowed to send another request.
+        :param token: The authorization token that is about to be used.
+        """
+
+        # Skip this function for tokens that we don't know about.
+        if token not in self.state:
+            return None
+
+        with self.lock:
+            state = self.state[token]
+
+            # Wait out a 429 for as long as Discord told us to.
+            until = state['blocked']
+
+            # Wait for the bucket to reset if the last response said that it was empty.
+            if state['remaining'] == 0:
+                until = max(until, state['reset'])
+
+        # Wait if we have to.
+        if until > time():
+            sleep(until - time())
+
+    def update(self, token, request, url=None):
+        """
+        Record the rate limit state and access problems from the last response a token got.
+        :param token: The authorization token that was used.
+        :param request: The DiscordRequest object that sent the request.
+        :param url: The URL that was requested, this is used to remember which channel a token can't see.
+        """
+
+        # Skip this function for tokens that we don't know about.
+        if token not in self.state:
+            return None
+
+        with self.lock:
+            state = self.state[token]
+
+            # Remember how many requests are left in the bucket and when it resets.
+            if request.rateRemaining is not None:
+                state['remaining'] = int(request.rateRemaining)
+                state['reset'] = time() + float(request.rateResetAfter or 0)
+
+            # Stop using the token for as long as Discord told us to if we hit the rate limit.
+            if request.status == 429:
+                state['blocked'] = time() + float(request.retryAfter or 1)
+
+            # Stop using the token altogether if it isn't valid anymore.
+            if request.status == 401:
+                state['dead'] = True
+
+            # Remember that the token can't see the channel.
+            if request.status in [403, 404] and url is not None:
+                channel = search(r'/channels/(\d+)', url)
+
+                if channel is not None:
+                    self.denied[token].add(channel.group(1))
+
+    def alive(self, token):
+        """
+        Return whether or not the token is still valid.
+        :param token: The authorization token.
+        """
+
+        return not self.state[token]['dead']
+
+    def hasAccess(self, token, channel):
+        """
+        Return whether or not the token is able to see the channel (as far as we know).
+        :param token: The authorization token.
+        :param channel: The ID for the channel.
+        """
+
+        return self.alive(token) and str(channel) not in self.denied[token]
+
+    def spare(self, token):
+        """
+        Return a rough measure of the spare capacity that a token has, higher is better.
+        :param token: The authorization token.
+        """
+
+        with self.lock:
+            state = self.state[token]
+
+            # A blocked or dead token has no spare capacity at all.
+            if state['dead'] or state['blocked'] > time():
+                return -1
+
+            # A token that we haven't heard back about yet is as good as any other.
+            return state['remaining'] if state['remaining'] is not None else 1 << 16
+
+class ChannelQueue(object):
+    """
+    Hand out channels to the token threads, putting a channel back for the other tokens when a token can't see it.
+    """
+
+    def __init__(self, pool, items):
+        """
+        The class constructor.
+        :param pool: The TokenPool that knows which tokens can see which channels.
+        :param items: A list of tuples for everything we want to scrape, the channel ID has to be the second value.
+        """
+
+        # Create some class variables to store the work.
+        self.pool = pool
+        self.items = list(items)
+        self.inflight = 0
+        self.condition = Condition()
+
+        # Create a list to store the items that none of the tokens are able to see.
+        self.dropped = []
+
+    def take(self, token):
+        """
+        Return the next item that the token can work on, or None once there's nothing left for it.
+        :param token: The authorization token of the thread asking for work.
+        """
+
+        with self.condition:
+            while True:
+
+                # Throw away the items that no live token can see.
+                for item in [item for item in self.items if not any(self.pool.hasAccess(other, item[1]) for other in self.pool.tokens)]:
+                    self.items.remove(item)
+                    self.dropped.append(item)
+
+                # Stop if the token itself isn't valid anymore.
+                if not self.pool.alive(token):
+                    return None
+
+                # Grab the items that the token can see.
+                eligible = [item for item in self.items if self.pool.hasAccess(token, item[1])]
+
+                # Hand out work as long as the token isn't sitting out a rate limit.
+                if len(eligible) > 0 and self.pool.spare(token) >= 0:
+
+                    # Prefer the channels that the fewest other tokens can see so they aren't left waiting on a busy token.
+                    item = min(eligible, key=lambda item: sum(1 for other in self.pool.tokens if self.pool.hasAccess(other, item[1])))
+
+                    # Hand the item out.
+                    self.items.remove(item)
+                    self.inflight += 1
+                    return item
+
+                # Stop if there's nothing left to do and nothing that could be put back.
+                if len(eligible) == 0 and self.inflight == 0:
+                    return None
+
+                # Otherwise wait for work to be put back or finished (or for the rate limit to run out).
+                self.condition.wait(1)
+
+    def done(self, item, requeue=None):
+        """
+        Mark an item as finished, or put it back for the other tokens.
+        :param item: The item that was handed out by take.
+        :param requeue: A true or false (boolean) value that determines if the item should be put back.
+        """
+
+        with self.condition:
+            self.inflight -= 1
+
+            # Put the item back at the front so it is picked up next.
+            if requeue:
+                self.items.insert(0, item)
+
+            # Wake the other threads up so they can look for work again.
+            self.condition.notify_all()
+
+    def put(self, item):
+        """
+        Add a new item to the back of the queue so everything that is already waiting is handed out first.
+        :param item: The item to add.
+        """
+
+        with self.condition:
+            self.items.append(item)
+
+            # Wake the other threads up so they can look for work again.
+            self.condition.notify_all()
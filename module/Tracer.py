@@ -0,0 +1,339 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+datetime.datetime: Used to write the request start times in the HAR file.
+"""
+from datetime import datetime
+
+"""
+json.dumps: Used to convert a trace entry or the HAR file into a serialized string.
+json.loads: Used to convert a serialized trace entry back into a dictionary object.
+"""
+from json import dumps, loads
+
+"""
+os.makedirs: Used to create the folder that stores the trace file.
+os.path:     Used to combine and split file paths.
+"""
+from os import makedirs, path
+
+"""
+re.compile: Used to find the tokens in a URL and the IDs in an endpoint.
+"""
+from re import compile as Regex
+
+"""
+threading.Lock: Used to keep the lines of the trace file whole when more than one thread is writing to it.
+"""
+from threading import Lock
+
+"""
+time.time: Used to time each phase of a request.
+"""
+from time import time
+
+"""
+The parts of a URL that carry a secret, e.g. a webhook token or a token in the query string, these are replaced before anything is written.
+"""
+SECRETS = [
+    (Regex(r'(/webhooks/\d+/)[^/?]+'), r'\1REDACTED'),
+    (Regex(r'([?&](?:token|access_token|auth)=)[^&]+'), r'\1REDACTED'),
+]
+
+"""
+The snowflakes in a URL path, these are replaced by {id} so every request to the same endpoint is grouped together.
+"""
+SNOWFLAKE = Regex(r'/\d{15,}(?=/|$)')
+
+"""
+The hosts that serve the API, every other host is a CDN whose file names are grouped together as well.
+"""
+APIHOSTS = ['discord.com', 'discordapp.com']
+
+"""
+The phases of a request in the order they happen, every one of them is in seconds.
+queue:     Waiting for the token and for a slot under the concurrency limit.
+pause:     The pause before every one-by-one request.
+connect:   The TCP handshake (the TLS handshake too for the asyncio transport, which can't time them apart).
+tls:       The TLS handshake.
+firstByte: Sending the request and waiting for the response headers.
+body:      Reading the response body.
+write:     Writing the body to the disk.
+"""
+PHASES = ['queue', 'pause', 'connect', 'tls', 'firstByte', 'body', 'write']
+
+def redact(url):
+    """
+    Return a URL with its secrets replaced, the authorization token is never part of a URL so the headers are simply never written.
+    :param url: The URL of the request.
+    """
+
+    for pattern, replacement in SECRETS:
+        url = pattern.sub(replacement, url)
+
+    return url
+
+def endpoint(url):
+    """
+    Return the endpoint that a URL belongs to, the host and path with the IDs (and, on the CDN, the file names) left out.
+    :param url: The URL of the request.
+    """
+
+    # Split the host from the path and leave out the query.
+    urlparts = url.split('?')[0].split('/')
+    host, urlpath = urlparts[2], '/{0}'.format('/'.join(urlparts[3:]))
+
+    # Leave out the IDs.
+    urlpath = SNOWFLAKE.sub('/{id}', urlpath)
+
+    # Leave out the file name of a file on the CDN.
+    if host not in APIHOSTS and '/' in urlpath[1:]:
+        urlpath = '{0}/{{file}}'.format(urlpath.rsplit('/', 1)[0])
+
+    return '{0}{1}'.format(host, urlpath)
+
+class Trace(object):
+    """
+    The timings of a single request, filled in as it goes through each phase and written to the trace file once it's finished.
+    """
+
+    def __init__(self, tracer, method, url, queued=None):
+        """
+        The class constructor.
+        :param tracer: The Tracer that the trace is written to.
+        :param method: The HTTP method of the request.
+        :param url: The URL of the request.
+        :param queued: The number of seconds the request waited before it was sent.
+        """
+
+        # Create some class variables to store the trace.
+        self.tracer = tracer
+        self.auto = True    # Whether or not the trace is finished as soon as the body has been read, downloads finish it once the body is on the disk instead.
+        self.finished = False
+        self.entry = {'started': time(), 'method': method, 'url': redact(url), 'endpoint': endpoint(url), 'status': None, 'error': None, 'bytes': 0, 'reused': None, 'timings': dict((phase, None) for phase in PHASES)}
+        self.entry['timings']['queue'] = queued
+
+    def phase(self, name, started):
+        """
+        Add the time since a phase started to the phase, a phase can happen more than once (e.g. the body is read a piece at a time).
+        :param name: The name of the phase, see PHASES.
+        :param started: The time that the phase started at.
+        """
+
+        self.entry['timings'][name] = (self.entry['timings'][name] or 0) + (time() - started)
+
+    def received(self, size):
+        """
+        Add to the number of body bytes that were received.
+        :param size: The number of bytes.
+        """
+
+        self.entry['bytes'] += size
+
+    def finish(self, status=None, error=None):
+        """
+        Write the trace to the trace file, only the first call does anything.
+        :param status: The HTTP status code of the response.
+        :param error: The exception that the request failed with.
+        """
+
+        # Skip this function if the trace has already been written.
+        if self.finished:
+            return None
+
+        self.finished = True
+
+        # Fill in how the request went.
+        if status is not None:
+            self.entry['status'] = status
+
+        if error is not None:
+            self.entry['error'] = '{0}: {1}'.format(type(error).__name__, error)
+
+        # Add up the time that the request took from start to finish.
+        self.entry['total'] = sum(seconds for seconds in self.entry['timings'].values() if seconds is not None)
+
+        # Write the trace.
+        self.tracer.write(self.entry)
+
+class TracedResponse(object):
+    """
+    Wrap a blocking response object so that reading its body is timed and counted.
+    """
+
+    def __init__(self, response, trace):
+        """
+        The class constructor.
+        :param response: The response object that we're wrapping, everything but read() is passed on through to it.
+        :param trace: The Trace of the request.
+        """
+
+        # Create some class variables to store the response and its trace.
+        self.response = response
+        self.trace = trace
+
+    def __getattr__(self, name):
+        """
+        Pass every attribute that we don't override on through to the wrapped response.
+        :param name: The name of the attribute.
+        """
+
+        return getattr(self.response, name)
+
+    def read(self, amt=None):
+        """
+        Read the response body, finishing the trace once all of it has been read.
+        :param amt: The number of bytes to read, the rest of the body is read if this is empty.
+        """
+
+        # Read and time the body.
+        started = time()
+        data = self.response.read() if amt is None else self.response.read(amt)
+        self.trace.phase('body', started)
+        self.trace.received(len(data))
+
+        # Finish the trace once the body has been read in full.
+        if (amt is None or len(data) == 0) and self.trace.auto:
+            self.trace.finish()
+
+        return data
+
+class Tracer(object):
+    """
+    Write a line of JSON with the timings, the status, and the size of every request to a trace file, the authorization tokens are never written.
+    """
+
+    def __init__(self, filename):
+        """
+        The class constructor.
+        :param filename: The full file path to the trace file, it's appended to so a trace can span more than one run.
+        """
+
+        # Create some class variables to store the trace file.
+        self.filename = filename
+        self.lock = Lock()
+
+        # Determine if the folder exists, if not then create it.
+        folder = path.dirname(filename)
+
+        if folder and not path.exists(folder):
+            makedirs(folder)
+
+    def start(self, method, url, queued=None):
+        """
+        Return the Trace for a request that is about to be sent.
+        :param method: The HTTP method of the request.
+        :param url: The URL of the request.
+        :param queued: The number of seconds the request waited before it was sent.
+        """
+
+        return Trace(self, method, url, queued)
+
+    def write(self, entry):
+        """
+        Append a trace entry to the trace file.
+        :param entry: The trace entry.
+        """
+
+        with self.lock:
+            with open(self.filename, 'a') as tracestream:
+                tracestream.write('{0}\n'.format(dumps(entry)))
+
+def load(filename):
+    """
+    Return the trace entries in a trace file, a line that was cut off is skipped.
+    :param filename: The full file path to the trace file.
+    """
+
+    # Create a list to store the entries.
+    entries = []
+
+    with open(filename, 'r') as tracestream:
+        for line in tracestream:
+            try:
+                entries.append(loads(line))
+
+            except ValueError:
+                continue
+
+    # Return the entries.
+    return entries
+
+def percentile(values, fraction):
+    """
+    Return a percentile of a list of numbers (the nearest value, rather than one in between).
+    :param values: The sorted list of numbers.
+    :param fraction: The percentile as a fraction, e.g. 0.9 for the 90th percentile.
+    """
+
+    return values[min(len(values) - 1, int(fraction * len(values)))] if len(values) > 0 else None
+
+def analyze(filename):
+    """
+    Return a summary of a trace file: the number of requests, errors, and bytes for each endpoint, and the 50th, 90th, and 99th percentiles of each phase.
+    :param filename: The full file path to the trace file.
+    """
+
+    # Sort the entries by their endpoint.
+    endpoints = {}
+
+    for entry in load(filename):
+        endpoints.setdefault(entry['endpoint'], []).append(entry)
+
+    # Create a list to store the lines of the summary.
+    lines = []
+
+    # Summarize the busiest endpoints first.
+    for name, entries in sorted(endpoints.items(), key=lambda item: -len(item[1])):
+        errors = len([entry for entry in entries if entry['error'] is not None or not 199 < (entry['status'] or 0) < 300])
+        size = sum(entry['bytes'] for entry in entries)
+        lines.append('{0}: {1} requests, {2} failed, {3} bytes'.format(name, len(entries), errors, size))
+
+        # Add a line for every phase that was timed, and one for the whole request.
+        for phase in PHASES + ['total']:
+            values = sorted(entry['timings'][phase] if phase != 'total' else entry['total'] for entry in entries if (entry['timings'].get(phase) if phase != 'total' else entry.get('total')) is not None)
+
+            if len(values) > 0:
+                lines.append('    {0:<10} p50 {1:8.3f}s  p90 {2:8.3f}s  p99 {3:8.3f}s  sum {4:10.1f}s'.format(phase, percentile(values, 0.5), percentile(values, 0.9), percentile(values, 0.99), sum(values)))
+
+    # Return the summary.
+    return lines
+
+def toHAR(filename, harfile):
+    """
+    Convert a trace file into a HAR file that browsers and HAR viewers can open.
+    :param filename: The full file path to the trace file.
+    :param harfile: The full file path to the HAR file to write.
+    :return: The number of requests in the HAR file.
+    """
+
+    # Create a list to store the HAR entries.
+    harentries = []
+
+    for entry in load(filename):
+        timings = entry['timings']
+
+        # HAR timings are in milliseconds, and -1 means that the phase doesn't apply (or wasn't timed).
+        def milliseconds(*phases):
+            values = [timings.get(phase) for phase in phases if timings.get(phase) is not None]
+            return round(sum(values) * 1000, 3) if len(values) > 0 else -1
+
+        harentries.append({
+            'startedDateTime': datetime.utcfromtimestamp(entry['started']).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'time': round(entry['total'] * 1000, 3),
+            'request': {'method': entry['method'], 'url': entry['url'], 'httpVersion': 'HTTP/1.1', 'cookies': [], 'headers': [], 'queryString': [], 'headersSize': -1, 'bodySize': 0},
+            'response': {'status': entry['status'] or 0, 'statusText': entry['error'] or '', 'httpVersion': 'HTTP/1.1', 'cookies': [], 'headers': [], 'content': {'size': entry['bytes'], 'mimeType': ''}, 'redirectURL': '', 'headersSize': -1, 'bodySize': entry['bytes']},
+            'cache': {},
+            'timings': {'blocked': milliseconds('queue', 'pause'), 'dns': -1, 'connect': milliseconds('connect', 'tls'), 'ssl': milliseconds('tls'), 'send': 0, 'wait': milliseconds('firstByte'), 'receive': max(0, milliseconds('body', 'write'))},
+        })
+
+    # Write the HAR file.
+    with open(harfile, 'w') as harstream:
+        harstream.write(dumps({'log': {'version': '1.2', 'creator': {'name': 'Discord-Scraper', 'version': '1.0'}, 'entries': harentries}}, indent=4))
+
+    # Return the number of requests.
+    return len(harentries)
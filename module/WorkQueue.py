@@ -0,0 +1,220 @@
+"""
+@author:  Dracovian
+@date:    2021-02-10
+@license: WTFPL
+"""
+
+"""
+datetime.datetime:  Used to convert between the date strings in the queue and datetime objects.
+datetime.timedelta: Used to split a channel's history into windows of days.
+"""
+from datetime import datetime, timedelta
+
+"""
+sqlite3.connect: Used to open the shared queue file, SQLite handles the locking between the nodes for us.
+"""
+from sqlite3 import connect
+
+"""
+time.time: Used to work out when a lease expires.
+"""
+from time import time
+
+class WorkQueue(object):
+    """
+    A queue of (channel, window of days) work units stored in an SQLite file that many nodes can share.
+    Each unit is leased to one worker at a time, and a lease that isn't kept alive with heartbeats expires so another worker can pick the unit up.
+    The file has to live somewhere that supports file locking properly (a local disk, or a network filesystem with working locks).
+    """
+
+    def __init__(self, filename):
+        """
+        The class constructor.
+        :param filename: The full file path to the SQLite queue file.
+        """
+
+        # Open the queue file, waiting up to 30 seconds for another node to let go of the lock. We handle the transactions ourselves.
+        self.connection = connect(filename, timeout=30, isolation_level=None)
+
+        # Create the table if this is a new queue file.
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS units ('
+            'id INTEGER PRIMARY KEY, guild TEXT, channel TEXT, dm INTEGER, newest TEXT, oldest TEXT, '
+            'state TEXT DEFAULT \'pending\', worker TEXT, expires REAL DEFAULT 0, attempts INTEGER DEFAULT 0, '
+            'UNIQUE (channel, oldest))'
+        )
+
+    def plan(self, targets, newest=None, window=None):
+        """
+        Split the history of every channel into work units, units that are already in the queue are left alone so this can be run again safely.
+        :param targets: A list of (guild, channel, dm) tuples for everything we want to scrape.
+        :param newest: The datetime object for the most recent day that we're wanting to scrape, defaults to today (in UTC).
+        :param window: The number of days in each work unit, defaults to 30.
+        """
+
+        # Determine if the newest argument is not set.
+        if newest is None:
+
+            # Set it to the default value of today.
+            newest = datetime.utcnow()
+
+        # Determine if the window argument is not set.
+        if window is None:
+
+            # Set it to the default value of 30 days.
+            window = 30
+
+        # Create a list to store the new units.
+        units = []
+
+        # Grab the newest day without the time.
+        newest = datetime(newest.year, newest.month, newest.day)
+
+        # Iterate through the channels one-by-one.
+        for guild, channel, dm in targets:
+
+            # The windows always line up with January 1, 2015 so planning again on a later day lines up with the units already in the queue.
+            oldest = datetime(2015, 1, 1)
+
+            while oldest <= newest:
+                units.append((guild, channel, 1 if dm else 0, min(oldest + timedelta(days=window - 1), newest).strftime('%Y-%m-%d'), oldest.strftime('%Y-%m-%d')))
+                oldest += timedelta(days=window)
+
+        # Add every unit in a single transaction.
+        self.connection.execute('BEGIN IMMEDIATE')
+        self.connection.executemany('INSERT OR IGNORE INTO units (guild, channel, dm, newest, oldest) VALUES (?, ?, ?, ?, ?)', units)
+
+        # Stretch the most recent window of each channel up to the newest day, finished windows are handed out again to pick up the new days.
+        self.connection.executemany(
+            'UPDATE units SET newest = ?, state = CASE WHEN state = \'done\' THEN \'pending\' ELSE state END '
+            'WHERE channel = ? AND oldest = ? AND newest < ?', [(unit[3], unit[1], unit[4], unit[3]) for unit in units]
+        )
+        self.connection.execute('COMMIT')
+
+    def claim(self, worker, lease=None):
+        """
+        Lease the next unit to a worker, the newest windows go first. Returns None once there's nothing left to lease.
+        :param worker: A name for the worker that is unique across the nodes.
+        :param lease: The number of seconds the lease lasts without a heartbeat, defaults to 300.
+        """
+
+        # Determine if the lease argument is not set.
+        if lease is None:
+
+            # Set it to the default value of five minutes.
+            lease = 300
+
+        # Take the write lock straight away so two workers can't claim the same unit.
+        self.connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            # Grab a unit that nobody has or whose lease has expired.
+            row = self.connection.execute(
+                'SELECT id, guild, channel, dm, newest, oldest FROM units '
+                'WHERE state = \'pending\' OR (state = \'leased\' AND expires < ?) '
+                'ORDER BY newest DESC, id LIMIT 1', (time(),)
+            ).fetchone()
+
+            # Lease the unit to the worker.
+            if row is not None:
+                self.connection.execute('UPDATE units SET state = \'leased\', worker = ?, expires = ?, attempts = attempts + 1 WHERE id = ?', (worker, time() + lease, row[0]))
+
+            self.connection.execute('COMMIT')
+
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        # Return nothing if there's nothing left to lease.
+        if row is None:
+            return None
+
+        # Return the unit as a dictionary.
+        return {
+            'id': row[0],
+            'guild': row[1],
+            'channel': row[2],
+            'dm': row[3] == 1,
+            'newest': datetime.strptime(row[4], '%Y-%m-%d'),
+            'oldest': datetime.strptime(row[5], '%Y-%m-%d'),
+        }
+
+    def heartbeat(self, id, worker, lease=None):
+        """
+        Extend a lease, returning false if the worker doesn't hold the lease anymore.
+        :param id: The ID of the unit.
+        :param worker: The name of the worker that holds the lease.
+        :param lease: The number of seconds the lease lasts from now, defaults to 300.
+        """
+
+        # Determine if the lease argument is not set.
+        if lease is None:
+
+            # Set it to the default value of five minutes.
+            lease = 300
+
+        # Only extend the lease if the worker still holds it.
+        cursor = self.connection.execute('UPDATE units SET expires = ? WHERE id = ? AND worker = ? AND state = \'leased\'', (time() + lease, id, worker))
+
+        # Return whether or not the lease was extended.
+        return cursor.rowcount == 1
+
+    def complete(self, id, worker):
+        """
+        Mark a unit as done, returning false if the worker didn't hold the lease anymore.
+        :param id: The ID of the unit.
+        :param worker: The name of the worker that holds the lease.
+        """
+
+        # Only mark the unit as done if the worker still holds the lease.
+        cursor = self.connection.execute('UPDATE units SET state = \'done\', expires = 0 WHERE id = ? AND worker = ? AND state = \'leased\'', (id, worker))
+
+        # Return whether or not the unit was marked as done.
+        return cursor.rowcount == 1
+
+    def fail(self, id, worker, attempts=None):
+        """
+        Hand a unit back so another worker can try it, or mark it as failed once it has been tried too many times.
+        :param id: The ID of the unit.
+        :param worker: The name of the worker that holds the lease.
+        :param attempts: The number of attempts a unit gets before it is marked as failed, defaults to 3.
+        """
+
+        # Determine if the attempts argument is not set.
+        if attempts is None:
+
+            # Set it to the default value of 3.
+            attempts = 3
+
+        # Hand the unit back, or give up on it.
+        self.connection.execute(
+            'UPDATE units SET state = CASE WHEN attempts >= ? THEN \'failed\' ELSE \'pending\' END, worker = NULL, expires = 0 '
+            'WHERE id = ? AND worker = ? AND state = \'leased\'', (attempts, id, worker)
+        )
+
+    def release(self, id, worker):
+        """
+        Hand a unit back without counting the attempt against it, this is used when the worker was asked to stop part way through.
+        :param id: The ID of the unit.
+        :param worker: The name of the worker that holds the lease.
+        """
+
+        # Hand the unit back.
+        self.connection.execute(
+            'UPDATE units SET state = \'pending\', worker = NULL, expires = 0, attempts = attempts - 1 '
+            'WHERE id = ? AND worker = ? AND state = \'leased\'', (id, worker)
+        )
+
+    def summary(self):
+        """
+        Return a dictionary of the number of units in each state.
+        """
+
+        return dict(self.connection.execute('SELECT state, COUNT(*) FROM units GROUP BY state').fetchall())
+
+    def close(self):
+        """
+        Close the queue file.
+        """
+
+        self.connection.close()